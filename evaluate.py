@@ -0,0 +1,243 @@
+"""
+Offline relevance evaluation for rank profiles (nDCG@k, MRR, recall, latency).
+
+Queries run concurrently, either straight against Vespa (one pass per rank
+profile) or through this service's /search/bm25 endpoint.
+
+Inputs:
+- qrels: TREC format ("qid 0 docid rel") or 3-column TSV ("qid<TAB>docid<TAB>rel")
+- queries: TSV ("qid<TAB>query") or JSONL ({"qid": ..., "query": ...})
+
+Usage:
+    python evaluate.py --qrels qrels.txt --queries queries.tsv --profiles bm25,bm25-text
+    python evaluate.py --qrels qrels.txt --queries queries.tsv --service http://127.0.0.1:8000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+import httpx
+
+try:  # Optional: load .env if python-dotenv is installed
+    from dotenv import load_dotenv
+except ImportError:  # pragma: no cover - optional dependency
+    load_dotenv = None
+
+Qrels = Dict[str, Dict[str, int]]
+
+
+def load_qrels(path: str | Path) -> Qrels:
+    qrels: Qrels = {}
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            parts = line.split()
+            if len(parts) == 4:
+                qid, _, doc_id, rel = parts
+            elif len(parts) == 3:
+                qid, doc_id, rel = parts
+            else:
+                continue
+            try:
+                grade = int(float(rel))
+            except ValueError:
+                continue  # header or comment line
+            qrels.setdefault(qid, {})[doc_id] = grade
+    return qrels
+
+
+def load_queries(path: str | Path) -> Dict[str, str]:
+    queries: Dict[str, str] = {}
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                qid = item.get("qid", item.get("id"))
+                text = item.get("query", item.get("text"))
+            else:
+                qid, _, text = line.partition("\t")
+            if qid is not None and text:
+                queries[str(qid)] = str(text)
+    return queries
+
+
+def ndcg_at_k(ranked: Sequence[str], judged: Dict[str, int], k: int) -> float:
+    dcg = sum((2 ** judged.get(doc_id, 0) - 1) / math.log2(i + 2) for i, doc_id in enumerate(ranked[:k]))
+    ideal = sorted((rel for rel in judged.values() if rel > 0), reverse=True)[:k]
+    idcg = sum((2**rel - 1) / math.log2(i + 2) for i, rel in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+
+def reciprocal_rank(ranked: Sequence[str], judged: Dict[str, int], k: int) -> float:
+    for i, doc_id in enumerate(ranked[:k]):
+        if judged.get(doc_id, 0) > 0:
+            return 1.0 / (i + 1)
+    return 0.0
+
+
+def recall_at_k(ranked: Sequence[str], judged: Dict[str, int], k: int) -> float:
+    relevant = {doc_id for doc_id, rel in judged.items() if rel > 0}
+    if not relevant:
+        return 0.0
+    return len(relevant.intersection(ranked[:k])) / len(relevant)
+
+
+def _hit_doc_id(hit: Dict[str, Any]) -> str | None:
+    fields = hit.get("fields", {}) or {}
+    doc_id = hit.get("id") if "meta" in hit else fields.get("id") or fields.get("documentid") or hit.get("id")
+    if isinstance(doc_id, str) and "::" in doc_id:
+        doc_id = doc_id.rsplit("::", 1)[-1] or doc_id
+    return doc_id
+
+
+class Runner:
+    """Issues one query and returns (ranked doc ids, latency ms)."""
+
+    def __init__(self, client: httpx.AsyncClient, k: int, *, vespa_url: str | None, service_url: str | None) -> None:
+        self.client = client
+        self.k = k
+        self.vespa_url = vespa_url
+        self.service_url = service_url
+
+    async def run(self, query: str, profile: str) -> Tuple[List[str], float]:
+        started = time.perf_counter()
+        if self.service_url:
+            resp = await self.client.post(
+                self.service_url.rstrip("/") + "/search/bm25",
+                json={"query": query, "top_k": self.k, "facets": []},
+            )
+            resp.raise_for_status()
+            hits = resp.json().get("hits", [])
+        else:
+            resp = await self.client.post(
+                self.vespa_url.rstrip("/") + "/search/",
+                json={
+                    "yql": f"select id from sources * where userQuery() limit {self.k}",
+                    "query": query,
+                    "ranking": profile,
+                    "hits": self.k,
+                },
+            )
+            resp.raise_for_status()
+            hits = (resp.json().get("root", {}) or {}).get("children", []) or []
+        latency_ms = (time.perf_counter() - started) * 1000
+        ranked = [doc_id for doc_id in (_hit_doc_id(hit) for hit in hits) if doc_id]
+        return ranked, latency_ms
+
+
+def _percentile(values: Sequence[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def evaluate_profile(
+    runner: Runner, profile: str, queries: Dict[str, str], qrels: Qrels, concurrency: int
+) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    k = runner.k
+
+    async def one(qid: str) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                ranked, latency_ms = await runner.run(queries[qid], profile)
+            except Exception as exc:  # noqa: BLE001 - count failures, keep evaluating
+                return {"error": str(exc)}
+        judged = qrels.get(qid, {})
+        return {
+            "ndcg": ndcg_at_k(ranked, judged, k),
+            "mrr": reciprocal_rank(ranked, judged, k),
+            "recall": recall_at_k(ranked, judged, k),
+            "latency_ms": latency_ms,
+        }
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(qid) for qid in queries if qid in qrels))
+    elapsed = time.perf_counter() - started
+    ok = [r for r in results if "error" not in r]
+    latencies = [r["latency_ms"] for r in ok]
+    return {
+        "profile": profile,
+        "queries": len(results),
+        "errors": len(results) - len(ok),
+        f"ndcg@{k}": statistics.fmean(r["ndcg"] for r in ok) if ok else 0.0,
+        f"mrr@{k}": statistics.fmean(r["mrr"] for r in ok) if ok else 0.0,
+        f"recall@{k}": statistics.fmean(r["recall"] for r in ok) if ok else 0.0,
+        "latency_p50_ms": _percentile(latencies, 50),
+        "latency_p95_ms": _percentile(latencies, 95),
+        "qps": len(results) / elapsed if elapsed else 0.0,
+    }
+
+
+def format_report(rows: List[Dict[str, Any]], k: int) -> str:
+    """Plain-text comparison table; deltas are relative to the first profile."""
+    metrics = [f"ndcg@{k}", f"mrr@{k}", f"recall@{k}", "latency_p50_ms", "latency_p95_ms", "qps"]
+    header = ["profile", "queries", "errors"] + metrics
+    lines = ["  ".join(f"{name:>20}" for name in header)]
+    baseline = rows[0] if rows else {}
+    for row in rows:
+        cells = [f"{row['profile']:>20}", f"{row['queries']:>20}", f"{row['errors']:>20}"]
+        for metric in metrics:
+            value = row[metric]
+            cell = f"{value:.4f}"
+            if row is not baseline:
+                cell += f" ({value - baseline[metric]:+.4f})"
+            cells.append(f"{cell:>20}")
+        lines.append("  ".join(cells))
+    return "\n".join(lines)
+
+
+async def run_evaluation(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    qrels = load_qrels(args.qrels)
+    queries = load_queries(args.queries)
+    if args.max_queries:
+        queries = dict(list(queries.items())[: args.max_queries])
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    if args.service:
+        profiles = ["service"]
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        runner = Runner(client, args.k, vespa_url=args.vespa, service_url=args.service)
+        return [await evaluate_profile(runner, profile, queries, qrels, args.concurrency) for profile in profiles]
+
+
+def parse_args() -> argparse.Namespace:
+    if load_dotenv:
+        load_dotenv()
+    vespa_host = os.getenv("VESPA_HOST") or os.getenv("VESPA_URL", "http://localhost")
+    if not vespa_host.startswith(("http://", "https://")):
+        vespa_host = f"http://{vespa_host}"
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--qrels", required=True, help="Relevance judgments (TREC or 3-column TSV)")
+    parser.add_argument("--queries", required=True, help="Query set (TSV qid<TAB>query or JSONL)")
+    parser.add_argument("--profiles", default="bm25", help="Comma separated rank profiles (first is the baseline)")
+    parser.add_argument("--vespa", default=f"{vespa_host}:{os.getenv('VESPA_PORT', '8080')}", help="Vespa endpoint")
+    parser.add_argument("--service", default=None, help="Evaluate through this service's /search/bm25 instead")
+    parser.add_argument("-k", type=int, default=10, help="Cutoff for nDCG/MRR/recall")
+    parser.add_argument("--concurrency", type=int, default=32, help="Queries in flight")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-query timeout (seconds)")
+    parser.add_argument("--max-queries", type=int, default=0, help="Evaluate only the first N queries")
+    parser.add_argument("--output", default=None, help="Write the report rows as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    rows = asyncio.run(run_evaluation(args))
+    print(format_report(rows, args.k))
+    if args.output:
+        Path(args.output).write_text(json.dumps(rows, indent=2), encoding="utf-8")
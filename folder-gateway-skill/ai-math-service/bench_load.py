@@ -0,0 +1,84 @@
+"""
+Concurrency benchmark for ai-math-service endpoints.
+
+Fires requests with a fixed number in flight and reports throughput and
+latency percentiles. Compare publish modes by restarting the service with
+PUBLISH_THREADS=0 (inline publish, blocks the event loop) and the default
+thread pool, e.g. while RabbitMQ is slowed down with `tc` or paused briefly:
+
+    python bench_load.py --url http://127.0.0.1:8082 --path /api/power/queue -n 5000 -c 200
+    python bench_load.py --path /api/add -c 200      # control: never touches the broker
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import time
+from typing import List
+
+import httpx
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+async def run(url: str, path: str, body: dict, total: int, concurrency: int, timeout: float) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+
+        async def worker() -> None:
+            nonlocal errors
+            for _ in counter:
+                started = time.perf_counter()
+                try:
+                    resp = await client.post(path, json=body)
+                    resp.raise_for_status()
+                except Exception:  # noqa: BLE001 - counted, not fatal
+                    errors += 1
+                    continue
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "path": path,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies, default=0.0), 2),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8082")
+    parser.add_argument("--path", default="/api/power/queue")
+    parser.add_argument("--body", default='{"base": 2, "exp": 10}', help="JSON request body")
+    parser.add_argument("-n", "--requests", type=int, default=5000)
+    parser.add_argument("-c", "--concurrency", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(
+        run(args.url, args.path, json.loads(args.body), args.requests, args.concurrency, args.timeout)
+    )
+    print(json.dumps(report, indent=2))
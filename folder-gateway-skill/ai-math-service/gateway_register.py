@@ -0,0 +1,291 @@
+"""
+Lightweight helper to register this service's routes into the gateway.
+
+``GatewayRegistrar`` runs registration as a background task, so startup never
+waits on the gateway:
+- the first attempt waits a random 0..REGISTER_JITTER seconds, so a fleet
+  restarting together does not hit the gateway at once;
+- failures retry forever with capped exponential backoff and full jitter
+  (uniform(0, min(REGISTER_MAX_DELAY, REGISTER_DELAY * 2**n)));
+- once registered, the lease is renewed every REGISTER_RENEW_SECONDS (+-10%).
+  Payloads carry "routes_hash" (sha256 of name, base_url and the prefixed
+  routes) and "lease_seconds". While the hash equals the one the gateway last
+  accepted, renewal POSTs only {"name", "base_url", "routes_hash",
+  "lease_seconds"} to /gateway/renew; the full route set goes to
+  /gateway/register again only when the routes changed, the gateway answers
+  404/405 (no renew endpoint, remembered) or 409/410 (service unknown), or it
+  reports a different hash;
+- one pooled httpx.AsyncClient is reused for every attempt;
+- with REGISTER_LOCK_FILE set, only the process holding an exclusive lock on
+  that file registers (e.g. one gunicorn worker per host); the others stand by
+  and take over within REGISTER_STANDBY_SECONDS if it exits.
+
+``register_with_gateway`` remains for one-shot registration with bounded retries.
+
+folder-gateway-skill/ai-math-service/gateway_register.py is a copy of this
+file (its Docker build context cannot reach the repo root); keep them identical.
+
+Env vars:
+- SERVICE_NAME: unique service identifier (default: "simple-search")
+- SERVICE_BASE_URL: upstream base URL the gateway should call (default: "http://127.0.0.1:8000")
+- GATEWAY_URL: gateway base URL (e.g. "http://127.0.0.1:30090"); if empty, registration is skipped
+- GATEWAY_PREFIX: optional path prefix to avoid collisions (e.g. "/ai-search")
+- REGISTER_RETRIES: attempts of the one-shot register_with_gateway helper; GatewayRegistrar retries forever (default: 5)
+- REGISTER_DELAY / REGISTER_MAX_DELAY: backoff base and cap in seconds (default: 1.0 / 60)
+- REGISTER_JITTER: max random delay before the first attempt (default: 5)
+- REGISTER_RENEW_SECONDS: lease renewal interval, 0 registers once (default: 300)
+- REGISTER_LOCK_FILE: elect one registering process per host via this file (default: unset)
+- REGISTER_STANDBY_SECONDS: how often standby processes retry the lock (default: 30)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+from typing import Any, Dict, Iterable, List
+
+import httpx
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: no lock, every process registers
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def _apply_prefix(path: str, prefix: str | None) -> str:
+    """Ensure gateway_path carries the configured prefix."""
+    clean_path = path if path.startswith("/") else f"/{path}"
+    if not prefix:
+        return clean_path
+    clean_prefix = prefix.strip("/")
+    return f"/{clean_prefix}{clean_path}"
+
+
+def routes_hash(service_name: str, base_url: str, routes: List[Dict[str, str]]) -> str:
+    """Stable hash of what the gateway stores for this service."""
+    raw = json.dumps(
+        {"name": service_name, "base_url": base_url, "routes": routes},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _response_field(resp: httpx.Response, key: str) -> Any:
+    try:
+        body = resp.json()
+    except ValueError:
+        return None
+    return body.get(key) if isinstance(body, dict) else None
+
+
+class GatewayRegistrar:
+    """Background registration + lease renewal for one service."""
+
+    def __init__(
+        self,
+        *,
+        service_name: str,
+        base_url: str,
+        gateway_url: str | None,
+        routes: Iterable[Dict[str, str]],
+        prefix: str | None = None,
+        renew_seconds: float | None = None,
+        base_delay: float | None = None,
+        max_delay: float | None = None,
+        jitter: float | None = None,
+        lock_file: str | None = None,
+    ) -> None:
+        self.service_name = service_name
+        self.base_url = base_url
+        self.gateway_url = (gateway_url or "").rstrip("/")
+        self.prefix = prefix
+        self.renew_seconds = float(os.getenv("REGISTER_RENEW_SECONDS", "300")) if renew_seconds is None else renew_seconds
+        self.base_delay = float(os.getenv("REGISTER_DELAY", "1.0")) if base_delay is None else base_delay
+        self.max_delay = float(os.getenv("REGISTER_MAX_DELAY", "60")) if max_delay is None else max_delay
+        self.jitter = float(os.getenv("REGISTER_JITTER", "5")) if jitter is None else jitter
+        self.lock_file = lock_file or os.getenv("REGISTER_LOCK_FILE") or None
+        self.standby_seconds = float(os.getenv("REGISTER_STANDBY_SECONDS", "30"))
+        self.accepted_hash: str | None = None  # hash the gateway last stored
+        self.renew_supported = True
+        self._client: httpx.AsyncClient | None = None
+        self._task: asyncio.Task | None = None
+        self._lock_fd: int | None = None
+        self.set_routes(routes)
+
+    def set_routes(self, routes: Iterable[Dict[str, str]]) -> None:
+        """Replace the route set; the next cycle sends it if the hash changed."""
+        self.routes = [{**route, "gateway_path": _apply_prefix(route["gateway_path"], self.prefix)} for route in routes]
+        self.routes_hash = routes_hash(self.service_name, self.base_url, self.routes)
+
+    @property
+    def registered(self) -> bool:
+        return self.accepted_hash == self.routes_hash
+
+    def _lease(self) -> Dict[str, Any]:
+        # Three missed renewals before a gateway that honours leases drops us.
+        return {"lease_seconds": max(1, int(self.renew_seconds * 3))} if self.renew_seconds > 0 else {}
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** min(attempt, 30)))
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=5.0)
+        return self._client
+
+    async def register_once(self) -> None:
+        """Renew (hash only) or register (full routes); raises on failure."""
+        client = self._get_client()
+        if self.registered and self.renew_supported:
+            resp = await client.post(
+                self.gateway_url + "/gateway/renew",
+                json={"name": self.service_name, "base_url": self.base_url, "routes_hash": self.routes_hash, **self._lease()},
+            )
+            if resp.status_code in (404, 405):
+                logger.info("Gateway has no /gateway/renew; renewing with full registration.")
+                self.renew_supported = False
+            elif resp.status_code not in (409, 410):
+                resp.raise_for_status()
+                if _response_field(resp, "routes_hash") in (None, self.routes_hash):
+                    logger.debug("Gateway lease renewed: service=%s", self.service_name)
+                    return
+            self.accepted_hash = None
+
+        payload = {
+            "name": self.service_name,
+            "base_url": self.base_url,
+            "routes": self.routes,
+            "routes_hash": self.routes_hash,
+            **self._lease(),
+        }
+        resp = await client.post(self.gateway_url + "/gateway/register", json=payload)
+        resp.raise_for_status()
+        self.accepted_hash = self.routes_hash
+        logger.info(
+            "Gateway registered: service=%s base_url=%s routes=%s (prefix=%s)",
+            self.service_name,
+            self.base_url,
+            len(self.routes),
+            self.prefix or "",
+        )
+
+    def _hold_lock(self) -> bool:
+        if not self.lock_file or fcntl is None or self._lock_fd is not None:
+            return True
+        fd = os.open(self.lock_file, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        logger.info("Holding %s; this process registers with the gateway.", self.lock_file)
+        return True
+
+    async def run(self) -> None:
+        """Register, then renew until cancelled; never raises."""
+        if not self.gateway_url:
+            logger.info("GATEWAY_URL not set; skipping gateway registration.")
+            return
+        await asyncio.sleep(random.uniform(0, self.jitter))
+        attempt = 0
+        while True:
+            if not self._hold_lock():
+                await asyncio.sleep(self.standby_seconds)
+                continue
+            try:
+                await self.register_once()
+            except Exception as exc:  # noqa: BLE001 - keep retrying whatever went wrong
+                delay = self.backoff(attempt)
+                attempt += 1
+                logger.warning("Gateway registration failed (attempt %s, retry in %.1fs): %s", attempt, delay, exc)
+            else:
+                attempt = 0
+                if self.renew_seconds <= 0:
+                    return
+                delay = self.renew_seconds * random.uniform(0.9, 1.1)
+            await asyncio.sleep(delay)
+
+    def start(self) -> asyncio.Task:
+        """Start ``run`` in the background on the running loop (idempotent)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name=f"gateway-register-{self.service_name}")
+        return self._task
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.close()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # releases the lock for a standby process
+            self._lock_fd = None
+
+
+async def register_with_gateway(
+    *,
+    service_name: str,
+    base_url: str,
+    gateway_url: str | None,
+    routes: Iterable[Dict[str, str]],
+    prefix: str | None = None,
+    retries: int | None = None,
+    delay: float | None = None,
+) -> bool:
+    """
+    Register service routes into the gateway once. Returns True on success, False otherwise.
+
+    routes expects items with keys: name, method, gateway_path, upstream_path, summary, description.
+    Makes up to ``retries`` (REGISTER_RETRIES) attempts, backing off exponentially from
+    ``delay`` (REGISTER_DELAY); use ``GatewayRegistrar`` for background renewal.
+    """
+    retries = int(os.getenv("REGISTER_RETRIES", "5")) if retries is None else retries
+    if not gateway_url:
+        logger.info("GATEWAY_URL not set; skipping gateway registration.")
+        return False
+
+    registrar = GatewayRegistrar(
+        service_name=service_name,
+        base_url=base_url,
+        gateway_url=gateway_url,
+        routes=routes,
+        prefix=prefix,
+        renew_seconds=0,
+        base_delay=delay,
+    )
+    try:
+        for attempt in range(1, retries + 1):
+            try:
+                await registrar.register_once()
+                return True
+            except Exception as exc:  # pragma: no cover - best-effort logging
+                logger.warning(
+                    "Gateway registration failed (attempt %s/%s): %s",
+                    attempt,
+                    retries,
+                    exc,
+                )
+                if attempt < retries:
+                    await asyncio.sleep(registrar.backoff(attempt - 1))
+    finally:
+        await registrar.close()
+
+    logger.error("Gateway registration exhausted retries; continuing without gateway mapping.")
+    return False
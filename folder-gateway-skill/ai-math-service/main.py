@@ -1,16 +1,19 @@
+import fnmatch
 import json
 import logging
 import os
 
-import httpx
-import redis
-from fastapi import FastAPI
+import redis.asyncio as aioredis
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 import asyncio
 from dotenv import load_dotenv
-from celery import Celery
+from celery import Celery, chunks
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Any, Callable, List
 
 logger = logging.getLogger(__name__)
 app = FastAPI(title="AI Math Service")
@@ -18,12 +21,13 @@ app = FastAPI(title="AI Math Service")
 # Load .env if present so REDIS_*, SERVICE_BASE_URL… are picked up locally
 load_dotenv()
 
+from gateway_register import GatewayRegistrar  # noqa: E402 - reads REGISTER_* after .env is loaded
+from result_store import AsyncResultStore, task_status  # noqa: E402 - reads RESULT_* after .env is loaded
+
 SERVICE_NAME = os.getenv("SERVICE_NAME", "ai-math-service")
 # Default to localhost when running outside Docker
 SERVICE_BASE_URL = os.getenv("SERVICE_BASE_URL", "http://127.0.0.1:8082")
 GATEWAY_URL = os.getenv("GATEWAY_URL", "http://localhost:8080")
-REGISTER_RETRIES = int(os.getenv("REGISTER_RETRIES", "5"))
-REGISTER_DELAY = float(os.getenv("REGISTER_DELAY", "1.0"))
 
 BROKER = os.getenv("BROKER") or "amqp://{user}:{pw}@{host}:{port}/{vhost}".format(
     user=os.getenv("RABBITMQ_USER", "guest"),
@@ -38,9 +42,38 @@ BACKEND = os.getenv("REDIS_BACKEND") or "redis://:{password}@{host}:{port}/{db}"
     port=os.getenv("REDIS_PORT", "6379"),
     db=os.getenv("REDIS_DB", "0"),
 )
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "50"))
+TASK_MAX_WAIT = float(os.getenv("TASK_MAX_WAIT", "60"))
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "50000"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "100"))
 QUEUE_NAME = os.getenv("AI_QUERY_NAME", "ai_celery")
+# Per-task queues, mirroring the worker's config/worker_modules.yaml routes:
+# "ai_task_worker.power*=ai_cpu;app.plugins.sample_tasks.*=ai_io". Unmatched tasks use QUEUE_NAME.
+TASK_ROUTES = [
+    tuple(part.strip() for part in entry.split("=", 1))
+    for entry in os.getenv("TASK_ROUTES", "").split(";")
+    if "=" in entry
+]
+# Publishing to RabbitMQ is blocking (py-amqp); it runs on a bounded thread pool
+# so a slow broker ack never stalls the event loop. PUBLISH_THREADS=0 publishes inline.
+PUBLISH_THREADS = int(os.getenv("PUBLISH_THREADS", "8"))
+PUBLISH_MAX_PENDING = int(os.getenv("PUBLISH_MAX_PENDING", "1000"))
+PUBLISH_CONFIRM = os.getenv("PUBLISH_CONFIRM", "0").lower() in {"1", "true", "yes"}
+
 celery_app = Celery(QUEUE_NAME, broker=BROKER, backend=BACKEND)
 celery_app.conf.task_default_queue = QUEUE_NAME
+# One pooled broker connection per publisher thread, reused across requests.
+celery_app.conf.broker_pool_limit = max(PUBLISH_THREADS, 1)
+if PUBLISH_CONFIRM:
+    celery_app.conf.broker_transport_options = {"confirm_publish": True}
+
+
+def _queue_for(task_name: str) -> str:
+    for pattern, queue in TASK_ROUTES:
+        if fnmatch.fnmatchcase(task_name, pattern):
+            return queue
+    return QUEUE_NAME
+
 
 # ---- Schemas (local only) ----
 class AddRequest(BaseModel):
@@ -66,77 +99,184 @@ class PowerRequest(BaseModel):
 class BackgroundTaskRequest(BaseModel):
     entity: str = Field(..., description="Logical category for the task")
 
+
+class TaskStatusResponse(BaseModel):
+    task_id: str
+    status: str
+    payload: dict
+
+
+class BulkPowerRequest(BaseModel):
+    items: List[PowerRequest] = Field(..., min_length=1, max_length=BULK_MAX_ITEMS)
+    chunk_size: int | None = Field(None, ge=1, description="Operations per broker message")
+    vectorized: bool = Field(True, description="Send each chunk as one NumPy batch task (power_batch)")
+
+
+class BulkMultiplyRequest(BaseModel):
+    items: List[MultiplyRequest] = Field(..., min_length=1, max_length=BULK_MAX_ITEMS)
+
+
+class BatchResponse(BaseModel):
+    batch_id: str
+    total: int
+    status: str
+
+
+class BatchStatusResponse(BatchResponse):
+    done: int
+    failed: int
+    pending: int
+    progress: float
+    results: list | None = None
+
 # ---- Helpers ----
-def _get_redis() -> redis.Redis:
-    return redis.Redis(
-        host=os.getenv("REDIS_HOST", "127.0.0.1"),
-        port=int(os.getenv("REDIS_PORT", "6379")),
-        password=os.getenv("REDIS_PASS") or None,
-        db=int(os.getenv("REDIS_DB", "0")),
-        decode_responses=True,
-    )
+_redis: aioredis.Redis | None = None
 
-async def _register_gateway() -> None:
-    if not GATEWAY_URL:
-        return
-    payload = {
-        "name": SERVICE_NAME,
-        "base_url": SERVICE_BASE_URL,
-        "routes": [
-            {
-                "name": "ai-math-add",
-                "method": "POST",
-                "gateway_path": "/v1/ai/math/add",
-                "upstream_path": "/api/add",
-                "summary": "Add two numbers",
-                "description": "Returns the sum of a+b"
-            },
-            {
-                "name": "ai-math-multiply-queue",
-                "method": "POST",
-                "gateway_path": "/v1/ai/math/multiply",
-                "upstream_path": "/api/multiply/queue",
-                "summary": "Multiply via queue",
-                "description": "Stores result in Redis queue format"
-            },
-            {
-                "name": "ai-math-power-queue",
-                "method": "POST",
-                "gateway_path": "/v1/ai/math/power",
-                "upstream_path": "/api/power/queue",
-                "summary": "Power via RabbitMQ queue",
-                "description": "Delegates power computation to Celery worker"
-            },
-            {
-                "name": "ai-math-background-task",
-                "method": "POST",
-                "gateway_path": "/v1/ai/math/background_task",
-                "upstream_path": "/api/background_task",
-                "summary": "Create a background task placeholder",
-                "description": "Initializes a queue-style task in Redis"
-            }
-        ]
+
+def _get_redis() -> aioredis.Redis:
+    """Process-wide async client; connections come from one bounded pool."""
+    global _redis
+    if _redis is None:
+        pool = aioredis.BlockingConnectionPool(
+            host=os.getenv("REDIS_HOST", "127.0.0.1"),
+            port=int(os.getenv("REDIS_PORT", "6379")),
+            password=os.getenv("REDIS_PASS") or None,
+            db=int(os.getenv("REDIS_DB", "0")),
+            decode_responses=True,
+            max_connections=REDIS_POOL_SIZE,
+        )
+        _redis = aioredis.Redis(connection_pool=pool)
+    return _redis
+
+
+result_store = AsyncResultStore(_get_redis)
+
+_publish_executor = (
+    ThreadPoolExecutor(max_workers=PUBLISH_THREADS, thread_name_prefix="celery-publish")
+    if PUBLISH_THREADS > 0
+    else None
+)
+_publish_slots = asyncio.Semaphore(PUBLISH_MAX_PENDING)
+
+
+async def _publish(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking Celery publish off the event loop (backpressure past PUBLISH_MAX_PENDING)."""
+    if _publish_executor is None:
+        return fn(*args, **kwargs)
+    async with _publish_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_publish_executor, lambda: fn(*args, **kwargs))
+
+
+def _send_many(messages: List[tuple]) -> None:
+    """Publish several (task_name, args) messages over one pooled producer."""
+    with celery_app.producer_or_acquire() as producer:
+        for name, args in messages:
+            celery_app.send_task(name, args=args, queue=_queue_for(name), producer=producer)
+
+
+async def _close_redis() -> None:
+    global _redis
+    if _redis is not None:
+        await _redis.connection_pool.disconnect()
+        _redis = None
+
+GATEWAY_ROUTES = [
+    {
+        "name": "ai-math-add",
+        "method": "POST",
+        "gateway_path": "/v1/ai/math/add",
+        "upstream_path": "/api/add",
+        "summary": "Add two numbers",
+        "description": "Returns the sum of a+b"
+    },
+    {
+        "name": "ai-math-multiply-queue",
+        "method": "POST",
+        "gateway_path": "/v1/ai/math/multiply",
+        "upstream_path": "/api/multiply/queue",
+        "summary": "Multiply via queue",
+        "description": "Stores result in Redis queue format"
+    },
+    {
+        "name": "ai-math-power-queue",
+        "method": "POST",
+        "gateway_path": "/v1/ai/math/power",
+        "upstream_path": "/api/power/queue",
+        "summary": "Power via RabbitMQ queue",
+        "description": "Delegates power computation to Celery worker"
+    },
+    {
+        "name": "ai-math-background-task",
+        "method": "POST",
+        "gateway_path": "/v1/ai/math/background_task",
+        "upstream_path": "/api/background_task",
+        "summary": "Create a background task placeholder",
+        "description": "Initializes a queue-style task in Redis"
+    },
+    {
+        "name": "ai-math-power-bulk",
+        "method": "POST",
+        "gateway_path": "/v1/ai/math/power/bulk",
+        "upstream_path": "/api/power/queue/bulk",
+        "summary": "Bulk power via queue",
+        "description": "Enqueues many power operations as Celery chunks; returns a batch id"
+    },
+    {
+        "name": "ai-math-multiply-bulk",
+        "method": "POST",
+        "gateway_path": "/v1/ai/math/multiply/bulk",
+        "upstream_path": "/api/multiply/queue/bulk",
+        "summary": "Bulk multiply",
+        "description": "Multiplies many pairs and stores every result in one Redis pipeline"
+    },
+    {
+        "name": "ai-math-batch-status",
+        "method": "GET",
+        "gateway_path": "/v1/ai/math/batches/{batch_id}",
+        "upstream_path": "/api/batches/{batch_id}",
+        "summary": "Batch progress",
+        "description": "Aggregate progress (and optionally item results) of a bulk submission"
+    },
+    {
+        "name": "ai-math-task-status",
+        "method": "GET",
+        "gateway_path": "/v1/ai/math/tasks/{task_id}",
+        "upstream_path": "/api/tasks/{task_id}",
+        "summary": "Fetch task result",
+        "description": "Returns the stored payload; ?wait=N long-polls until the task finishes"
+    },
+    {
+        "name": "ai-math-task-events",
+        "method": "GET",
+        "gateway_path": "/v1/ai/math/tasks/{task_id}/events",
+        "upstream_path": "/api/tasks/{task_id}/events",
+        "summary": "Stream task status (SSE)",
+        "description": "Server-sent events on every status change until the task finishes"
     }
-    endpoint = GATEWAY_URL.rstrip("/") + "/gateway/register"
-    for attempt in range(1, REGISTER_RETRIES + 1):
-        try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                resp = await client.post(endpoint, json=payload)
-                resp.raise_for_status()
-            logger.info("Gateway registered (%s) base_url=%s", SERVICE_NAME, SERVICE_BASE_URL)
-            return
-        except Exception as exc:  # pragma: no cover
-            logger.warning(
-                "Gateway registration failed (attempt %s/%s): %s",
-                attempt,
-                REGISTER_RETRIES,
-                exc,
-            )
-            await asyncio.sleep(REGISTER_DELAY)
+]
+
+gateway_registrar = GatewayRegistrar(
+    service_name=SERVICE_NAME,
+    base_url=SERVICE_BASE_URL,
+    gateway_url=GATEWAY_URL,
+    routes=GATEWAY_ROUTES,
+)
 
 @app.on_event("startup")
 async def startup():
-    await _register_gateway()
+    _get_redis()
+    result_store.start()
+    gateway_registrar.start()  # background: startup does not wait on the gateway
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await gateway_registrar.stop()
+    await result_store.close()
+    await _close_redis()
+    if _publish_executor is not None:
+        await asyncio.to_thread(_publish_executor.shutdown, True)
 
 # ---- API ----
 @app.post("/api/add", response_model=AddResponse)
@@ -154,17 +294,29 @@ async def multiply_queue(req: MultiplyRequest) -> MultiplyQueueResponse:
         "time": {"start_generate": str(now), "end_generate": str(now)},
         "data": {"operation": "multiply", "a": req.a, "b": req.b, "result": product},
     }
-    _get_redis().set(task_id, json.dumps(payload))
+    await result_store.put(task_id, payload)
     return MultiplyQueueResponse(task_id=task_id, status="SUCCESS")
 
 
 @app.post("/api/power/queue", response_model=MultiplyQueueResponse)
 async def power_queue(req: PowerRequest) -> MultiplyQueueResponse:
     task_id = uuid.uuid4().hex
-    celery_app.send_task(
+    now = datetime.utcnow().timestamp()
+    # Placeholder so /api/tasks/{task_id} can report PENDING until the worker overwrites it.
+    await result_store.put(
+        task_id,
+        {
+            "task_id": task_id,
+            "status": {"general_status": "PENDING", "queue_status": "QUEUED"},
+            "time": {"start_generate": str(now), "end_generate": None},
+            "data": {"operation": "power", "base": req.base, "exp": req.exp},
+        },
+    )
+    await _publish(
+        celery_app.send_task,
         "ai_task_worker.power",
         args=(task_id, req.base, req.exp),
-        queue=QUEUE_NAME,
+        queue=_queue_for("ai_task_worker.power"),
     )
     return MultiplyQueueResponse(task_id=task_id, status="PENDING")
 
@@ -179,10 +331,129 @@ async def background_task(req: BackgroundTaskRequest) -> MultiplyQueueResponse:
         "time": {"start_generate": str(now), "end_generate": None},
         "data": {"operation": "background_task", "entity": req.entity},
     }
-    _get_redis().set(task_id, json.dumps(payload))
+    await result_store.put(task_id, payload)
     return MultiplyQueueResponse(task_id=task_id, status="PENDING")
 
 
+def _batch_task_id(batch_id: str, index: int) -> str:
+    # Item ids are derived from the batch id, so the batch never stores its id list.
+    return f"{batch_id}-{index}"
+
+
+@app.post("/api/multiply/queue/bulk", response_model=BatchResponse)
+async def multiply_queue_bulk(req: BulkMultiplyRequest) -> BatchResponse:
+    batch_id = uuid.uuid4().hex
+    now = str(datetime.utcnow().timestamp())
+    await result_store.create_batch(batch_id, len(req.items), {"operation": "multiply"})
+    items = []
+    for index, item in enumerate(req.items):
+        task_id = _batch_task_id(batch_id, index)
+        items.append(
+            (
+                task_id,
+                {
+                    "task_id": task_id,
+                    "status": {"general_status": "SUCCESS", "queue_status": "SUCCESS"},
+                    "time": {"start_generate": now, "end_generate": now},
+                    "data": {"operation": "multiply", "a": item.a, "b": item.b, "result": item.a * item.b},
+                },
+            )
+        )
+    await result_store.put_many(items, batch_id=batch_id)
+    return BatchResponse(batch_id=batch_id, total=len(items), status="SUCCESS")
+
+
+@app.post("/api/power/queue/bulk", response_model=BatchResponse)
+async def power_queue_bulk(req: BulkPowerRequest) -> BatchResponse:
+    """
+    Enqueue many power operations with one broker message per ``chunk_size`` items.
+
+    By default each message is an ``ai_task_worker.power_batch`` vector task
+    (computed with one NumPy call); ``vectorized=false`` sends Celery chunks of
+    the scalar ``ai_task_worker.power`` task instead.
+    """
+    batch_id = uuid.uuid4().hex
+    await result_store.create_batch(batch_id, len(req.items), {"operation": "power"})
+    task_ids = [_batch_task_id(batch_id, index) for index in range(len(req.items))]
+    chunk_size = req.chunk_size or BULK_CHUNK_SIZE
+    if req.vectorized:
+        messages = []
+        for start in range(0, len(task_ids), chunk_size):
+            part = req.items[start : start + chunk_size]
+            args = (
+                task_ids[start : start + chunk_size],
+                [item.base for item in part],
+                [item.exp for item in part],
+                batch_id,
+            )
+            messages.append(("ai_task_worker.power_batch", args))
+        await _publish(_send_many, messages)
+    else:
+        args = [(task_id, item.base, item.exp, batch_id) for task_id, item in zip(task_ids, req.items)]
+        signature = chunks(celery_app.signature("ai_task_worker.power"), args, chunk_size, app=celery_app)
+        await _publish(signature.apply_async, queue=_queue_for("ai_task_worker.power"))
+    return BatchResponse(batch_id=batch_id, total=len(task_ids), status="PENDING")
+
+
+@app.get("/api/batches/{batch_id}", response_model=BatchStatusResponse)
+async def get_batch(
+    batch_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(0, ge=0, le=1000, description="Item results to include (0 = progress only)"),
+) -> BatchStatusResponse:
+    batch = await result_store.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired batch")
+    total, done, failed = int(batch["total"]), int(batch.get("done", 0)), int(batch.get("failed", 0))
+    finished = done + failed
+    if finished < total:
+        status = "PENDING"
+    else:
+        status = "SUCCESS" if not failed else "PARTIAL_FAILURE"
+    results = None
+    if limit:
+        task_ids = [_batch_task_id(batch_id, i) for i in range(offset, min(total, offset + limit))]
+        results = await result_store.get_many(task_ids)
+    return BatchStatusResponse(
+        batch_id=batch_id,
+        total=total,
+        status=status,
+        done=done,
+        failed=failed,
+        pending=max(0, total - finished),
+        progress=round(finished / total, 4) if total else 1.0,
+        results=results,
+    )
+
+
+@app.get("/api/tasks/{task_id}", response_model=TaskStatusResponse)
+async def get_task(
+    task_id: str,
+    wait: float = Query(0, ge=0, description="Seconds to long-poll for a final status"),
+) -> TaskStatusResponse:
+    if wait > 0:
+        payload = await result_store.wait(task_id, timeout=min(wait, TASK_MAX_WAIT))
+    else:
+        payload = await result_store.get(task_id)
+    if payload is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired task")
+    return TaskStatusResponse(task_id=task_id, status=task_status(payload), payload=payload)
+
+
+@app.get("/api/tasks/{task_id}/events")
+async def task_events(
+    task_id: str,
+    timeout: float = Query(TASK_MAX_WAIT, gt=0, description="Close the stream after this many seconds"),
+) -> StreamingResponse:
+    async def stream():
+        async for payload in result_store.updates(task_id, timeout=min(timeout, TASK_MAX_WAIT)):
+            status = task_status(payload) if payload is not None else "UNKNOWN"
+            data = json.dumps({"task_id": task_id, "status": status, "payload": payload})
+            yield f"event: status\ndata: {data}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
 @app.get("/healthz")
 async def healthcheck():
     return {"status": "ok"}
@@ -0,0 +1,245 @@
+"""
+Micro-batching Redis store for task payloads (asyncio).
+
+Concurrent ``await result_store.put(...)`` calls are collected for up to
+RESULT_FLUSH_MS and written through one non-transactional pipeline; each
+caller resumes once its batch is acknowledged. Every key gets a TTL so
+Redis memory stays bounded.
+
+Every write (here and in the worker) publishes the task status on
+"<RESULT_CHANNEL_PREFIX><task_id>". One shared pattern subscription per
+process wakes ``wait``/``updates`` callers, so status endpoints can block
+until a result lands instead of polling Redis.
+
+Env vars:
+- RESULT_TTL_SECONDS: expiry for result keys, 0 disables (default: 86400)
+- RESULT_FLUSH_MS: max time a write waits for its batch (default: 2)
+- RESULT_BATCH_SIZE: flush as soon as this many writes are queued (default: 500)
+- RESULT_STORE_FORMAT: "json" (one JSON string, plain GET) or "hash"
+  (top-level fields as JSON-encoded hash fields, see result_codec.py) — must match the worker (default: "json")
+- RESULT_CHANNEL_PREFIX: notification channel prefix, must match the worker (default: "task-results:")
+- RESULT_BATCH_PREFIX: batch progress hashes ("total"/"done"/"failed"), must match the worker (default: "batch:")
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple
+
+import redis.asyncio as aioredis
+
+from result_codec import FAILED_STATUSES, FINAL_STATUSES, decode_fields, encode_fields, task_status
+
+logger = logging.getLogger(__name__)
+
+RESULT_TTL_SECONDS = int(os.getenv("RESULT_TTL_SECONDS", "86400"))
+RESULT_FLUSH_MS = float(os.getenv("RESULT_FLUSH_MS", "2"))
+RESULT_BATCH_SIZE = int(os.getenv("RESULT_BATCH_SIZE", "500"))
+RESULT_STORE_FORMAT = os.getenv("RESULT_STORE_FORMAT", "json")
+RESULT_CHANNEL_PREFIX = os.getenv("RESULT_CHANNEL_PREFIX", "task-results:")
+RESULT_BATCH_PREFIX = os.getenv("RESULT_BATCH_PREFIX", "batch:")
+
+
+class AsyncResultStore:
+    """Collects concurrent writes into pipelined, TTL-aware batches."""
+
+    def __init__(
+        self,
+        client: Callable[[], aioredis.Redis],
+        *,
+        ttl: int = RESULT_TTL_SECONDS,
+        flush_ms: float = RESULT_FLUSH_MS,
+        batch_size: int = RESULT_BATCH_SIZE,
+        fmt: str = RESULT_STORE_FORMAT,
+    ) -> None:
+        self._client = client
+        self.ttl = ttl
+        self._flush_seconds = flush_ms / 1000
+        self._batch_size = max(1, batch_size)
+        self.fmt = fmt
+        self._pending: List[Tuple[str, Dict[str, Any], str | None, asyncio.Future]] = []
+        self._timer: asyncio.Task | None = None
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._listener: asyncio.Task | None = None
+
+    async def put(self, task_id: str, payload: Dict[str, Any], batch_id: str | None = None) -> None:
+        await self.put_many([(task_id, payload)], batch_id=batch_id)
+
+    async def put_many(self, items: List[Tuple[str, Dict[str, Any]]], batch_id: str | None = None) -> None:
+        """Queue writes and wait until the batch containing them is stored."""
+        if not items:
+            return
+        loop = asyncio.get_running_loop()
+        futures = []
+        for task_id, payload in items:
+            future = loop.create_future()
+            self._pending.append((task_id, payload, batch_id, future))
+            futures.append(future)
+        if len(self._pending) >= self._batch_size:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+        await asyncio.gather(*futures)
+
+    async def get(self, task_id: str) -> Dict[str, Any] | None:
+        client = self._client()
+        if self.fmt == "hash":
+            fields = await client.hgetall(task_id)
+            return decode_fields(fields) if fields else None
+        raw = await client.get(task_id)
+        return json.loads(raw) if raw else None
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._flush_seconds)
+        await self.flush()
+
+    async def flush(self) -> None:
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        ex = self.ttl if self.ttl > 0 else None
+        pipe = self._client().pipeline(transaction=False)
+        for task_id, payload, batch_id, _ in batch:
+            status = task_status(payload)
+            if self.fmt == "hash":
+                pipe.hset(task_id, mapping=encode_fields(payload))
+                if ex:
+                    pipe.expire(task_id, ex)
+            else:
+                pipe.set(task_id, json.dumps(payload, separators=(",", ":")), ex=ex)
+            pipe.publish(RESULT_CHANNEL_PREFIX + task_id, status)
+            if batch_id and status in FINAL_STATUSES:
+                counter = "failed" if status in FAILED_STATUSES else "done"
+                pipe.hincrby(RESULT_BATCH_PREFIX + batch_id, counter, 1)
+        try:
+            await pipe.execute()
+        except Exception as exc:  # noqa: BLE001 - surface to every waiting caller
+            logger.warning("Failed to write %s task results: %s", len(batch), exc)
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for *_, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    async def create_batch(self, batch_id: str, total: int, meta: Dict[str, Any] | None = None) -> None:
+        """Create the progress hash that result writes tagged with ``batch_id`` count into."""
+        key = RESULT_BATCH_PREFIX + batch_id
+        fields = {"total": total, "done": 0, "failed": 0, "created": time.time(), **encode_fields(meta or {})}
+        pipe = self._client().pipeline(transaction=False)
+        pipe.hset(key, mapping=fields)
+        if self.ttl > 0:
+            pipe.expire(key, self.ttl)
+        await pipe.execute()
+
+    async def get_batch(self, batch_id: str) -> Dict[str, Any] | None:
+        fields = await self._client().hgetall(RESULT_BATCH_PREFIX + batch_id)
+        return decode_fields(fields) if fields else None
+
+    async def get_many(self, task_ids: List[str]) -> List[Dict[str, Any] | None]:
+        if not task_ids:
+            return []
+        client = self._client()
+        if self.fmt == "hash":
+            pipe = client.pipeline(transaction=False)
+            for task_id in task_ids:
+                pipe.hgetall(task_id)
+            return [decode_fields(fields) if fields else None for fields in await pipe.execute()]
+        return [json.loads(raw) if raw else None for raw in await client.mget(task_ids)]
+
+    async def updates(self, task_id: str, timeout: float) -> AsyncIterator[Dict[str, Any] | None]:
+        """
+        Yield the stored payload now and after every change, until it reaches a
+        final status or ``timeout`` seconds pass.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        last: Dict[str, Any] | None = None
+        first = True
+        while True:
+            # Watch before reading so a write landing in between is not missed.
+            notified = self._watch(task_id)
+            try:
+                payload = await self.get(task_id)
+                if first or payload != last:
+                    first = False
+                    last = payload
+                    yield payload
+                if payload is not None and task_status(payload) in FINAL_STATUSES:
+                    return
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(notified, remaining)
+                except asyncio.TimeoutError:
+                    pass  # one last read on the next pass, then the deadline check returns
+            finally:
+                self._unwatch(task_id, notified)
+
+    async def wait(self, task_id: str, timeout: float) -> Dict[str, Any] | None:
+        """Long-poll: the final payload, or the latest one when ``timeout`` expires."""
+        payload = None
+        async for payload in self.updates(task_id, timeout):
+            pass
+        return payload
+
+    def start(self) -> None:
+        """Subscribe to result notifications ahead of the first waiter."""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    def _watch(self, task_id: str) -> asyncio.Future:
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(task_id, []).append(future)
+        return future
+
+    def _unwatch(self, task_id: str, future: asyncio.Future) -> None:
+        waiters = self._waiters.get(task_id)
+        if not waiters:
+            return
+        if future in waiters:
+            waiters.remove(future)
+        if not waiters:
+            del self._waiters[task_id]
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self._client().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(RESULT_CHANNEL_PREFIX + "*")
+                async for message in pubsub.listen():
+                    if message.get("type") != "pmessage":
+                        continue
+                    task_id = str(message["channel"])[len(RESULT_CHANNEL_PREFIX):]
+                    for future in self._waiters.get(task_id, ()):
+                        if not future.done():
+                            future.set_result(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001 - waiters fall back to their timeout
+                logger.warning("Result notification listener failed, resubscribing: %s", exc)
+                await asyncio.sleep(1.0)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:  # pragma: no cover - connection already gone
+                    pass
+
+    async def close(self) -> None:
+        """Flush queued writes and stop the listener (call before closing the Redis pool)."""
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self.flush()
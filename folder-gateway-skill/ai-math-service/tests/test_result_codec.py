@@ -0,0 +1,36 @@
+import filecmp
+from pathlib import Path
+
+import pytest
+
+from result_codec import decode_fields, encode_fields, task_status
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"status": "SUCCESS", "message": "123"},
+        {"status": "SUCCESS", "message": "true", "note": "null", "empty": ""},
+        {"status": {"general_status": "FAILURE"}, "data": {"a": [1, 2.5, None]}, "count": 3},
+        {"status": "PENDING", "data": None, "flag": False, "text": "plain words"},
+    ],
+)
+def test_hash_fields_round_trip(payload):
+    encoded = encode_fields(payload)
+    assert all(isinstance(value, str) for value in encoded.values())
+    assert decode_fields(encoded) == payload
+
+
+def test_decode_keeps_non_json_values_written_elsewhere():
+    assert decode_fields({"total": "5", "label": "not json"}) == {"total": 5, "label": "not json"}
+
+
+def test_task_status_reads_queue_style_and_plain_payloads():
+    assert task_status({"status": {"general_status": "SUCCESS"}}) == "SUCCESS"
+    assert task_status({"status": "FAILURE"}) == "FAILURE"
+    assert task_status({}) == ""
+
+
+def test_worker_copy_is_identical():
+    here = Path(__file__).resolve().parents[1]
+    assert filecmp.cmp(here / "result_codec.py", here.parent / "ai-task-worker" / "app" / "result_codec.py", shallow=False)
@@ -0,0 +1,268 @@
+"""
+Opt-in memoization for expensive, deterministic task functions.
+
+    @app.task(name="...")
+    @memoize(ttl=600, ignore=("task_id",))
+    def slow(prompt: str, temperature: float = 0.0) -> dict: ...
+
+Arguments are bound to the function signature (defaults applied, ignored
+names dropped) and hashed as canonical JSON, so ``f(1, b=2)`` and
+``f(a=1, b=2)`` share an entry. Lookups go through a per-process LRU, then
+Redis (shared by every worker). Identical calls already running are
+deduplicated: threads in the same process wait on the first caller, other
+processes wait on a Redis lock and pick up its result. Exceptions are never
+cached; results that are not JSON serializable stay in the local tier only.
+
+Only memoize pure functions: the result must depend on the arguments alone
+and the call must have no side effects worth repeating. A cache hit skips the
+body entirely, so a task that generates ids, reads the clock or writes to the
+result store would hand back the first call's payload and skip the write.
+
+Env vars:
+- MEMO_ENABLED: global switch, "0" makes every memoized function run uncached (default: "1")
+- MEMO_TTL_SECONDS: default entry TTL (default: 3600)
+- MEMO_LOCAL_SIZE: per-process LRU entries, 0 disables the local tier (default: 1024)
+- MEMO_PREFIX: Redis key prefix for entries and in-flight locks (default: "memo:")
+- MEMO_LOCK_SECONDS: how long duplicates wait for the first caller before computing themselves (default: 300)
+- MEMO_POLL_MS: how often waiting duplicates check Redis (default: 50)
+"""
+import copy
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+import redis
+
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+MEMO_ENABLED = os.getenv("MEMO_ENABLED", "1").lower() not in {"0", "false", "no"}
+MEMO_TTL_SECONDS = int(os.getenv("MEMO_TTL_SECONDS", "3600"))
+MEMO_LOCAL_SIZE = int(os.getenv("MEMO_LOCAL_SIZE", "1024"))
+MEMO_PREFIX = os.getenv("MEMO_PREFIX", "memo:")
+MEMO_LOCK_SECONDS = float(os.getenv("MEMO_LOCK_SECONDS", "300"))
+MEMO_POLL_MS = float(os.getenv("MEMO_POLL_MS", "50"))
+
+_MISS = object()
+
+# Delete the in-flight lock only if this caller still owns it.
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class LocalLRU:
+    """Thread-safe LRU with per-entry expiry; stores and returns copies so callers may mutate results."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISS
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return _MISS
+            self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        if self.size <= 0:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalLRU(MEMO_LOCAL_SIZE)
+_inflight: Dict[str, threading.Event] = {}
+_inflight_lock = threading.Lock()
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_normalize(item) for item in value]
+        return sorted(items, key=repr) if isinstance(value, (set, frozenset)) else items
+    return value
+
+
+def memo_key(
+    namespace: str, signature: inspect.Signature, args: tuple, kwargs: dict, ignore: Iterable[str] = ()
+) -> str:
+    """Cache key for one call: namespace plus a hash of its bound, normalized arguments."""
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    skip = set(ignore)
+    arguments = {name: _normalize(value) for name, value in bound.arguments.items() if name not in skip}
+    raw = json.dumps(arguments, sort_keys=True, separators=(",", ":"), default=repr)
+    return f"{MEMO_PREFIX}{namespace}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+
+def _redis_get(key: str) -> Any:
+    try:
+        raw = get_redis().get(key)
+    except redis.RedisError as exc:
+        logger.warning("Memo cache read failed for %s: %s", key, exc)
+        return _MISS
+    return _MISS if raw is None else json.loads(raw)
+
+
+def _redis_set(key: str, value: Any, ttl: int) -> None:
+    try:
+        encoded = json.dumps(value, separators=(",", ":"))
+    except (TypeError, ValueError):
+        logger.debug("Result for %s is not JSON serializable; not cached", key)
+        return
+    try:
+        get_redis().set(key, encoded, ex=ttl if ttl > 0 else None)
+    except redis.RedisError as exc:
+        logger.warning("Memo cache write failed for %s: %s", key, exc)
+
+
+def _acquire(lock_key: str, token: str) -> bool:
+    """Cross-process in-flight lock; if Redis is unreachable, compute without it."""
+    try:
+        return bool(get_redis().set(lock_key, token, nx=True, px=int(MEMO_LOCK_SECONDS * 1000)))
+    except redis.RedisError:
+        return True
+
+
+def _release(lock_key: str, token: str) -> None:
+    try:
+        get_redis().eval(_RELEASE_LOCK, 1, lock_key, token)
+    except redis.RedisError as exc:
+        logger.warning("Failed to release memo lock %s: %s", lock_key, exc)
+
+
+def _wait_for_peer(key: str, lock_key: str) -> Any:
+    """Poll for the result another process is computing; _MISS if its lock goes away first."""
+    deadline = time.monotonic() + MEMO_LOCK_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(MEMO_POLL_MS / 1000)
+        value = _redis_get(key)
+        if value is not _MISS:
+            return value
+        try:
+            if not get_redis().exists(lock_key):
+                return _redis_get(key)
+        except redis.RedisError:
+            return _MISS
+    return _MISS
+
+
+def memoize(
+    ttl: int | None = None,
+    *,
+    ignore: Iterable[str] = (),
+    namespace: str | None = None,
+    shared: bool = True,
+    cache_if: Callable[[Any], bool] | None = None,
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Cache a deterministic function's results by its arguments.
+
+    ``ignore`` drops arguments that do not affect the result (task ids, batch
+    ids). ``shared=False`` keeps the cache per process (no Redis). ``cache_if``
+    filters what is stored, e.g. ``lambda r: r.get("status") == "SUCCESS"``.
+    """
+    entry_ttl = MEMO_TTL_SECONDS if ttl is None else ttl
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        signature = inspect.signature(func)
+        name = namespace or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not MEMO_ENABLED:
+                return func(*args, **kwargs)
+            key = memo_key(name, signature, args, kwargs, ignore)
+            value = _lookup(key)
+            if value is not _MISS:
+                return value
+
+            # Same-process duplicates wait for the first caller.
+            with _inflight_lock:
+                event = _inflight.get(key)
+                leader = event is None
+                if leader:
+                    event = _inflight[key] = threading.Event()
+            if not leader:
+                event.wait(MEMO_LOCK_SECONDS)
+                value = _lookup(key)
+                if value is not _MISS:
+                    return value
+                return func(*args, **kwargs)
+
+            try:
+                return _compute(key, func, args, kwargs)
+            finally:
+                with _inflight_lock:
+                    _inflight.pop(key, None)
+                event.set()
+
+        def _lookup(key: str) -> Any:
+            value = local_cache.get(key)
+            if value is _MISS and shared:
+                value = _redis_get(key)
+                if value is not _MISS:
+                    local_cache.set(key, value, entry_ttl or MEMO_TTL_SECONDS)
+            return value
+
+        def _store(key: str, value: Any) -> None:
+            if cache_if is not None and not cache_if(value):
+                return
+            local_cache.set(key, value, entry_ttl or MEMO_TTL_SECONDS)
+            if shared:
+                _redis_set(key, value, entry_ttl)
+
+        def _compute(key: str, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+            if not shared:
+                value = fn(*args, **kwargs)
+                _store(key, value)
+                return value
+            lock_key = key + ":lock"
+            token = uuid.uuid4().hex
+            if not _acquire(lock_key, token):
+                value = _wait_for_peer(key, lock_key)
+                if value is not _MISS:
+                    local_cache.set(key, value, entry_ttl or MEMO_TTL_SECONDS)
+                    return value
+                token = ""  # peer failed or timed out: compute without owning the lock
+            try:
+                value = fn(*args, **kwargs)
+                _store(key, value)
+                return value
+            finally:
+                if token:
+                    _release(lock_key, token)
+
+        wrapper.memo_key = lambda *args, **kwargs: memo_key(name, signature, args, kwargs, ignore)  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
@@ -1,14 +1,11 @@
-import json
+import re
 import time
 import uuid
-
-import redis
+from collections import Counter
 
 from app.celery_app import app
-
-
-def _redis_client() -> redis.Redis:
-    return redis.Redis.from_url("redis://redis:6379/0", decode_responses=True)
+from app.memo import memoize
+from app.result_store import result_store
 
 
 @app.task(name="app.plugins.sample_tasks.sleep_echo")
@@ -17,5 +14,14 @@ def sleep_echo(message: str, delay: float = 1.0) -> dict:
     time.sleep(delay)
     task_id = uuid.uuid4().hex
     payload = {"task_id": task_id, "status": "SUCCESS", "message": message, "delay": delay}
-    _redis_client().set(task_id, json.dumps(payload))
+    result_store.put(task_id, payload)
     return payload
+
+
+@app.task(name="app.plugins.sample_tasks.text_stats")
+@memoize(ttl=600)
+def text_stats(text: str, top: int = 5) -> dict:
+    """Demo plugin task: word counts for a text (pure, so memoized)."""
+    words = re.findall(r"\w+", text.lower())
+    counts = Counter(words)
+    return {"words": len(words), "unique": len(counts), "top": counts.most_common(top)}
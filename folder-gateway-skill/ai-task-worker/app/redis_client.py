@@ -0,0 +1,62 @@
+"""Per-process pooled Redis client shared by worker tasks."""
+import logging
+import os
+import threading
+from typing import Callable, List
+
+import redis
+from celery.signals import worker_process_shutdown, worker_shutdown
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "10"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+
+_client: redis.Redis | None = None
+_lock = threading.Lock()
+_before_close: List[Callable[[], None]] = []
+
+
+def get_redis() -> redis.Redis:
+    """
+    Return the process-wide client, creating its connection pool on first use.
+
+    The pool is created lazily so each prefork child builds its own after fork;
+    thread-pool workers share it (BlockingConnectionPool waits for a free
+    connection instead of failing when all are busy).
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                pool = redis.BlockingConnectionPool.from_url(
+                    REDIS_URL,
+                    max_connections=REDIS_POOL_SIZE,
+                    timeout=REDIS_POOL_TIMEOUT,
+                    decode_responses=True,
+                )
+                _client = redis.Redis(connection_pool=pool)
+    return _client
+
+
+def before_close(func: Callable[[], None]) -> Callable[[], None]:
+    """Run ``func`` at worker shutdown before the pool is closed (e.g. to flush buffered writes)."""
+    _before_close.append(func)
+    return func
+
+
+# worker_process_shutdown fires in prefork children; worker_shutdown covers
+# the solo/threads pools (e.g. the io profile), where tasks run in the main process.
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _close_pool(**_kwargs) -> None:
+    global _client
+    for func in _before_close:
+        try:
+            func()
+        except Exception as exc:  # noqa: BLE001 - still close the pool
+            logger.warning("Shutdown hook %s failed: %s", getattr(func, "__name__", func), exc)
+    if _client is not None:
+        _client.connection_pool.disconnect()
+        _client = None
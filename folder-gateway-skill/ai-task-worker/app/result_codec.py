@@ -0,0 +1,37 @@
+"""
+Result payload encoding shared by ai-math-service and ai-task-worker.
+
+ai-task-worker/app/result_codec.py is a copy of this file (each service has
+its own Docker build context); keep them identical so both sides read and
+write the same RESULT_STORE_FORMAT.
+
+In "hash" format every top-level field is stored JSON-encoded, strings
+included, so a message such as "123" or "null" reads back as the same string.
+"""
+import json
+from typing import Any, Dict
+
+FINAL_STATUSES = {"SUCCESS", "FAILURE", "ERROR", "REVOKED"}
+FAILED_STATUSES = {"FAILURE", "ERROR", "REVOKED"}
+
+
+def task_status(payload: Dict[str, Any]) -> str:
+    """general_status for queue-style payloads, plain status string otherwise."""
+    status = payload.get("status")
+    if isinstance(status, dict):
+        status = status.get("general_status")
+    return str(status or "")
+
+
+def encode_fields(payload: Dict[str, Any]) -> Dict[str, str]:
+    return {key: json.dumps(value, separators=(",", ":")) for key, value in payload.items()}
+
+
+def decode_fields(fields: Dict[str, str]) -> Dict[str, Any]:
+    decoded: Dict[str, Any] = {}
+    for key, value in fields.items():
+        try:
+            decoded[key] = json.loads(value)
+        except ValueError:
+            decoded[key] = value  # written by something other than encode_fields
+    return decoded
@@ -0,0 +1,167 @@
+"""
+Buffered Redis store for task result payloads.
+
+``result_store.put`` queues the payload and blocks until the micro-batch
+holding it has been written: a background thread flushes concurrent writes
+(threads pool, or several items from one task) through one non-transactional
+pipeline, then wakes every writer of that batch. A failed pipeline raises in
+each writer, so the Celery task fails instead of reporting SUCCESS for a
+result that never reached Redis. Every key gets a TTL so Redis memory stays
+bounded.
+
+Env vars:
+- RESULT_TTL_SECONDS: expiry for result keys, 0 disables (default: 86400)
+- RESULT_FLUSH_MS: max time a write waits for its batch (default: 5)
+- RESULT_BATCH_SIZE: flush as soon as this many writes are queued (default: 500)
+- RESULT_WRITE_TIMEOUT: seconds ``put`` waits for its batch before raising (default: 30)
+- RESULT_STORE_FORMAT: "json" stores one JSON string per task (readable with
+  plain GET, the format gateway pollers expect); "hash" stores top-level
+  fields (status, time, data, ...) as JSON-encoded hash fields (see
+  result_codec.py) so status can be read without decoding data (default: "json")
+- RESULT_CHANNEL_PREFIX: each write also publishes the task status on
+  "<prefix><task_id>" so pollers can wait instead of spinning (default: "task-results:")
+- RESULT_BATCH_PREFIX: writes tagged with a batch id bump the "done"/"failed"
+  counters of the "<prefix><batch_id>" hash created by ai-math-service (default: "batch:")
+"""
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+import redis
+
+from .redis_client import before_close, get_redis
+from .result_codec import FAILED_STATUSES, FINAL_STATUSES, decode_fields, encode_fields, task_status
+
+logger = logging.getLogger(__name__)
+
+RESULT_TTL_SECONDS = int(os.getenv("RESULT_TTL_SECONDS", "86400"))
+RESULT_FLUSH_MS = float(os.getenv("RESULT_FLUSH_MS", "5"))
+RESULT_BATCH_SIZE = int(os.getenv("RESULT_BATCH_SIZE", "500"))
+RESULT_WRITE_TIMEOUT = float(os.getenv("RESULT_WRITE_TIMEOUT", "30"))
+RESULT_STORE_FORMAT = os.getenv("RESULT_STORE_FORMAT", "json")
+RESULT_CHANNEL_PREFIX = os.getenv("RESULT_CHANNEL_PREFIX", "task-results:")
+RESULT_BATCH_PREFIX = os.getenv("RESULT_BATCH_PREFIX", "batch:")
+
+
+class _Batch:
+    """Writes flushed in one pipeline; writers wait on ``done`` and check ``error``."""
+
+    __slots__ = ("items", "done", "error")
+
+    def __init__(self) -> None:
+        self.items: List[Tuple[str, Dict[str, Any], str | None]] = []
+        self.done = threading.Event()
+        self.error: Exception | None = None
+
+
+class ResultStore:
+    """Micro-batching, TTL-aware writer for task payloads."""
+
+    def __init__(
+        self,
+        client: Callable[[], redis.Redis] = get_redis,
+        *,
+        ttl: int = RESULT_TTL_SECONDS,
+        flush_ms: float = RESULT_FLUSH_MS,
+        batch_size: int = RESULT_BATCH_SIZE,
+        fmt: str = RESULT_STORE_FORMAT,
+        write_timeout: float = RESULT_WRITE_TIMEOUT,
+    ) -> None:
+        self._client = client
+        self.ttl = ttl
+        self._flush_seconds = flush_ms / 1000
+        self._batch_size = max(1, batch_size)
+        self.fmt = fmt
+        self._write_timeout = write_timeout
+        self._open = _Batch()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._pid = 0
+
+    def put(self, task_id: str, payload: Dict[str, Any], batch_id: str | None = None) -> None:
+        """Write a payload; returns once its batch is stored, raises redis.RedisError otherwise."""
+        self.put_many([(task_id, payload)], batch_id=batch_id)
+
+    def put_many(self, items: List[Tuple[str, Dict[str, Any]]], batch_id: str | None = None) -> None:
+        if not items:
+            return
+        with self._cond:
+            batch = self._open
+            was_idle = not batch.items
+            batch.items.extend((task_id, payload, batch_id) for task_id, payload in items)
+            self._ensure_thread()
+            # Wake the flusher when it is idle or the batch is full; otherwise
+            # let it finish the current batching window.
+            if was_idle or len(batch.items) >= self._batch_size:
+                self._cond.notify()
+        if not batch.done.wait(self._write_timeout):
+            raise redis.TimeoutError(f"{len(items)} task result(s) not written within {self._write_timeout}s")
+        if batch.error is not None:
+            raise redis.RedisError(f"Failed to write {len(items)} task result(s): {batch.error}") from batch.error
+
+    def get(self, task_id: str) -> Dict[str, Any] | None:
+        client = self._client()
+        if self.fmt == "hash":
+            fields = client.hgetall(task_id)
+            return decode_fields(fields) if fields else None
+        raw = client.get(task_id)
+        return json.loads(raw) if raw else None
+
+    def flush(self) -> None:
+        """Write everything queued so far and wake its writers (called by the flusher and at shutdown)."""
+        with self._cond:
+            batch, self._open = self._open, _Batch()
+        if batch.items:
+            try:
+                self._write(batch.items)
+            except Exception as exc:  # noqa: BLE001 - handed to every writer of the batch
+                logger.warning("Failed to write %s task results: %s", len(batch.items), exc)
+                batch.error = exc
+        batch.done.set()
+
+    def _write(self, batch: List[Tuple[str, Dict[str, Any], str | None]]) -> None:
+        ex = self.ttl if self.ttl > 0 else None
+        pipe = self._client().pipeline(transaction=False)
+        for task_id, payload, batch_id in batch:
+            status = task_status(payload)
+            if self.fmt == "hash":
+                pipe.hset(task_id, mapping=encode_fields(payload))
+                if ex:
+                    pipe.expire(task_id, ex)
+            else:
+                pipe.set(task_id, json.dumps(payload, separators=(",", ":")), ex=ex)
+            pipe.publish(RESULT_CHANNEL_PREFIX + task_id, status)
+            if batch_id and status in FINAL_STATUSES:
+                counter = "failed" if status in FAILED_STATUSES else "done"
+                pipe.hincrby(RESULT_BATCH_PREFIX + batch_id, counter, 1)
+        # Not retried: the pipeline is not transactional, so a partial replay
+        # would double-count batch progress. The task fails and Celery decides.
+        pipe.execute()
+
+    def _ensure_thread(self) -> None:
+        # Started lazily (and again after fork) so every prefork child owns its flusher.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="result-store-flusher", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._open.items:
+                    self._cond.wait()
+                if len(self._open.items) < self._batch_size:
+                    self._cond.wait(self._flush_seconds)
+            self.flush()
+
+
+result_store = ResultStore()
+
+
+# Runs from redis_client's shutdown handler, before the connection pool closes.
+@before_close
+def _flush_results() -> None:
+    result_store.flush()
@@ -1,29 +1,97 @@
-import json
-import os
 import time
 import uuid
-
-import redis
+from typing import Any, Callable, Dict, List, Sequence, Tuple
 
 from .celery_app import app
+from .result_store import result_store
+
+# name -> (NumPy function name or ufunc-like callable, payload names of its operands).
+# Built-ins are stored by name so NumPy is only imported by the first batch task,
+# not by every worker at startup.
+ELEMENTWISE_OPS: Dict[str, Tuple[str | Callable[..., Any], Tuple[str, ...]]] = {
+    "power": ("power", ("base", "exp")),
+    "multiply": ("multiply", ("a", "b")),
+    "add": ("add", ("a", "b")),
+    "subtract": ("subtract", ("a", "b")),
+    "divide": ("true_divide", ("a", "b")),
+    "sqrt": ("sqrt", ("x",)),
+}
+
+
+def register_elementwise_op(name: str, func: str | Callable[..., Any], arg_names: Sequence[str]) -> None:
+    """Expose another vectorized op (callable or NumPy function name) to ai_task_worker.elementwise_batch."""
+    ELEMENTWISE_OPS[name] = (func, tuple(arg_names))
+
+
+def _run_elementwise(
+    op: str, task_ids: List[str], operands: Sequence[Sequence[float]], batch_id: str | None = None
+) -> dict:
+    """
+    Compute ``op`` over whole operand arrays in one NumPy call and queue every
+    item payload in one result-store write (a single pipeline flush).
+    Non-finite results (overflow, domain errors) are stored as FAILURE items.
+    """
+    import numpy as np
+
+    func, arg_names = ELEMENTWISE_OPS[op]
+    if isinstance(func, str):
+        func = getattr(np, func)
+    if len(operands) != len(arg_names):
+        raise ValueError(f"{op} expects {len(arg_names)} operand arrays, got {len(operands)}")
+    arrays = [np.asarray(values, dtype=np.float64) for values in operands]
+    if any(array.shape != (len(task_ids),) for array in arrays):
+        raise ValueError("operand arrays must match task_ids length")
 
+    start = str(time.time())
+    with np.errstate(all="ignore"):
+        results = func(*arrays)
+    finite = np.isfinite(results)
+    end = str(time.time())
 
-def _redis_client() -> redis.Redis:
-    return redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"), decode_responses=True)
+    columns = [array.tolist() for array in arrays]
+    result_values = results.tolist()
+    ok_flags = finite.tolist()
+    items = []
+    for index, task_id in enumerate(task_ids):
+        status = "SUCCESS" if ok_flags[index] else "FAILURE"
+        data = {"operation": op, **{name: column[index] for name, column in zip(arg_names, columns)}}
+        data["result"] = result_values[index] if ok_flags[index] else None
+        items.append(
+            (
+                task_id,
+                {
+                    "task_id": task_id,
+                    "status": {"general_status": status, "queue_status": status},
+                    "time": {"start_generate": start, "end_generate": end},
+                    "data": data,
+                },
+            )
+        )
+    result_store.put_many(items, batch_id=batch_id)
+    failed = len(task_ids) - int(finite.sum())
+    return {"operation": op, "count": len(task_ids), "failed": failed, "batch_id": batch_id}
 
 
 @app.task(name="ai_task_worker.power")
-def power(task_id: str, base: float, exp: float) -> dict:
+def power(task_id: str, base: float, exp: float, batch_id: str | None = None) -> dict:
     """Compute power and store a queue-style payload in Redis for gateway polling."""
     start = time.time()
-    result = base**exp
+    try:
+        result = base**exp
+        status, error = "SUCCESS", None
+    except (OverflowError, ZeroDivisionError) as exc:
+        result = None
+        status, error = "FAILURE", str(exc)
+    data = {"operation": "power", "base": base, "exp": exp, "result": result}
+    if error:
+        data["error"] = error
     payload = {
         "task_id": task_id,
-        "status": {"general_status": "SUCCESS", "queue_status": "SUCCESS"},
+        "status": {"general_status": status, "queue_status": status},
         "time": {"start_generate": str(start), "end_generate": str(time.time())},
-        "data": {"operation": "power", "base": base, "exp": exp, "result": result},
+        "data": data,
     }
-    _redis_client().set(task_id, json.dumps(payload))
+    result_store.put(task_id, payload, batch_id=batch_id)
     return payload
 
 
@@ -32,5 +100,25 @@ def echo(message: str) -> dict:
     """Simple echo task to verify worker wiring."""
     task_id = uuid.uuid4().hex
     payload = {"task_id": task_id, "status": "SUCCESS", "message": message}
-    _redis_client().set(task_id, json.dumps(payload))
+    result_store.put(task_id, payload)
     return payload
+
+
+@app.task(name="ai_task_worker.elementwise_batch")
+def elementwise_batch(
+    op: str, task_ids: List[str], operands: List[List[float]], batch_id: str | None = None
+) -> dict:
+    """Vectorized batch of any registered elementwise op (see ELEMENTWISE_OPS)."""
+    return _run_elementwise(op, task_ids, operands, batch_id)
+
+
+@app.task(name="ai_task_worker.power_batch")
+def power_batch(task_ids: List[str], bases: List[float], exps: List[float], batch_id: str | None = None) -> dict:
+    """Vectorized ai_task_worker.power: one message, one NumPy call, one Redis pipeline."""
+    return _run_elementwise("power", task_ids, [bases, exps], batch_id)
+
+
+@app.task(name="ai_task_worker.multiply_batch")
+def multiply_batch(task_ids: List[str], a: List[float], b: List[float], batch_id: str | None = None) -> dict:
+    """Vectorized multiply over paired arrays."""
+    return _run_elementwise("multiply", task_ids, [a, b], batch_id)
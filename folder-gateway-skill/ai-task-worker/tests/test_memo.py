@@ -0,0 +1,137 @@
+import inspect
+import json
+import threading
+import time
+
+import pytest
+
+from app import memo
+from app.memo import memo_key, memoize
+
+
+class FakeRedis:
+    """get/set (ex, nx, px)/exists/eval, enough for memo's entries and in-flight locks."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False, px=None):
+        with self.lock:
+            if nx and key in self.data:
+                return None
+            self.data[key] = value
+            self.ttls[key] = ex
+            return True
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def eval(self, script, numkeys, key, token):
+        with self.lock:
+            if self.data.get(key) == token:
+                del self.data[key]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(memo, "get_redis", lambda: fake)
+    monkeypatch.setattr(memo, "MEMO_POLL_MS", 1)
+    memo.local_cache.clear()
+    yield fake
+    memo.local_cache.clear()
+
+
+def test_key_binds_defaults_drops_ignored_and_normalizes():
+    def f(a, b=2, task_id=None, tags=()):
+        pass
+
+    sig = inspect.signature(f)
+    key = memo_key("ns", sig, (1,), {"task_id": "t1", "tags": {"y", "x"}}, ignore=("task_id",))
+    assert key == memo_key("ns", sig, (), {"a": 1, "b": 2, "task_id": "t2", "tags": ["x", "y"]}, ignore=("task_id",))
+    assert key.startswith(memo.MEMO_PREFIX + "ns:")
+    assert key != memo_key("ns", sig, (1, 3), {}, ignore=("task_id",))
+    assert key != memo_key("other", sig, (1,), {"tags": ["x", "y"]}, ignore=("task_id",))
+
+
+def test_local_hit_skips_the_call_and_returns_a_copy(server):
+    calls = []
+
+    @memoize(ttl=60)
+    def double(x):
+        calls.append(x)
+        return {"value": x * 2}
+
+    first = double(2)
+    first["value"] = "mutated"
+    server.data.clear()  # only the local tier can answer now
+    assert double(2) == {"value": 4}
+    assert double(x=2) == {"value": 4}
+    assert calls == [2]
+
+
+def test_redis_hit_and_miss(server):
+    calls = []
+
+    @memoize(ttl=60, namespace="square")
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    server.data[square.memo_key(3)] = json.dumps(99)  # written by another worker
+    assert square(3) == 99
+    assert square(4) == 16
+    assert calls == [4]
+    assert json.loads(server.data[square.memo_key(4)]) == 16
+    assert server.ttls[square.memo_key(4)] == 60
+    assert not any(key.endswith(":lock") for key in server.data)
+
+
+def test_concurrent_identical_calls_run_once(server):
+    calls = []
+    start = threading.Barrier(5)
+
+    @memoize(ttl=60)
+    def slow(x):
+        calls.append(x)
+        time.sleep(0.05)
+        return x + 1
+
+    results = []
+
+    def caller():
+        start.wait()
+        results.append(slow(1))
+
+    threads = [threading.Thread(target=caller) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [2] * 5
+    assert calls == [1]
+
+
+def test_cache_if_rejection_and_exceptions_are_not_cached(server):
+    calls = []
+
+    @memoize(ttl=60, cache_if=lambda result: result["status"] == "SUCCESS")
+    def task(x):
+        calls.append(x)
+        if x < 0:
+            raise ValueError("negative")
+        return {"status": "FAILURE" if x == 0 else "SUCCESS"}
+
+    assert task(0) == {"status": "FAILURE"}
+    assert task(0) == {"status": "FAILURE"}
+    with pytest.raises(ValueError):
+        task(-1)
+    with pytest.raises(ValueError):
+        task(-1)
+    assert calls == [0, 0, -1, -1]
+    assert server.data == {}
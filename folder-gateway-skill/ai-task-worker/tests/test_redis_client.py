@@ -0,0 +1,19 @@
+from types import SimpleNamespace
+
+import pytest
+from celery.signals import worker_process_shutdown, worker_shutdown
+
+from app import redis_client, result_store
+
+
+@pytest.mark.parametrize("signal", [worker_shutdown, worker_process_shutdown])
+def test_shutdown_flushes_results_before_closing_the_pool(monkeypatch, signal):
+    events = []
+    pool = SimpleNamespace(disconnect=lambda: events.append("disconnect"))
+    monkeypatch.setattr(redis_client, "_client", SimpleNamespace(connection_pool=pool))
+    monkeypatch.setattr(result_store.result_store, "flush", lambda: events.append("flush"))
+
+    signal.send(sender=None)
+
+    assert events == ["flush", "disconnect"]
+    assert redis_client._client is None
@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+import redis
+
+from app.result_codec import decode_fields
+from app.result_store import ResultStore
+
+
+class FakePipeline:
+    def __init__(self, server):
+        self.server = server
+        self.commands = []
+
+    def set(self, key, value, ex=None):
+        self.commands.append(("set", key, value))
+
+    def hset(self, key, mapping):
+        self.commands.append(("hset", key, mapping))
+
+    def expire(self, key, seconds):
+        pass
+
+    def publish(self, channel, message):
+        pass
+
+    def hincrby(self, key, field, amount):
+        self.commands.append(("hincrby", key, field))
+
+    def execute(self):
+        if self.server.fail:
+            raise redis.ConnectionError("redis is down")
+        self.server.executed.append(self.commands)
+
+
+class FakeRedis:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.executed = []
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+
+def test_put_returns_after_the_write():
+    server = FakeRedis()
+    store = ResultStore(lambda: server, flush_ms=1)
+    store.put("t1", {"status": "SUCCESS", "data": 1})
+    assert server.executed == [[("set", "t1", '{"status":"SUCCESS","data":1}')]]
+
+
+def test_concurrent_puts_share_one_pipeline():
+    server = FakeRedis()
+    store = ResultStore(lambda: server, flush_ms=200, batch_size=1000)
+    barrier = threading.Barrier(8)
+
+    def writer(n):
+        barrier.wait()
+        store.put(f"t{n}", {"status": "SUCCESS"})
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert sum(len(commands) for commands in server.executed) == 8
+    assert len(server.executed) < 8
+
+
+def test_put_raises_when_redis_fails():
+    store = ResultStore(lambda: FakeRedis(fail=True), flush_ms=1)
+    with pytest.raises(redis.RedisError, match="redis is down"):
+        store.put("t1", {"status": "SUCCESS"})
+
+
+def test_hash_format_round_trips_string_fields():
+    server = FakeRedis()
+    store = ResultStore(lambda: server, flush_ms=1, fmt="hash")
+    payload = {"status": "SUCCESS", "message": "123", "batch": None}
+    store.put_many([("t1", payload)], batch_id="b1")
+    (hset, hincrby), = server.executed
+    assert decode_fields(hset[2]) == payload
+    assert hincrby == ("hincrby", "batch:b1", "done")
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app import tasks
+
+WORKER_DIR = Path(__file__).resolve().parents[1]
+
+
+def test_importing_tasks_does_not_import_numpy():
+    code = "import sys, app.tasks; print('numpy' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=WORKER_DIR, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+
+def test_elementwise_batch_stores_every_item(monkeypatch):
+    stored = []
+    monkeypatch.setattr(tasks.result_store, "put_many", lambda items, batch_id=None: stored.extend(items))
+    summary = tasks._run_elementwise("divide", ["t1", "t2"], [[1.0, 1.0], [4.0, 0.0]], batch_id="b1")
+    assert summary == {"operation": "divide", "count": 2, "failed": 1, "batch_id": "b1"}
+    assert stored[0][1]["data"]["result"] == 0.25
+    assert stored[1][1]["status"]["general_status"] == "FAILURE"
+
+
+def test_elementwise_rejects_mismatched_operands():
+    with pytest.raises(ValueError):
+        tasks._run_elementwise("power", ["t1"], [[2.0]])
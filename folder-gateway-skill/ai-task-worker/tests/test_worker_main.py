@@ -0,0 +1,67 @@
+import sys
+import textwrap
+
+import pytest
+
+import worker_main
+from app.celery_app import app as celery_app
+
+PLUGIN = "lazy_demo_plugin"
+TASKS = ("lazy_demo.whoami", "lazy_demo.add")
+
+PLUGIN_SOURCE = textwrap.dedent(
+    """
+    from app.celery_app import app
+
+    # Proxies must stay registered while their module is imported.
+    REGISTERED_DURING_IMPORT = {name: name in app.tasks for name in ("lazy_demo.whoami", "lazy_demo.add")}
+
+
+    @app.task(name="lazy_demo.whoami", bind=True, max_retries=7, acks_late=True, rate_limit="10/m", time_limit=30)
+    def whoami(self, tag):
+        return {"tag": tag, "task_id": self.request.id, "max_retries": self.max_retries}
+
+
+    @app.task(name="lazy_demo.add")
+    def add(x, y):
+        return x + y
+    """
+)
+
+
+@pytest.fixture
+def lazy_worker(tmp_path, monkeypatch):
+    (tmp_path / f"{PLUGIN}.py").write_text(PLUGIN_SOURCE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setenv("EXTRA_TASK_MODULES", PLUGIN)
+    monkeypatch.setattr(worker_main, "WORKER_TASK_MANIFEST", str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(worker_main, "_lazy_tasks", {})
+    monkeypatch.setattr(worker_main, "_resolved_tasks", {})
+    monkeypatch.setattr(worker_main, "_task_from_fun", None)
+    yield
+    celery_app.__dict__.pop("_task_from_fun", None)
+    for name in TASKS:
+        celery_app.tasks.pop(name, None)
+    sys.modules.pop(PLUGIN, None)
+
+
+def _fresh_process():
+    """Forget the plugin as a newly started worker would."""
+    for name in TASKS:
+        celery_app.tasks.pop(name)
+    sys.modules.pop(PLUGIN)
+
+
+def test_lazy_proxy_keeps_task_options_and_runs_real_function(lazy_worker):
+    worker_main._load_lazily()  # builds the manifest (eager import)
+    _fresh_process()
+    worker_main._load_lazily()  # registers proxies only
+
+    assert PLUGIN not in sys.modules
+    proxy = celery_app.tasks["lazy_demo.whoami"]
+    assert (proxy.max_retries, proxy.acks_late, proxy.rate_limit, proxy.time_limit) == (7, True, "10/m", 30)
+
+    result = proxy.apply(args=("x",), task_id="t-1").get()
+    assert result == {"tag": "x", "task_id": "t-1", "max_retries": 7}
+    assert sys.modules[PLUGIN].REGISTERED_DURING_IMPORT == {name: True for name in TASKS}
+    assert celery_app.tasks["lazy_demo.add"].apply(args=(2, 3)).get() == 5
@@ -1,40 +1,67 @@
 from __future__ import annotations
 
+import fnmatch
+import hashlib
 import importlib
+import importlib.util
+import json
 import logging
 import os
 import pkgutil
-from typing import Iterable
+import sys
+import threading
+import time
+import types
+from typing import Any, Callable, Dict, Iterable
 
-from app.celery_app import app as celery_app  # noqa: F401
-import app.tasks  # noqa: F401  # keep the existing task module
+_STARTED = time.perf_counter()
+
+from celery.exceptions import NotRegistered  # noqa: E402
+from celery.signals import worker_ready, worker_shutdown  # noqa: E402
+from celery.worker.control import control_command, ok  # noqa: E402
+
+from app.celery_app import app as celery_app  # noqa: E402,F401
+import app.tasks  # noqa: E402,F401  # keep the existing task module
 
 logger = logging.getLogger(__name__)
 
+# Lazy mode registers plugin tasks from a cached manifest (task name -> module, options)
+# and imports a module only when the first message for one of its tasks arrives.
+WORKER_LAZY_IMPORT = os.getenv("WORKER_LAZY_IMPORT", "0").lower() in {"1", "true", "yes"}
+WORKER_TASK_MANIFEST = os.getenv("WORKER_TASK_MANIFEST", ".task_manifest.json")
+# How long the DB module list cached in the manifest is trusted before querying again.
+WORKER_MANIFEST_DB_TTL = float(os.getenv("WORKER_MANIFEST_DB_TTL", "3600"))
+# Hot reload: poll task module sources every N seconds (0 disables) and the DB module table every M seconds.
+WORKER_RELOAD_SECONDS = float(os.getenv("WORKER_RELOAD_SECONDS", "0"))
+WORKER_RELOAD_DB_SECONDS = float(os.getenv("WORKER_RELOAD_DB_SECONDS", "60"))
+
 
 def _from_env() -> Iterable[str]:
     raw = os.getenv("EXTRA_TASK_MODULES", "")
     return [m.strip() for m in raw.split(",") if m.strip()]
 
 
-def _from_yaml_config() -> Iterable[str]:
+def _read_yaml_config() -> dict:
     cfg_path = os.getenv("EXTRA_TASK_CONFIG", "config/worker_modules.yaml")
     if not os.path.exists(cfg_path):
-        return []
+        return {}
 
     try:
         import yaml  # type: ignore
     except Exception as exc:  # pragma: no cover
         logger.warning("YAML config set but PyYAML not installed (%s)", exc)
-        return []
+        return {}
 
     try:
         with open(cfg_path, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f) or {}
+            return yaml.safe_load(f) or {}
     except Exception as exc:  # pragma: no cover
         logger.warning("Failed to read YAML task config %s: %s", cfg_path, exc)
-        return []
+        return {}
+
 
+def _from_yaml_config() -> Iterable[str]:
+    data = _read_yaml_config()
     modules: list[str] = []
     for entry in data.get("modules", []):
         if isinstance(entry, str):
@@ -49,6 +76,82 @@ def _from_yaml_config() -> Iterable[str]:
     return modules
 
 
+class _RouteAnnotations:
+    """Per-task options (acks_late, time limits, rate limit) from YAML routes; keys may be globs."""
+
+    OPTIONS = ("acks_late", "time_limit", "soft_time_limit", "rate_limit", "reject_on_worker_lost")
+
+    def __init__(self, routes: Dict[str, dict]) -> None:
+        self.routes = routes
+
+    def annotate(self, task) -> dict | None:
+        for pattern, opts in self.routes.items():
+            if fnmatch.fnmatchcase(task.name, pattern):
+                return {key: opts[key] for key in self.OPTIONS if key in opts} or None
+        return None
+
+
+def _apply_task_profiles(data: dict) -> None:
+    """
+    Route task classes to their own queues and tune this worker for one of them.
+
+    YAML:
+      queues:  {<queue>: {pool, concurrency, prefetch_multiplier}}
+      routes:  {<task name or glob>: {queue, acks_late, time_limit, soft_time_limit, rate_limit}}
+
+    WORKER_PROFILE=<queue> makes this process consume only that queue with its
+    pool/concurrency/prefetch settings; without it one worker consumes the
+    default queue plus every declared queue with Celery defaults.
+    """
+    from kombu import Queue
+
+    routes = data.get("routes") or {}
+    queues = data.get("queues") or {}
+    if routes:
+        celery_app.conf.task_routes = {
+            pattern: {"queue": opts["queue"]} for pattern, opts in routes.items() if opts.get("queue")
+        }
+        celery_app.conf.task_annotations = [_RouteAnnotations(routes)]
+
+    for pattern, opts in routes.items():
+        pool = (queues.get(opts.get("queue")) or {}).get("pool", "prefork")
+        if pool in {"threads", "solo"} and ("time_limit" in opts or "soft_time_limit" in opts):
+            logger.warning("Route %s: the %s pool ignores time_limit/soft_time_limit", pattern, pool)
+
+    profile = os.getenv("WORKER_PROFILE")
+    if not profile:
+        names = dict.fromkeys([celery_app.conf.task_default_queue, *queues])
+        names.update(dict.fromkeys(opts["queue"] for opts in routes.values() if opts.get("queue")))
+        celery_app.conf.task_queues = [Queue(name) for name in names]
+        return
+    opts = queues.get(profile) or {}
+
+    celery_app.conf.task_queues = [Queue(profile)]
+    celery_app.conf.worker_pool = opts.get("pool", "prefork")
+    celery_app.conf.worker_concurrency = int(opts.get("concurrency") or os.cpu_count() or 1)
+    celery_app.conf.worker_prefetch_multiplier = int(opts.get("prefetch_multiplier", 4))
+    logger.info(
+        "Worker profile %s: pool=%s concurrency=%s prefetch=%s",
+        profile,
+        celery_app.conf.worker_pool,
+        celery_app.conf.worker_concurrency,
+        celery_app.conf.worker_prefetch_multiplier,
+    )
+
+
+def profile_worker_args() -> list[str]:
+    """CLI flags mirroring the active profile (explicit so CLI defaults cannot override it)."""
+    if not os.getenv("WORKER_PROFILE"):
+        return []
+    conf = celery_app.conf
+    return [
+        f"--queues={os.environ['WORKER_PROFILE']}",
+        f"--pool={conf.worker_pool}",
+        f"--concurrency={conf.worker_concurrency}",
+        f"--prefetch-multiplier={conf.worker_prefetch_multiplier}",
+    ]
+
+
 def _from_db() -> Iterable[str]:
     db_url = os.getenv("DATABASE_URL")
     if not db_url:
@@ -57,11 +160,13 @@ def _from_db() -> Iterable[str]:
     table_name = os.getenv("WORKER_MODULES_TABLE", "worker_task_modules")
     try:
         from sqlalchemy import create_engine, text  # type: ignore
+        from sqlalchemy.pool import NullPool  # type: ignore
     except Exception as exc:  # pragma: no cover
         logger.warning("DATABASE_URL set but SQLAlchemy not installed (%s)", exc)
         return []
 
-    engine = create_engine(db_url)
+    # One query per start: skip building a connection pool.
+    engine = create_engine(db_url, poolclass=NullPool)
     query = text(
         f"select module_path from {table_name} where enabled = true"  # nosec B608
     )
@@ -80,6 +185,25 @@ def _from_db() -> Iterable[str]:
             pass
 
 
+def _plugin_modules() -> list[str]:
+    """Module names under app.plugins (listed, not imported)."""
+    try:
+        import app.plugins  # type: ignore
+    except ImportError:
+        return []
+    prefix = app.plugins.__name__ + "."
+    return [mod for _, mod, _ in pkgutil.iter_modules(app.plugins.__path__, prefix)]
+
+
+def _import_modules(modules: Iterable[str], label: str) -> None:
+    for mod in modules:
+        try:
+            importlib.import_module(mod)
+            logger.info("%s: %s", label, mod)
+        except Exception as exc:  # pragma: no cover - import failures should not crash worker
+            logger.warning("Failed to import task module %s: %s", mod, exc)
+
+
 def _load_extra_modules_from_env() -> None:
     """
     Allow adding task modules without touching this file.
@@ -89,12 +213,7 @@ def _load_extra_modules_from_env() -> None:
     - DB table (WORKER_MODULES_TABLE, default worker_task_modules) using DATABASE_URL
     """
     modules = set(_from_env()) | set(_from_yaml_config()) | set(_from_db())
-    for mod in sorted(modules):
-        try:
-            importlib.import_module(mod)
-            logger.info("Loaded extra task module: %s", mod)
-        except Exception as exc:  # pragma: no cover - import failures should not crash worker
-            logger.warning("Failed to import extra task module %s: %s", mod, exc)
+    _import_modules(sorted(modules), "Loaded extra task module")
 
 
 def _autodiscover_plugins() -> None:
@@ -102,25 +221,354 @@ def _autodiscover_plugins() -> None:
     Auto-import all modules under app.plugins.* so dropping a new file there
     will register tasks on next worker restart.
     """
+    _import_modules(_plugin_modules(), "Auto-discovered plugin")
+
+
+# ---- Lazy mode ----
+
+MANIFEST_VERSION = 2
+# Task attributes the worker reads from the registered task (the proxy) before
+# the plugin module is imported; the manifest records them per task.
+_PROXY_OPTIONS = (
+    "acks_late",
+    "acks_on_failure_or_timeout",
+    "reject_on_worker_lost",
+    "max_retries",
+    "default_retry_delay",
+    "rate_limit",
+    "time_limit",
+    "soft_time_limit",
+    "ignore_result",
+    "store_errors_even_if_ignored",
+    "track_started",
+    "serializer",
+)
+
+_lazy_tasks: Dict[str, str] = {}
+_resolved_tasks: Dict[str, Callable[..., Any]] = {}
+_lazy_lock = threading.Lock()
+_task_from_fun: Callable[..., Any] | None = None  # Celery's original, wrapped by _capture_lazy_task
+
+
+def _module_mtime(module: str) -> float:
     try:
-        import app.plugins  # type: ignore
-    except ImportError:
+        spec = importlib.util.find_spec(module)
+    except (ImportError, ValueError):
+        return 0.0
+    origin = spec.origin if spec else None
+    return os.path.getmtime(origin) if origin and os.path.exists(origin) else 0.0
+
+
+def _fingerprint(modules: list[str]) -> str:
+    """Changes when the module list or any module file changes."""
+    state = [[mod, _module_mtime(mod)] for mod in modules]
+    return hashlib.sha1(json.dumps(state).encode("utf-8")).hexdigest()
+
+
+def _read_manifest() -> dict:
+    try:
+        with open(WORKER_TASK_MANIFEST, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(manifest: dict) -> None:
+    tmp_path = WORKER_TASK_MANIFEST + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, WORKER_TASK_MANIFEST)
+    except OSError as exc:
+        logger.warning("Failed to write task manifest %s: %s", WORKER_TASK_MANIFEST, exc)
+
+
+def _task_options(task) -> Dict[str, Any]:
+    """Options ``task`` sets away from the app defaults, for its lazy proxy (JSON values only)."""
+    from_config = dict(type(task).from_config)
+    options: Dict[str, Any] = {}
+    for key in _PROXY_OPTIONS:
+        value = getattr(task, key, None)
+        default = celery_app.conf.get(from_config[key]) if key in from_config else getattr(celery_app.Task, key, None)
+        if value != default and (value is None or isinstance(value, (str, int, float, bool))):
+            options[key] = value
+    return options
+
+
+def _manifest_entry(task) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {"module": task.__module__, "options": _task_options(task)}
+    base = type(task).__mro__[1]
+    if base is not celery_app.Task:
+        entry["base"] = f"{base.__module__}:{base.__qualname__}"
+    # Class-based tasks and tasks whose base class lives in their own module
+    # cannot be proxied without importing that module anyway.
+    if not getattr(task, "_decorated", False) or base.__module__ == task.__module__:
+        entry["eager"] = True
+    return entry
+
+
+def _capture_lazy_task(fun, name=None, base=None, bind=False, **options):
+    """
+    ``celery_app._task_from_fun`` in lazy mode.
+
+    Celery's decorator returns the registered task for a known name, so a
+    plugin module imported behind its proxies gets the proxies back. Their
+    functions are recorded here and the proxies run them; the proxies stay
+    registered throughout, so concurrent lookups never miss them.
+    """
+    # Celery internals (celery>=5.5,<6, see requirements.txt); only lazy mode needs them.
+    from celery.app.autoretry import add_autoretry_behaviour
+    from celery.app.base import pydantic_wrapper
+
+    task = _task_from_fun(fun, name=name, base=base, bind=bind, **options)
+    is_plugin_import = not options.get("_lazy_proxy")  # not the proxy registering itself
+    if is_plugin_import and getattr(task, "_lazy_proxy", False) and task.name not in _resolved_tasks:
+        if options.get("pydantic"):
+            fun = pydantic_wrapper(
+                celery_app,
+                fun,
+                task.name,
+                options.get("pydantic_strict", False),
+                options.get("pydantic_context"),
+                options.get("pydantic_dump_kwargs"),
+            )
+        task.run = types.MethodType(fun, task) if bind else fun
+        add_autoretry_behaviour(task, **options)
+        _resolved_tasks[task.name] = task.run
+    return task
+
+
+def _resolve_lazy_task(name: str) -> Callable[..., Any]:
+    """Import the module owning ``name`` (once per process) and return the task's function."""
+    run = _resolved_tasks.get(name)
+    if run is not None:
+        return run
+    module = _lazy_tasks[name]
+    with _lazy_lock:
+        if name not in _resolved_tasks:
+            started = time.perf_counter()
+            importlib.import_module(module)
+            logger.info("Lazily imported %s in %.1f ms", module, (time.perf_counter() - started) * 1000)
+    run = _resolved_tasks.get(name)
+    if run is None:
+        raise NotRegistered(f"{name} (not defined by {module}; delete {WORKER_TASK_MANIFEST} to rebuild it)")
+    return run
+
+
+def _register_lazy_task(name: str, entry: Dict[str, Any]) -> None:
+    """Register a proxy carrying the real task's options; it runs the real function once imported."""
+    if name in celery_app.tasks:
         return
+    _lazy_tasks[name] = entry["module"]
+    base = None
+    if entry.get("base"):
+        base_module, _, qualname = entry["base"].partition(":")
+        base = importlib.import_module(base_module)
+        for attr in qualname.split("."):
+            base = getattr(base, attr)
 
-    prefix = app.plugins.__name__ + "."
-    for _, mod, _ in pkgutil.iter_modules(app.plugins.__path__, prefix):
+    def run(self, *args, **kwargs):
+        return _resolve_lazy_task(name)(*args, **kwargs)
+
+    run.__name__ = name.rsplit(".", 1)[-1]
+    celery_app.task(name=name, base=base, bind=True, _lazy_proxy=True, **entry.get("options", {}))(run)
+
+
+def _load_lazily() -> None:
+    """
+    Register plugin tasks from the manifest without importing their modules.
+
+    The manifest is rebuilt (one eager start) when the module list or any
+    module file changes; the DB module list is cached in it for
+    WORKER_MANIFEST_DB_TTL seconds so most starts skip the DB round trip.
+    """
+    global _task_from_fun
+    if _task_from_fun is None:
+        _task_from_fun = celery_app._task_from_fun
+        celery_app._task_from_fun = _capture_lazy_task
+
+    manifest = _read_manifest()
+    db_modules = manifest.get("db_modules")
+    db_checked = manifest.get("db_checked", 0)
+    if db_modules is None or time.time() - db_checked > WORKER_MANIFEST_DB_TTL:
+        db_modules = sorted(set(_from_db()))
+        db_checked = time.time()
+    modules = sorted(set(_from_env()) | set(_from_yaml_config()) | set(db_modules) | set(_plugin_modules()))
+    fingerprint = _fingerprint(modules)
+
+    if (
+        manifest.get("version") == MANIFEST_VERSION
+        and manifest.get("fingerprint") == fingerprint
+        and manifest.get("db_modules") == db_modules
+    ):
+        tasks = manifest.get("tasks", {})
+        eager = sorted({entry["module"] for entry in tasks.values() if entry.get("eager")})
+        _import_modules(eager, "Loaded task module (cannot be proxied)")
+        for name, entry in tasks.items():
+            _register_lazy_task(name, entry)
+        if manifest.get("db_checked") != db_checked:
+            _write_manifest({**manifest, "db_checked": db_checked})
+        logger.info("Registered %s lazy tasks from %s", len(_lazy_tasks), WORKER_TASK_MANIFEST)
+        return
+
+    before = set(celery_app.tasks.keys())
+    _import_modules(modules, "Loaded task module (building manifest)")
+    tasks = {name: _manifest_entry(task) for name, task in celery_app.tasks.items() if name not in before}
+    _write_manifest(
+        {
+            "version": MANIFEST_VERSION,
+            "fingerprint": fingerprint,
+            "modules": modules,
+            "db_modules": db_modules,
+            "db_checked": db_checked,
+            "tasks": tasks,
+        }
+    )
+    logger.info("Built task manifest %s (%s tasks)", WORKER_TASK_MANIFEST, len(tasks))
+
+
+# ---- Hot reload ----
+
+
+def _module_state(db_modules: Iterable[str]) -> Dict[str, float]:
+    """Every configured task module with its source mtime."""
+    importlib.invalidate_caches()  # see plugin files created after start
+    modules = set(_from_env()) | set(_from_yaml_config()) | set(db_modules) | set(_plugin_modules())
+    return {mod: _module_mtime(mod) for mod in sorted(modules)}
+
+
+def _reload_module(module: str) -> list[str]:
+    """
+    Import a new module or re-execute a changed one; returns its task names.
+
+    Tasks the module registered before (or lazy proxies for it) are removed
+    first, because Celery's decorator hands back an already registered task
+    instead of the new function. They are restored if the import fails.
+    """
+    stale = {
+        name: task
+        for name, task in list(celery_app.tasks.items())
+        if getattr(task, "__module__", None) == module or _lazy_tasks.get(name) == module
+    }
+    for name in stale:
+        celery_app.tasks.pop(name)
+    try:
+        if module in sys.modules:
+            importlib.reload(sys.modules[module])
+        else:
+            importlib.import_module(module)
+    except Exception:
+        celery_app.tasks.update(stale)
+        raise
+    for name in stale:
+        _lazy_tasks.pop(name, None)
+        _resolved_tasks.pop(name, None)
+    return sorted(name for name, task in celery_app.tasks.items() if getattr(task, "__module__", None) == module)
+
+
+@control_command(args=[("modules", list)], signature="[modules]")
+def reload_task_modules(state, modules=None, **_kwargs):
+    """Import new/changed task modules, refresh consumer strategies and recycle pool children."""
+    reloaded: Dict[str, list[str]] = {}
+    for module in modules or ():
         try:
-            importlib.import_module(mod)
-            logger.info("Auto-discovered plugin: %s", mod)
-        except Exception as exc:  # pragma: no cover
-            logger.warning("Failed to import plugin %s: %s", mod, exc)
+            reloaded[module] = _reload_module(module)
+            logger.info("Reloaded task module %s: %s", module, ", ".join(reloaded[module]) or "no tasks")
+        except Exception as exc:  # noqa: BLE001 - a broken plugin must not take the worker down
+            logger.warning("Failed to reload task module %s: %s", module, exc)
+    if reloaded:
+        consumer = state.consumer
+        consumer.update_strategies()
+        consumer.reset_rate_limits()
+        pool = consumer.controller.pool
+        try:
+            # Each prefork child exits once it finishes the task it is running,
+            # or, if idle, the next task it receives (which still runs the old
+            # code), and is re-forked with the new code; no work is dropped.
+            pool.restart()
+        except NotImplementedError:
+            pass  # threads/solo pools share this process and already see the new tasks
+    return ok(f"reloaded {len(reloaded)} module(s)")
+
+
+class _PluginWatcher(threading.Thread):
+    """Polls task module sources and broadcasts reload_task_modules to this worker on change."""
+
+    def __init__(self, hostname: str) -> None:
+        super().__init__(name="plugin-watcher", daemon=True)
+        self.hostname = hostname
+        self._stopped = threading.Event()
+        self._db_modules: list[str] = []
+        self._db_checked = 0.0
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _snapshot(self) -> Dict[str, float]:
+        if time.monotonic() - self._db_checked >= WORKER_RELOAD_DB_SECONDS:
+            self._db_modules = list(_from_db())
+            self._db_checked = time.monotonic()
+        return _module_state(self._db_modules)
+
+    def run(self) -> None:
+        state = self._snapshot()
+        while not self._stopped.wait(WORKER_RELOAD_SECONDS):
+            try:
+                current = self._snapshot()
+                changed = [mod for mod, mtime in current.items() if state.get(mod) != mtime]
+                if changed:
+                    logger.info("Task modules changed: %s", ", ".join(changed))
+                    celery_app.control.broadcast(
+                        "reload_task_modules", arguments={"modules": changed}, destination=[self.hostname]
+                    )
+                state = current
+            except Exception as exc:  # noqa: BLE001 - retried on the next poll
+                logger.warning("Plugin watcher check failed: %s", exc)
+
+
+_watcher: _PluginWatcher | None = None
+
+
+@worker_ready.connect
+def _start_plugin_watcher(sender=None, **_kwargs) -> None:
+    global _watcher
+    if WORKER_RELOAD_SECONDS <= 0 or sender is None:
+        return
+    _watcher = _PluginWatcher(sender.hostname)
+    _watcher.start()
+    logger.info("Watching task modules every %.0fs for hot reload", WORKER_RELOAD_SECONDS)
+
+
+@worker_shutdown.connect
+def _stop_plugin_watcher(**_kwargs) -> None:
+    if _watcher is not None:
+        _watcher.stop()
+
+
+@worker_ready.connect
+def _report_startup(**_kwargs) -> None:
+    logger.info(
+        "Worker ready in %.0f ms since import (task setup %.0f ms, %s tasks, %s lazy)",
+        (time.perf_counter() - _STARTED) * 1000,
+        _SETUP_MS,
+        len(celery_app.tasks),
+        len(_lazy_tasks),
+    )
 
 
-_load_extra_modules_from_env()
-_autodiscover_plugins()
+_apply_task_profiles(_read_yaml_config())
+if WORKER_RELOAD_SECONDS > 0:
+    # billiard only lets children be recycled on request when restarts are enabled.
+    celery_app.conf.worker_pool_restarts = True
+if WORKER_LAZY_IMPORT:
+    _load_lazily()
+else:
+    _load_extra_modules_from_env()
+    _autodiscover_plugins()
+_SETUP_MS = (time.perf_counter() - _STARTED) * 1000
 
 # Celery CLI expects an attribute named "celery" on the module when using "-A app.worker_main".
 celery = celery_app
 
 if __name__ == "__main__":
-    celery.worker_main()
+    celery.worker_main(["worker", "--loglevel=info", *profile_worker_args()])
@@ -0,0 +1,579 @@
+"""
+Long-lived, pooled HTTP clients for Ollama, shared by tool_client.py and worker_client.py.
+
+One httpx.AsyncClient per Ollama base URL is created on first use and kept
+for the life of the process, so jobs (and WebSocket reconnects) reuse warm
+keep-alive connections instead of paying TCP/TLS setup per request.
+
+``stream_chat_collect`` relays Ollama's NDJSON stream chunk by chunk (for
+"stream": true jobs) and returns the assembled final response.
+
+``BackendPool`` spreads calls over several Ollama nodes: it probes each one
+(/api/tags for installed models, /api/ps for models loaded in memory),
+prefers healthy nodes with free slots that already have the requested model
+loaded, then the least busy, and stops sending to a node after repeated
+failures until its circuit half-opens again. Jobs sharing a prompt prefix
+(model plus system messages) stick to the node that served it last, where
+Ollama can reuse the cached prefix instead of evaluating it again.
+
+``ModelBatcher`` limits concurrent jobs and hands a freed slot to a queued
+job for a model that is already running, so same-model jobs run together
+instead of forcing model swaps. ``ResponseCache`` answers identical
+temperature-0 requests from an LRU and lets concurrent duplicates share one
+call; ``run_stream`` does the same for streamed chats (a hit is relayed as
+one final chunk).
+
+Env vars (read when a client is first created, after .env is loaded):
+- OLLAMA_TIMEOUT: read/write timeout for a chat call in seconds (default: 60)
+- OLLAMA_CONNECT_TIMEOUT: connect and pool-wait timeout in seconds (default: 5)
+- OLLAMA_POOL_SIZE: max connections per base URL, keep >= job concurrency (default: 16)
+- OLLAMA_KEEPALIVE_SECONDS: how long idle connections are kept (default: 120)
+- OLLAMA_PROBE_SECONDS: BackendPool health/model probe interval (default: 10)
+- OLLAMA_FAILURE_THRESHOLD: consecutive failures that open a node's circuit (default: 3)
+- OLLAMA_OPEN_SECONDS: how long an open circuit skips the node before a trial call (default: 30)
+- OLLAMA_BACKEND_SLOTS: parallel requests per node (its OLLAMA_NUM_PARALLEL) before routing
+  prefers a less busy node over model affinity (default: 4)
+- OLLAMA_KEEP_ALIVE: "keep_alive" sent with requests that do not set one, "" leaves
+  Ollama's default (5m) (default: "30m")
+- OLLAMA_BATCH_MAX_SKIP: how often the oldest queued job may be passed over for a
+  same-model job before it goes next (default: 8)
+- OLLAMA_CACHE_SIZE: cached temperature-0 responses, 0 disables (default: 256)
+- OLLAMA_CACHE_TTL_SECONDS: lifetime of a cached response (default: 600)
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import copy
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple, TypeVar
+
+import httpx
+
+logger = logging.getLogger("ollama-http")
+
+T = TypeVar("T")
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_client(base_url: str) -> httpx.AsyncClient:
+    """Return the shared client for ``base_url``, creating it on first use."""
+    key = base_url.rstrip("/")
+    client = _clients.get(key)
+    if client is None or client.is_closed:
+        connect_timeout = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+        pool_size = int(os.getenv("OLLAMA_POOL_SIZE", "16"))
+        client = httpx.AsyncClient(
+            base_url=key,
+            timeout=httpx.Timeout(float(os.getenv("OLLAMA_TIMEOUT", "60")), connect=connect_timeout, pool=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=float(os.getenv("OLLAMA_KEEPALIVE_SECONDS", "120")),
+            ),
+            verify=False,
+        )
+        _clients[key] = client
+    return client
+
+
+async def close_clients() -> None:
+    for client in list(_clients.values()):
+        await client.aclose()
+    _clients.clear()
+
+
+def parse_chat_response(resp: httpx.Response) -> Dict[str, Any]:
+    """
+    Lenient JSON parser for non-stream responses that may contain multiple
+    JSON objects or extra whitespace: falls back to the first valid line.
+    """
+    try:
+        return resp.json()
+    except ValueError:
+        for line in resp.text.strip().splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                return json.loads(line)
+            except ValueError:
+                continue
+        raise
+
+
+def with_keep_alive(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the OLLAMA_KEEP_ALIVE default so the model stays loaded between jobs."""
+    keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    if not keep_alive or "keep_alive" in payload:
+        return payload
+    return {**payload, "keep_alive": keep_alive}
+
+
+async def post_chat(base_url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """POST /api/chat on ``base_url`` over its pooled client."""
+    resp = await get_client(base_url).post("/api/chat", json=with_keep_alive(payload))
+    resp.raise_for_status()
+    return parse_chat_response(resp)
+
+
+async def post_embed(base_url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """POST /api/embed ({"model", "input": str | list[str]}) over the pooled client."""
+    resp = await get_client(base_url).post("/api/embed", json=with_keep_alive(payload))
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def stream_chat(base_url: str, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    """POST /api/chat with stream=true and yield each NDJSON chunk as it arrives."""
+    async with get_client(base_url).stream("POST", "/api/chat", json={**with_keep_alive(payload), "stream": True}) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            line = line.strip()
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise RuntimeError(f"Ollama stream error: {chunk['error']}")
+            yield chunk
+
+
+async def stream_chat_collect(
+    base_url: str,
+    payload: Dict[str, Any],
+    on_chunk: Callable[[Dict[str, Any]], Awaitable[None]],
+) -> Dict[str, Any]:
+    """
+    Stream a chat, awaiting ``on_chunk`` for every chunk (a slow consumer
+    slows reading from Ollama), and return the last chunk with the full
+    message content, shaped like a non-stream response.
+    """
+    parts: list[str] = []
+    last: Dict[str, Any] = {}
+    async for chunk in stream_chat(base_url, payload):
+        message = chunk.get("message") or {}
+        if message.get("content"):
+            parts.append(message["content"])
+        last = chunk
+        await on_chunk(chunk)
+    message = dict(last.get("message") or {"role": "assistant"})
+    message["content"] = "".join(parts)
+    return {**last, "message": message}
+
+
+async def list_models(base_url: str) -> Dict[str, List[str]]:
+    """
+    {"installed": /api/tags, "loaded": /api/ps} for one node. Raises if the
+    node is unreachable; "loaded" is empty on Ollama versions without /api/ps.
+    """
+    client = get_client(base_url)
+    timeout = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+    resp = await client.get("/api/tags", timeout=timeout)
+    resp.raise_for_status()
+    installed = {model_key(m.get("name") or m.get("model")) for m in resp.json().get("models") or []}
+    try:
+        ps = await client.get("/api/ps", timeout=timeout)
+        ps.raise_for_status()
+        loaded = {model_key(m.get("name") or m.get("model")) for m in ps.json().get("models") or []}
+    except (httpx.HTTPError, ValueError):
+        loaded = set()
+    return {"installed": sorted(installed), "loaded": sorted(loaded)}
+
+
+def model_key(name: str | None) -> str:
+    """Ollama treats "llama3" and "llama3:latest" as the same model."""
+    if not name:
+        return ""
+    return name if ":" in name else f"{name}:latest"
+
+
+def prefix_key(payload: Dict[str, Any]) -> str:
+    """
+    Hash of the model and leading system messages: jobs with the same key
+    share a prompt prefix Ollama can keep cached on the node that ran it.
+    """
+    system = []
+    for message in payload.get("messages") or []:
+        if message.get("role") != "system":
+            break
+        system.append(message.get("content") or "")
+    if not system:
+        return ""
+    raw = json.dumps([model_key(payload.get("model")), system], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class Backend:
+    """One Ollama node: probe results, in-flight count and circuit state."""
+
+    def __init__(self, url: str) -> None:
+        self.url = url.rstrip("/")
+        self.in_flight = 0
+        self.healthy = True  # optimistic until the first probe says otherwise
+        self.models: set[str] = set()
+        self.loaded: set[str] = set()
+        self.failures = 0
+        self.open_until = 0.0
+        # Prompt prefixes this node served recently, newest last.
+        self.prefixes: "OrderedDict[str, None]" = OrderedDict()
+
+    def remember_prefix(self, prefix: str, limit: int = 64) -> None:
+        self.prefixes[prefix] = None
+        self.prefixes.move_to_end(prefix)
+        while len(self.prefixes) > limit:
+            self.prefixes.popitem(last=False)
+
+    def available(self, now: float) -> bool:
+        return self.healthy and self.open_until <= now
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "circuit_open": self.open_until > time.monotonic(),
+            "models": sorted(self.models),
+            "loaded": sorted(self.loaded),
+        }
+
+
+class BackendPool:
+    """Health- and model-aware routing over several Ollama base URLs."""
+
+    def __init__(
+        self,
+        urls: List[str],
+        *,
+        probe_seconds: float | None = None,
+        failure_threshold: int | None = None,
+        open_seconds: float | None = None,
+        slots: int | None = None,
+    ) -> None:
+        unique = list(dict.fromkeys(url.rstrip("/") for url in urls if url))
+        if not unique:
+            raise ValueError("BackendPool needs at least one Ollama URL")
+        self.backends = [Backend(url) for url in unique]
+        self.probe_seconds = probe_seconds or float(os.getenv("OLLAMA_PROBE_SECONDS", "10"))
+        self.failure_threshold = failure_threshold or int(os.getenv("OLLAMA_FAILURE_THRESHOLD", "3"))
+        self.open_seconds = open_seconds or float(os.getenv("OLLAMA_OPEN_SECONDS", "30"))
+        self.slots = slots or int(os.getenv("OLLAMA_BACKEND_SLOTS", "4"))
+        self._prober: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Probe every node once, then keep probing in the background."""
+        await self.probe_all()
+        if self._prober is None or self._prober.done():
+            self._prober = asyncio.create_task(self._probe_loop())
+
+    async def stop(self) -> None:
+        if self._prober is not None:
+            self._prober.cancel()
+            try:
+                await self._prober
+            except asyncio.CancelledError:
+                pass
+            self._prober = None
+
+    def models(self) -> List[str]:
+        """Models installed on at least one healthy node."""
+        return sorted({model for backend in self.backends if backend.healthy for model in backend.models})
+
+    def loaded_models(self) -> List[str]:
+        """Models currently in memory on at least one healthy node."""
+        return sorted({model for backend in self.backends if backend.healthy for model in backend.loaded})
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [backend.snapshot() for backend in self.backends]
+
+    async def probe_all(self) -> None:
+        await asyncio.gather(*(self._probe(backend) for backend in self.backends))
+
+    async def _probe_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.probe_seconds)
+            await self.probe_all()
+
+    async def _probe(self, backend: Backend) -> None:
+        try:
+            models = await list_models(backend.url)
+            backend.models = set(models["installed"])
+            backend.loaded = set(models["loaded"])
+        except (httpx.HTTPError, ValueError) as exc:
+            if backend.healthy:
+                logger.warning("Ollama backend %s unhealthy: %s", backend.url, exc)
+            backend.healthy = False
+            return
+        if not backend.healthy:
+            logger.info("Ollama backend %s healthy again", backend.url)
+        backend.healthy = True
+        backend.failures = 0
+        backend.open_until = 0.0
+
+    def candidates(self, model: str | None, prefix: str = "") -> List[Backend]:
+        """
+        Available backends to try, best first. Nodes below their slot count
+        come before saturated ones; within that, nodes with the model loaded
+        (those that recently served ``prefix`` first), then nodes that have
+        it installed (or whose models are not known yet), then least-in-flight. When no node is available (all unhealthy
+        or circuit open) every node is returned, soonest-to-close first.
+        """
+        now = time.monotonic()
+        wanted = model_key(model)
+
+        def rank(item: tuple[int, Backend]) -> tuple:
+            index, backend = item
+            if not wanted or wanted in backend.loaded:
+                affinity = 0 if prefix and prefix in backend.prefixes else 1
+            elif wanted in backend.models or not backend.models:
+                affinity = 2
+            else:
+                affinity = 3
+            return (backend.in_flight >= self.slots, affinity, backend.in_flight, index)
+
+        available = [(i, b) for i, b in enumerate(self.backends) if b.available(now)]
+        if not available:
+            return sorted(self.backends, key=lambda backend: (not backend.healthy, backend.open_until))
+        return [backend for _, backend in sorted(available, key=rank)]
+
+    def _record_failure(self, backend: Backend, exc: Exception) -> None:
+        backend.failures += 1
+        if backend.failures >= self.failure_threshold:
+            backend.open_until = time.monotonic() + self.open_seconds
+            logger.warning(
+                "Ollama backend %s circuit open for %.0fs after %s failures: %s",
+                backend.url,
+                self.open_seconds,
+                backend.failures,
+                exc,
+            )
+
+    async def run(
+        self,
+        model: str | None,
+        call: Callable[[str], Awaitable[T]],
+        *,
+        prefix: str = "",
+        can_retry: Callable[[], bool] = lambda: True,
+    ) -> T:
+        """
+        Run ``call(base_url)`` on the best backend, moving to the next one on
+        connection errors and 5xx (and on 404, e.g. model missing there).
+        Other 4xx are the caller's fault and are raised as is. ``can_retry``
+        returning False (e.g. a stream already relayed chunks) stops failover.
+        ``prefix`` (see ``prefix_key``) steers the call to the node that last
+        served the same prompt prefix.
+        """
+        wanted = model_key(model)
+        last_exc: Exception | None = None
+        for backend in self.candidates(model, prefix):
+            backend.in_flight += 1
+            try:
+                result = await call(backend.url)
+            except httpx.HTTPStatusError as exc:
+                status = exc.response.status_code
+                if status == 404 and wanted:
+                    backend.models.discard(wanted)
+                    backend.loaded.discard(wanted)
+                elif status < 500:
+                    raise
+                else:
+                    self._record_failure(backend, exc)
+                last_exc = exc
+            except (httpx.TransportError, RuntimeError, ValueError) as exc:
+                self._record_failure(backend, exc)
+                last_exc = exc
+            else:
+                backend.failures = 0
+                backend.open_until = 0.0
+                if wanted:
+                    backend.loaded.add(wanted)  # Ollama keeps it in memory for keep_alive
+                if prefix:
+                    backend.remember_prefix(prefix)
+                return result
+            finally:
+                backend.in_flight -= 1
+            logger.warning("Ollama call failed via %s: %s", backend.url, last_exc)
+            if not can_retry():
+                raise last_exc
+        if last_exc:
+            raise last_exc
+        raise RuntimeError("No Ollama endpoints configured")
+
+
+class ModelBatcher:
+    """
+    Concurrency limiter that groups jobs by model: a freed slot goes to the
+    oldest queued job whose model is already running, falling back to the
+    oldest job overall once it has been passed over ``max_skip`` times.
+    """
+
+    def __init__(self, slots: int, max_skip: int | None = None) -> None:
+        self.free = max(1, slots)
+        self.max_skip = int(os.getenv("OLLAMA_BATCH_MAX_SKIP", "8")) if max_skip is None else max_skip
+        self._waiting: List[Tuple[str, asyncio.Future]] = []
+        self._running: Counter[str] = Counter()
+        self._head_skips = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, model: str | None) -> AsyncIterator[None]:
+        key = model_key(model)
+        if self.free > 0 and not self._waiting:
+            self.free -= 1
+            self._running[key] += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            entry = (key, future)
+            self._waiting.append(entry)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._finish(key)  # granted just before the cancel: pass it on
+                elif entry in self._waiting:
+                    if self._waiting[0] is entry:
+                        self._head_skips = 0
+                    self._waiting.remove(entry)
+                raise
+        try:
+            yield
+        finally:
+            self._finish(key)
+
+    def _finish(self, key: str) -> None:
+        self._running[key] -= 1
+        if not self._running[key]:
+            del self._running[key]
+        if not self._waiting:
+            self.free += 1
+            return
+        index = 0
+        if self._head_skips < self.max_skip:
+            index = next((i for i, (model, _) in enumerate(self._waiting) if model in self._running), 0)
+        self._head_skips = self._head_skips + 1 if index else 0
+        model, future = self._waiting.pop(index)
+        self._running[model] += 1  # counted now so the next free slot sees it
+        future.set_result(None)
+
+
+class ResponseCache:
+    """
+    LRU of full chat responses for deterministic requests (temperature 0).
+    Concurrent identical requests wait for the first one instead of calling
+    Ollama again; failures are not cached.
+    """
+
+    def __init__(self, size: int, ttl: float) -> None:
+        self.size = size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def key_for(payload: Dict[str, Any]) -> str | None:
+        """Cache key, or None when the request is not deterministic."""
+        options = payload.get("options") or {}
+        if options.get("temperature") != 0:
+            return None
+        stable = {k: v for k, v in payload.items() if k not in {"stream", "keep_alive"}}
+        stable["model"] = model_key(stable.get("model"))
+        raw = json.dumps(stable, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str | None) -> Dict[str, Any] | None:
+        if key is None or self.size <= 0:
+            return None
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def set(self, key: str | None, value: Dict[str, Any]) -> None:
+        if key is None or self.size <= 0 or value.get("done") is False:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    async def run(self, payload: Dict[str, Any], call: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Cached response for ``payload`` or the result of ``call()``, stored if cacheable."""
+        key = self.key_for(payload) if self.size > 0 else None
+        if key is None:
+            return await call()
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                return copy.deepcopy(await asyncio.shield(pending))
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # this caller was cancelled
+                return await call()  # the first caller was cancelled: run it ourselves
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved; waiters get it re-raised
+            raise
+        else:
+            self.set(key, result)
+            future.set_result(result)
+            return copy.deepcopy(result)
+        finally:
+            self._inflight.pop(key, None)
+
+    async def run_stream(
+        self,
+        payload: Dict[str, Any],
+        on_chunk: Callable[[Dict[str, Any]], Awaitable[None]],
+        call: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """
+        Streaming counterpart of ``run``: a cached response is relayed as one
+        final chunk; otherwise ``call()`` streams (through ``on_chunk``) and its
+        assembled result is stored if cacheable.
+        """
+        key = self.key_for(payload) if self.size > 0 else None
+        cached = self.get(key)
+        if cached is not None:
+            await on_chunk({**cached, "done": True})
+            return cached
+        result = await call()
+        self.set(key, result)
+        return result
+
+
+_response_cache: ResponseCache | None = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide response cache, sized from env on first use."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache(
+            int(os.getenv("OLLAMA_CACHE_SIZE", "256")),
+            float(os.getenv("OLLAMA_CACHE_TTL_SECONDS", "600")),
+        )
+    return _response_cache
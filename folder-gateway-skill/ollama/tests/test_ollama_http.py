@@ -0,0 +1,40 @@
+import asyncio
+
+from ollama_http import ResponseCache
+
+PAYLOAD = {"model": "llama3", "messages": [{"role": "user", "content": "hi"}], "options": {"temperature": 0}, "stream": True}
+
+
+def stream_once(cache, payload, answer):
+    chunks, calls = [], []
+
+    async def on_chunk(chunk):
+        chunks.append(chunk)
+
+    async def call():
+        calls.append(1)
+        await on_chunk({"message": {"content": answer}, "done": False})
+        return {"message": {"content": answer}, "done": True}
+
+    result = asyncio.run(cache.run_stream(payload, on_chunk, call))
+    return result, chunks, calls
+
+
+def test_run_stream_relays_a_cached_answer_as_one_final_chunk():
+    cache = ResponseCache(size=8, ttl=60)
+    first, first_chunks, first_calls = stream_once(cache, PAYLOAD, "hello")
+    second, second_chunks, second_calls = stream_once(cache, PAYLOAD, "other")
+
+    assert first == second == {"message": {"content": "hello"}, "done": True}
+    assert first_calls == [1] and second_calls == []
+    assert first_chunks == [{"message": {"content": "hello"}, "done": False}]
+    assert second_chunks == [{"message": {"content": "hello"}, "done": True}]
+
+
+def test_run_stream_does_not_cache_sampled_requests():
+    cache = ResponseCache(size=8, ttl=60)
+    payload = {**PAYLOAD, "options": {"temperature": 0.7}}
+    stream_once(cache, payload, "hello")
+    result, _, calls = stream_once(cache, payload, "other")
+    assert calls == [1]
+    assert result["message"]["content"] == "other"
@@ -0,0 +1,69 @@
+import asyncio
+
+from ws_session import Outbox, ResultLedger
+
+
+def test_outbox_close_releases_every_blocked_put():
+    async def scenario():
+        outbox = Outbox(1)
+        assert await outbox.put({"n": 0}, "job-0")
+        blocked = [asyncio.create_task(outbox.put({"n": n}, f"job-{n}")) for n in range(1, 6)]
+        await asyncio.sleep(0)
+        assert not any(task.done() for task in blocked)
+        outbox.close()
+        results = await asyncio.wait_for(asyncio.gather(*blocked), timeout=1)
+        assert results == [False] * 5
+        assert await outbox.put({"n": 6}) is False
+        return outbox.queue.qsize()
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_outbox_put_waits_for_room():
+    async def scenario():
+        outbox = Outbox(1)
+        await outbox.put({"n": 0})
+        waiting = asyncio.create_task(outbox.put({"n": 1}, "job-1"))
+        await asyncio.sleep(0)
+        assert await outbox.get() == ({"n": 0}, None)
+        assert await asyncio.wait_for(waiting, timeout=1) is True
+        return await outbox.get()
+
+    assert asyncio.run(scenario()) == ({"n": 1}, "job-1")
+
+
+def test_ledger_tracks_running_then_done_then_delivered():
+    ledger = ResultLedger(size=10)
+    assert ledger.begin("a") == "new"
+    assert ledger.begin("a") == "running"
+    assert ledger.begin(None) == "new"
+    assert ledger.pending() == []
+
+    ledger.complete("a", {"status": "ok"})
+    assert ledger.begin("a") == "done"
+    assert ledger.result("a") == {"status": "ok"}
+    assert ledger.pending() == [("a", {"status": "ok"})]
+
+    ledger.mark_delivered("a")
+    assert ledger.pending() == []
+    assert ledger.result("missing") is None
+
+
+def test_ledger_evicts_delivered_entries_before_undelivered_ones():
+    ledger = ResultLedger(size=2)
+    for job_id in ("a", "b"):
+        ledger.begin(job_id)
+        ledger.complete(job_id, {"job": job_id})
+    ledger.mark_delivered("b")
+    ledger.begin("c")
+    assert ledger.result("b") is None  # delivered, so it went first
+    assert ledger.pending() == [("a", {"job": "a"})]
+    assert ledger.begin("c") == "running"
+
+
+def test_ledger_forgets_oldest_when_nothing_was_delivered():
+    ledger = ResultLedger(size=2)
+    for job_id in ("a", "b", "c"):
+        ledger.begin(job_id)
+    assert ledger.begin("a") == "new"
+    assert ledger.begin("c") == "running"
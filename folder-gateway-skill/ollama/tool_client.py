@@ -4,57 +4,141 @@ Simple WebSocket tool client that bridges Gateway jobs to a local Ollama instanc
 Usage:
     pip install websockets httpx
     python tool_client.py --gateway ws://<gateway-host>:30091/ws/tools/ollama-vps --ollama http://127.0.0.1:11434
+
+Jobs run concurrently (up to --max-concurrency, env TOOL_MAX_CONCURRENCY) and
+every outgoing frame goes through one writer queue, so heartbeats and results
+never wait behind a slow LLM call. The capacity is advertised at registration.
+
+Jobs with "stream": true send each Ollama chunk as
+{"type": "job_chunk", "job_id", "seq", "chunk"} before the usual final
+{"job_id", "status", "result"} frame. The writer queue is bounded
+(TOOL_OUTBOX_SIZE), so a slow gateway pauses reading from Ollama instead of
+buffering without limit.
+
+--ollama, --fallback-ollama and --backends (env OLLAMA_BACKENDS) form one
+BackendPool (see ollama_http): jobs go to a healthy node that already has the
+model loaded, least busy first, and fail over on errors.
+
+Free slots go to queued jobs for a model that is already running first
+(ModelBatcher), requests get a keep_alive so models stay warm, jobs sharing a
+system prompt stick to the node that has it cached, and identical
+temperature-0 requests are answered from an LRU (OLLAMA_CACHE_SIZE).
+
+Jobs outlive the connection: if the socket drops mid-job the job finishes,
+its result is kept (see ws_session.ResultLedger) and re-sent after the next
+registration. A job_id the gateway sends twice is answered from that ledger
+rather than run again. Reconnects back off exponentially with jitter.
+
+Heartbeats carry live load (in flight, queued, capacity, recent p50/p95
+latency, tokens/sec, installed/loaded models, CPU/memory, see
+worker_metrics.py); --metrics-port (env METRICS_PORT) serves the same data
+for Prometheus on /metrics.
+
+Frames are JSON until the gateway accepts msgpack at registration, and an
+unchanged registration is sent without its metadata on reconnect (see
+ws_session.register). permessage-deflate is on (WS_COMPRESSION).
 """
 from __future__ import annotations
 
 import argparse
 import asyncio
-import json
 import logging
 import os
-from typing import Any, Dict
+import time
+from typing import Any, Awaitable, Callable, Dict
 
-import httpx
 import websockets
 from dotenv import load_dotenv
 
+from ollama_http import (
+    BackendPool,
+    ModelBatcher,
+    close_clients,
+    get_response_cache,
+    post_chat,
+    prefix_key,
+    stream_chat_collect,
+)
+from worker_metrics import WorkerMetrics, serve_metrics
+from ws_session import Backoff, FrameCodec, Outbox, RegistrationCache, ResultLedger, connect_options, register
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("tool-client")
 
+OLLAMA_CHAT_REQUEST_EXAMPLE = {
+    "model": "gpt-oss:latest",
+    "messages": [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": "Viết một đoạn giới thiệu ngắn về Bumbee AI."},
+    ],
+    "stream": False,
+}
 
-async def handle_ollama_chat(payload: Dict[str, Any], base_urls: list[str]) -> Dict[str, Any]:
-    """
-    Call Ollama chat API. Tries primary then fallbacks in order.
-    Includes a lenient JSON parser for non-stream responses that may contain
-    multiple JSON objects or extra whitespace.
-    """
-    last_exc: Exception | None = None
-    async with httpx.AsyncClient(timeout=60.0, verify=False) as client:
-        for base_url in base_urls:
-            url = base_url.rstrip("/") + "/api/chat"
-            try:
-                resp = await client.post(url, json=payload)
-                resp.raise_for_status()
-                try:
-                    return resp.json()
-                except ValueError:
-                    text = resp.text.strip()
-                    for line in text.splitlines():
-                        line = line.strip()
-                        if not line:
-                            continue
-                        try:
-                            return json.loads(line)
-                        except Exception:
-                            continue
-                    raise
-            except Exception as exc:
-                last_exc = exc
-                logger.warning("Ollama call failed via %s: %s", url, exc)
-                continue
-    if last_exc:
-        raise last_exc
-    raise RuntimeError("No Ollama endpoints configured")
+
+async def handle_ollama_chat(payload: Dict[str, Any], pool: BackendPool) -> Dict[str, Any]:
+    """Call Ollama chat API on the best backend for the model, failing over to the others."""
+    return await get_response_cache().run(
+        payload,
+        lambda: pool.run(
+            payload.get("model"),
+            lambda base_url: post_chat(base_url, payload),
+            prefix=prefix_key(payload),
+        ),
+    )
+
+
+async def handle_ollama_chat_stream(
+    payload: Dict[str, Any],
+    pool: BackendPool,
+    on_chunk: Callable[[Dict[str, Any]], Awaitable[None]],
+) -> Dict[str, Any]:
+    """Streaming variant; fails over to another backend only if nothing was relayed yet."""
+    relayed = False
+
+    async def relay(chunk: Dict[str, Any]) -> None:
+        nonlocal relayed
+        relayed = True
+        await on_chunk(chunk)
+
+    return await get_response_cache().run_stream(
+        payload,
+        on_chunk,
+        lambda: pool.run(
+            payload.get("model"),
+            lambda base_url: stream_chat_collect(base_url, payload, relay),
+            prefix=prefix_key(payload),
+            can_retry=lambda: not relayed,
+        ),
+    )
+
+
+async def execute_job(
+    message: Dict[str, Any],
+    pool: BackendPool,
+    send: Callable[[Dict[str, Any]], Awaitable[None]],
+) -> Dict[str, Any]:
+    """Run one gateway job (relaying stream chunks through ``send``) and build its final frame."""
+    job_id = message.get("job_id")
+    action = message.get("action")
+    payload = message.get("payload") or {}
+    seq = 0
+
+    async def send_chunk(chunk: Dict[str, Any]) -> None:
+        nonlocal seq
+        await send({"type": "job_chunk", "job_id": job_id, "seq": seq, "chunk": chunk})
+        seq += 1
+
+    try:
+        if action == "ollama_chat" and payload.get("stream"):
+            result = await handle_ollama_chat_stream(payload, pool, send_chunk)
+        elif action == "ollama_chat":
+            result = await handle_ollama_chat(payload, pool)
+        else:
+            raise ValueError(f"Unsupported action: {action}")
+        return {"job_id": job_id, "status": "ok", "result": result}
+    except Exception as exc:
+        logger.warning("Job %s failed: %s", job_id, exc)
+        return {"job_id": job_id, "status": "error", "error": str(exc)}
 
 
 async def run_client(
@@ -63,95 +147,176 @@ async def run_client(
     base_url: str,
     token: str | None = None,
     fallback_base_url: str | None = None,
+    max_concurrency: int = 4,
+    outbox_size: int = 256,
+    backends: list[str] | None = None,
+    metrics_port: int = 0,
 ) -> None:
-    while True:
-        try:
-            target_ws = gateway_ws.rstrip("/")
-            expected_suffix = f"/ws/tools/{tool_id}"
-            if not target_ws.endswith(expected_suffix):
-                target_ws = target_ws + expected_suffix
-            logger.info("Connecting to gateway %s as %s", target_ws, tool_id)
-            base_urls = [base_url]
-            if fallback_base_url:
-                base_urls.append(fallback_base_url)
-            async with websockets.connect(target_ws) as ws:
-                pc_id = os.getenv("PC_ID")
-                registration = {
-                    "tool_id": tool_id,
-                    "capabilities": ["ollama", "ollama_chat"],
-                    "base_url": base_url,
-                    "metadata": {
-                        "kind": "ollama",
-                        "actions": ["ollama_chat"],
-                        "schemas": {
-                            "ollama_chat": {
-                                "request_example": {
-                                    "model": "gpt-oss:latest",
-                                    "messages": [
-                                        {"role": "system", "content": "You are a helpful assistant."},
-                                        {"role": "user", "content": "Viết một đoạn giới thiệu ngắn về Bumbee AI."},
-                                    ],
-                                    "stream": False,
-                                },
-                                "response_example": {
-                                    "status": "ok",
-                                    "result": {"message": {"content": "Bumbee AI là nền tảng ..."}},
-                                },
-                            }
-                        },
-                    },
-                    "schemas": {
-                        "ollama_chat": {
-                            "request_example": {
-                                "model": "gpt-oss:latest",
-                                "messages": [
-                                    {"role": "system", "content": "You are a helpful assistant."},
-                                    {"role": "user", "content": "Viết một đoạn giới thiệu ngắn về Bumbee AI."},
-                                ],
-                                "stream": False,
+    max_concurrency = max(1, max_concurrency)
+    # One pool for the whole process: probes and circuit state survive reconnects.
+    pool = BackendPool([base_url, fallback_base_url or "", *(backends or [])])
+    await pool.start()
+    try:
+        await _run_client(gateway_ws, tool_id, base_url, token, pool, max_concurrency, outbox_size, metrics_port)
+    finally:
+        await pool.stop()
+        await close_clients()
+
+
+async def _run_client(
+    gateway_ws: str,
+    tool_id: str,
+    base_url: str,
+    token: str | None,
+    pool: BackendPool,
+    max_concurrency: int,
+    outbox_size: int,
+    metrics_port: int,
+) -> None:
+    # Process-wide, so running jobs, their results and the slot limit survive reconnects.
+    batcher = ModelBatcher(max_concurrency)
+    ledger = ResultLedger()
+    backoff = Backoff()
+    jobs: set[asyncio.Task] = set()
+    metrics = WorkerMetrics()
+    codec = FrameCodec()
+    registered = RegistrationCache()  # survives reconnects: unchanged metadata is not resent
+    # Writer queue of the live connection; None while disconnected.
+    outbox: Outbox | None = None
+
+    async def send_chunk(frame: Dict[str, Any]) -> None:
+        # Best effort: dropped while disconnected, the final result carries the full content.
+        current = outbox
+        if current is not None:
+            await current.put(frame)
+
+    def load() -> Dict[str, Any]:
+        return metrics.snapshot(
+            in_flight=len(jobs) - batcher.queued,
+            queued=batcher.queued,
+            capacity=max_concurrency,
+            models={"installed": pool.models(), "loaded": pool.loaded_models()},
+        )
+
+    async def run_job(message: Dict[str, Any]):
+        job_id = message.get("job_id")
+        started = time.monotonic()  # latency includes the wait for a slot
+        async with batcher.slot((message.get("payload") or {}).get("model")):
+            response = await execute_job(message, pool, send_chunk)
+        metrics.observe(str(message.get("action")), time.monotonic() - started, response["status"], response.get("result"))
+        # Kept until a writer sends it; re-sent after a reconnect otherwise.
+        ledger.complete(job_id, response)
+        current = outbox
+        if current is not None:
+            await current.put(response, job_id)
+
+    server = await serve_metrics(metrics_port, lambda: metrics.prometheus(load())) if metrics_port else None
+    try:
+        while True:
+            try:
+                target_ws = gateway_ws.rstrip("/")
+                expected_suffix = f"/ws/tools/{tool_id}"
+                if not target_ws.endswith(expected_suffix):
+                    target_ws = target_ws + expected_suffix
+                logger.info("Connecting to gateway %s as %s", target_ws, tool_id)
+                async with websockets.connect(target_ws, **connect_options()) as ws:
+                    pc_id = os.getenv("PC_ID")
+                    registration = {
+                        "tool_id": tool_id,
+                        "capabilities": ["ollama", "ollama_chat"],
+                        "base_url": base_url,
+                        # Jobs this client runs at once; the gateway can keep up to this many in flight.
+                        "capacity": max_concurrency,
+                        "metadata": {
+                            "kind": "ollama",
+                            "actions": ["ollama_chat"],
+                            "max_concurrency": max_concurrency,
+                            # Installed on at least one healthy backend at connect time.
+                            "models": pool.models(),
+                            "backends": len(pool.backends),
+                            "schemas": {
+                                "ollama_chat": {
+                                    "request_example": OLLAMA_CHAT_REQUEST_EXAMPLE,
+                                    "response_example": {
+                                        "status": "ok",
+                                        "result": {"message": {"content": "Bumbee AI là nền tảng ..."}},
+                                    },
+                                }
                             },
-                        }
-                    },
-                    "pc_id": pc_id,
-                    "token": token,
-                }
-                await ws.send(json.dumps(registration))
-                ack = await ws.recv()
-                logger.info("Registered: %s", ack)
-
-                async def heartbeat():
-                    while True:
-                        await asyncio.sleep(15)
-                        try:
-                            await ws.send(json.dumps({"type": "heartbeat"}))
-                        except Exception:
-                            return
-
-                hb_task = asyncio.create_task(heartbeat())
-
-                async for raw in ws:
-                    try:
-                        message = json.loads(raw)
-                    except Exception:
-                        continue
-                    if message.get("type") != "job":
-                        continue
-                    job_id = message.get("job_id")
-                    action = message.get("action")
-                    payload = message.get("payload") or {}
+                        },
+                        "schemas": {"ollama_chat": {"request_example": OLLAMA_CHAT_REQUEST_EXAMPLE}},
+                        "pc_id": pc_id,
+                        "token": token,
+                    }
+                    ack = await register(ws, registration, codec, registered)
+                    logger.info("Registered (%s frames): %s", "msgpack" if codec.binary else "json", ack)
+                    backoff.reset()
+
+                    # Bounded: when the gateway reads slowly, ws.send blocks the writer,
+                    # the queue fills and streaming jobs wait before reading more from Ollama.
+                    queue = Outbox(outbox_size)
+                    unsent = ledger.pending()
+                    outbox = queue
+
+                    async def writer():
+                        # The only coroutine that sends on the socket.
+                        for job_id, frame in unsent:
+                            await ws.send(codec.encode(frame))
+                            ledger.mark_delivered(job_id)
+                        if unsent:
+                            logger.info("Re-sent %s results finished while disconnected", len(unsent))
+                        while True:
+                            frame, job_id = await queue.get()
+                            await ws.send(codec.encode(frame))
+                            ledger.mark_delivered(job_id)
+
+                    async def heartbeat():
+                        while True:
+                            await asyncio.sleep(15)
+                            await queue.put({"type": "heartbeat", **load()})
+
+                    background = [asyncio.create_task(writer()), asyncio.create_task(heartbeat())]
                     try:
-                        if action == "ollama_chat":
-                            result = await handle_ollama_chat(payload, base_urls)
-                        else:
-                            raise ValueError(f"Unsupported action: {action}")
-                        response = {"job_id": job_id, "status": "ok", "result": result}
-                    except Exception as exc:
-                        logger.warning("Job failed: %s", exc)
-                        response = {"job_id": job_id, "status": "error", "error": str(exc)}
-                    await ws.send(json.dumps(response))
-        except Exception as exc:
-            logger.warning("WS disconnected (%s), reconnecting in 5s", exc)
-            await asyncio.sleep(5)
+                        async for raw in ws:
+                            try:
+                                message = codec.decode(raw)
+                            except ValueError:
+                                continue
+                            if message.get("type") != "job":
+                                continue
+                            job_id = message.get("job_id")
+                            state = ledger.begin(job_id)
+                            if state == "running":
+                                logger.info("Job %s already running, ignoring duplicate", job_id)
+                                continue
+                            if state == "done":
+                                await queue.put(ledger.result(job_id), job_id)
+                                continue
+                            job = asyncio.create_task(run_job(message))
+                            jobs.add(job)
+                            job.add_done_callback(jobs.discard)
+                    finally:
+                        # Jobs keep running; their results wait in the ledger for the next connection.
+                        outbox = None
+                        queue.close()  # jobs blocked on a full outbox give up their frame
+                        for task in background:
+                            task.cancel()
+                        await asyncio.gather(*background, return_exceptions=True)
+
+                reason = "closed by gateway"
+            except Exception as exc:
+                reason = str(exc) or type(exc).__name__
+            delay = backoff.next_delay()
+            logger.warning(
+                "WS disconnected (%s), %s jobs running, reconnecting in %.1fs", reason, len(jobs), delay
+            )
+            await asyncio.sleep(delay)
+    finally:
+        if server is not None:
+            server.close()
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
 
 
 def parse_args():
@@ -174,12 +339,35 @@ def parse_args():
         default=os.getenv("OLLAMA_FALLBACK_URL", "http://127.0.0.1:11434"),
         help="Optional fallback Ollama base URL if primary fails (env OLLAMA_FALLBACK_URL).",
     )
+    parser.add_argument(
+        "--backends",
+        default=os.getenv("OLLAMA_BACKENDS", ""),
+        help="Extra comma separated Ollama URLs to load-balance over (env OLLAMA_BACKENDS).",
+    )
     parser.add_argument(
         "--port",
         type=int,
         default=os.getenv("OLLAMA_PORT"),
         help="Optional port to build base URL like http://127.0.0.1:{port} (overrides --ollama if provided).",
     )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=int(os.getenv("TOOL_MAX_CONCURRENCY", "4")),
+        help="Jobs run in parallel; match Ollama's OLLAMA_NUM_PARALLEL (env TOOL_MAX_CONCURRENCY).",
+    )
+    parser.add_argument(
+        "--outbox-size",
+        type=int,
+        default=int(os.getenv("TOOL_OUTBOX_SIZE", "256")),
+        help="Frames buffered for the gateway before streaming jobs pause (env TOOL_OUTBOX_SIZE).",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=int(os.getenv("METRICS_PORT", "0")),
+        help="Serve Prometheus metrics on this local port, 0 disables (env METRICS_PORT).",
+    )
     parser.add_argument(
         "--pc-id",
         default=os.getenv("PC_ID"),
@@ -207,5 +395,9 @@ if __name__ == "__main__":
             args.ollama,
             token=args.token,
             fallback_base_url=args.fallback_ollama,
+            max_concurrency=args.max_concurrency,
+            outbox_size=args.outbox_size,
+            backends=[url.strip() for url in args.backends.split(",") if url.strip()],
+            metrics_port=args.metrics_port,
         )
     )
@@ -0,0 +1 @@
+"""Handler plugins for worker_runtime: every module here is imported at startup."""
@@ -0,0 +1,53 @@
+"""
+Ollama capabilities for the worker runtime: chat (optionally streamed) and embeddings.
+
+Both call OLLAMA_BASE_URL (worker_client.py --ollama sets it); its installed and
+loaded models are reported in heartbeats.
+"""
+from __future__ import annotations
+
+import os
+from typing import Any, Dict
+
+from ollama_http import get_response_cache, list_models, post_chat, post_embed, stream_chat_collect
+from worker_runtime import TaskContext, capability, models_source
+
+
+def _base_url() -> str:
+    return os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
+
+
+@capability(
+    "ollama_chat_task",
+    concurrency=4,  # match Ollama's OLLAMA_NUM_PARALLEL
+    request_example={
+        "model": "gpt-oss:latest",
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": "Viết một đoạn giới thiệu ngắn về Bumbee AI."},
+        ],
+        "stream": False,
+    },
+)
+async def ollama_chat(payload: Dict[str, Any], ctx: TaskContext) -> Dict[str, Any]:
+    """/api/chat; with "stream": true every chunk is relayed as a task_chunk frame."""
+    base_url = _base_url()
+    cache = get_response_cache()
+    if not payload.get("stream"):
+        return await cache.run(payload, lambda: post_chat(base_url, payload))
+    return await cache.run_stream(payload, ctx.emit, lambda: stream_chat_collect(base_url, payload, ctx.emit))
+
+
+@capability(
+    "ollama_embed_task",
+    concurrency=8,
+    request_example={"model": "nomic-embed-text", "input": ["Bumbee AI", "Gateway skill"]},
+)
+async def ollama_embed(payload: Dict[str, Any], ctx: TaskContext) -> Dict[str, Any]:
+    """/api/embed; returns {"model", "embeddings": [[...], ...]}."""
+    return await post_embed(_base_url(), payload)
+
+
+@models_source
+async def ollama_models() -> Dict[str, Any]:
+    return await list_models(_base_url())
@@ -0,0 +1,200 @@
+"""
+Load metrics for tool_client.py and worker_client.py: sent in every heartbeat
+and, optionally, served in Prometheus text format on a local port.
+
+``WorkerMetrics.observe`` records each finished job (latency, status, Ollama
+eval_count/eval_duration when the result has them); ``snapshot`` combines
+that with the caller's live numbers (in flight, queued, models) and host
+stats. Only the standard library is used: process CPU comes from os.times(),
+memory from /proc (Linux) with a resource.getrusage fallback.
+
+Env vars:
+- METRICS_WINDOW_SECONDS: how far back p50/p95 and tokens/sec look (default: 300)
+- METRICS_PORT: serve GET /metrics on this port, 0 disables (default: 0)
+- METRICS_HOST: bind address for the metrics port (default: 127.0.0.1)
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+logger = logging.getLogger("worker-metrics")
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+def _read_meminfo() -> Dict[str, int]:
+    info: Dict[str, int] = {}
+    try:
+        with open("/proc/meminfo", encoding="ascii") as fh:
+            for line in fh:
+                key, _, rest = line.partition(":")
+                info[key] = int(rest.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return info
+
+
+def _rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm", encoding="ascii") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # peak, KiB on Linux
+
+
+class WorkerMetrics:
+    """Rolling job latency/throughput plus host load for one client process."""
+
+    def __init__(self, window_seconds: float | None = None) -> None:
+        self.window = window_seconds or float(os.getenv("METRICS_WINDOW_SECONDS", "300"))
+        # (finished_at, latency_seconds, eval_tokens, eval_seconds)
+        self._recent: Deque[Tuple[float, float, int, float]] = deque()
+        self.jobs_total: Counter[Tuple[str, str]] = Counter()  # (capability, status) -> count
+        self.tokens_total = 0
+        self.latency_sum = 0.0
+        self._cpu_mark = (time.monotonic(), sum(os.times()[:2]))
+
+    def observe(self, capability: str, seconds: float, status: str, result: Any = None) -> None:
+        """Record one finished job; Ollama's eval_count/eval_duration feed tokens/sec."""
+        tokens, eval_seconds = 0, 0.0
+        if isinstance(result, dict):
+            tokens = int(result.get("eval_count") or 0)
+            eval_seconds = (result.get("eval_duration") or 0) / 1e9
+        now = time.monotonic()
+        self._recent.append((now, seconds, tokens, eval_seconds))
+        self._prune(now)
+        self.jobs_total[(capability, status)] += 1
+        self.tokens_total += tokens
+        self.latency_sum += seconds
+
+    def _prune(self, now: float) -> None:
+        while self._recent and self._recent[0][0] < now - self.window:
+            self._recent.popleft()
+
+    def _cpu_percent(self) -> float:
+        """Process CPU since the previous call, 100 = one core busy."""
+        now, cpu = time.monotonic(), sum(os.times()[:2])
+        then, cpu_then = self._cpu_mark
+        self._cpu_mark = (now, cpu)
+        return round(100 * (cpu - cpu_then) / (now - then), 1) if now > then else 0.0
+
+    def system(self) -> Dict[str, Any]:
+        meminfo = _read_meminfo()
+        total, available = meminfo.get("MemTotal"), meminfo.get("MemAvailable")
+        try:
+            load1 = os.getloadavg()[0]
+        except (OSError, AttributeError):
+            load1 = None
+        return {
+            "cpu_percent": self._cpu_percent(),
+            "cpu_count": os.cpu_count(),
+            "load1": load1,
+            "rss_bytes": _rss_bytes(),
+            "memory_percent": round(100 * (1 - available / total), 1) if total and available is not None else None,
+        }
+
+    def snapshot(
+        self,
+        *,
+        in_flight: int,
+        queued: int,
+        capacity: int | None = None,
+        models: Dict[str, List[str]] | None = None,
+    ) -> Dict[str, Any]:
+        """Heartbeat payload: live load, recent latency and throughput, models, host stats."""
+        self._prune(time.monotonic())
+        latencies = [item[1] for item in self._recent]
+        tokens = sum(item[2] for item in self._recent)
+        eval_seconds = sum(item[3] for item in self._recent)
+        return {
+            "in_flight": in_flight,
+            "queued": queued,
+            "capacity": capacity,
+            "latency_ms": {
+                "p50": round(_percentile(latencies, 50) * 1000, 1),
+                "p95": round(_percentile(latencies, 95) * 1000, 1),
+                "window_jobs": len(latencies),
+            },
+            # Decode speed per stream: generated tokens over Ollama's eval time.
+            "tokens_per_second": round(tokens / eval_seconds, 1) if eval_seconds else 0.0,
+            "models": models or {},
+            "system": self.system(),
+        }
+
+    def prometheus(self, snapshot: Dict[str, Any]) -> str:
+        """Render ``snapshot`` plus the lifetime counters in Prometheus text format."""
+        lines = [
+            "# TYPE worker_jobs_in_flight gauge",
+            f"worker_jobs_in_flight {snapshot['in_flight']}",
+            "# TYPE worker_jobs_queued gauge",
+            f"worker_jobs_queued {snapshot['queued']}",
+        ]
+        if snapshot.get("capacity") is not None:
+            lines += ["# TYPE worker_capacity gauge", f"worker_capacity {snapshot['capacity']}"]
+        lines.append("# TYPE worker_jobs_total counter")
+        for (capability, status), count in sorted(self.jobs_total.items()):
+            lines.append(f'worker_jobs_total{{capability="{capability}",status="{status}"}} {count}')
+        latency = snapshot["latency_ms"]
+        lines += [
+            "# TYPE worker_job_latency_seconds summary",
+            f'worker_job_latency_seconds{{quantile="0.5"}} {round(latency["p50"] / 1000, 4)}',
+            f'worker_job_latency_seconds{{quantile="0.95"}} {round(latency["p95"] / 1000, 4)}',
+            f"worker_job_latency_seconds_sum {round(self.latency_sum, 4)}",
+            f"worker_job_latency_seconds_count {sum(self.jobs_total.values())}",
+            "# TYPE worker_tokens_total counter",
+            f"worker_tokens_total {self.tokens_total}",
+            "# TYPE worker_tokens_per_second gauge",
+            f"worker_tokens_per_second {snapshot['tokens_per_second']}",
+            "# TYPE worker_model_loaded gauge",
+        ]
+        for model in snapshot.get("models", {}).get("loaded", []):
+            lines.append(f'worker_model_loaded{{model="{model}"}} 1')
+        for key, value in snapshot["system"].items():
+            if value is not None:
+                lines += [f"# TYPE worker_{key} gauge", f"worker_{key} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+async def serve_metrics(port: int, render: Callable[[], str], host: str | None = None) -> asyncio.AbstractServer:
+    """Minimal HTTP endpoint: GET /metrics returns ``render()``, anything else 404."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass  # skip headers
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", render().encode("utf-8")
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    bind = host or os.getenv("METRICS_HOST", "127.0.0.1")
+    server = await asyncio.start_server(handle, bind, port)
+    logger.info("Serving metrics on http://%s:%s/metrics", bind, port)
+    return server
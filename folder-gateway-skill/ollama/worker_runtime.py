@@ -0,0 +1,400 @@
+"""
+Pluggable runtime for gateway task workers: one process serves every
+registered capability concurrently.
+
+Capabilities are handlers registered with ``@capability``:
+
+    from worker_runtime import capability
+
+    @capability("ollama_embed_task", concurrency=8, request_example={...})
+    async def embed(payload, ctx): ...
+
+    @capability("cpu_hash_task", executor="process")
+    def cpu_hash(payload): ...
+
+Async handlers run on the event loop and get a ``TaskContext``
+(``await ctx.emit(chunk)`` sends a task_chunk frame). Sync handlers take only
+the payload and run in a thread pool (executor="thread", the default) or a
+process pool (executor="process"; handler, payload and result must be
+picklable).
+
+Handler modules are found the way worker_main.py finds task modules: every
+module in the worker_handlers package is imported, plus the modules listed
+in WORKER_HANDLER_MODULES.
+
+Each capability has its own concurrency limit; tasks over it wait in that
+capability's queue. Heartbeats carry running/queued counts per capability
+plus the load data of worker_metrics.py (p50/p95 latency, tokens/sec,
+CPU/memory, and models reported by a ``@models_source`` hook such as the
+Ollama handler's); METRICS_PORT serves the same on /metrics.
+Results go through one writer queue and the reconnect/ledger behaviour of
+ws_session.py (re-sent after reconnect, repeated tracking_id answered once),
+which also negotiates msgpack frames and skips resending unchanged
+registration metadata.
+
+Env vars (read when the runtime is created, after .env is loaded):
+- WORKER_HANDLER_MODULES: extra comma separated handler modules to import
+- WORKER_CAPABILITIES: comma separated capabilities to serve (default: all registered)
+- WORKER_CONCURRENCY: per-capability limits overriding handler defaults, "name=4;other=8"
+- WORKER_THREAD_POOL_SIZE: threads for sync handlers (default: 8)
+- WORKER_PROCESS_POOL_SIZE: processes for executor="process" handlers (default: CPU count)
+- WORKER_OUTBOX_SIZE: frames buffered for the gateway before handlers pause (default: 256)
+- WORKER_HEARTBEAT_SECONDS: heartbeat (and models refresh) interval (default: 15)
+- METRICS_PORT: serve Prometheus metrics on this local port, 0 disables (default: 0)
+"""
+from __future__ import annotations
+
+import asyncio
+import importlib
+import inspect
+import logging
+import os
+import pkgutil
+import time
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Iterable, List
+
+import websockets
+
+from worker_metrics import WorkerMetrics, serve_metrics
+from ws_session import Backoff, FrameCodec, Outbox, RegistrationCache, ResultLedger, connect_options, register
+
+logger = logging.getLogger("worker-runtime")
+
+
+class Capability:
+    """A registered handler and how to run it."""
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[..., Any],
+        *,
+        concurrency: int,
+        executor: str,
+        request_example: Dict[str, Any] | None,
+    ) -> None:
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.executor = executor
+        self.request_example = request_example
+        self.is_async = inspect.iscoroutinefunction(handler)
+
+
+_registry: Dict[str, Capability] = {}
+
+
+def capability(
+    name: str,
+    *,
+    concurrency: int = 1,
+    executor: str = "thread",
+    request_example: Dict[str, Any] | None = None,
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Register the decorated function as the handler for capability ``name``."""
+    if executor not in {"thread", "process"}:
+        raise ValueError(f"executor must be 'thread' or 'process', got {executor!r}")
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        if name in _registry and _registry[name].handler is not func:
+            logger.warning("Capability %s re-registered by %s", name, func.__module__)
+        _registry[name] = Capability(
+            name, func, concurrency=concurrency, executor=executor, request_example=request_example
+        )
+        return func  # unchanged, so process-pool handlers stay picklable
+
+    return decorator
+
+
+_models_sources: List[Callable[[], Awaitable[Dict[str, List[str]]]]] = []
+
+
+def models_source(func: Callable[[], Awaitable[Dict[str, List[str]]]]) -> Callable[[], Awaitable[Dict[str, List[str]]]]:
+    """Register an async ``() -> {"installed": [...], "loaded": [...]}`` reported in heartbeats."""
+    _models_sources.append(func)
+    return func
+
+
+def registered() -> Dict[str, Capability]:
+    return dict(_registry)
+
+
+def _handler_modules() -> list[str]:
+    """Module names under worker_handlers (listed, not imported)."""
+    try:
+        import worker_handlers  # type: ignore
+    except ImportError:
+        return []
+    prefix = worker_handlers.__name__ + "."
+    return [mod for _, mod, _ in pkgutil.iter_modules(worker_handlers.__path__, prefix)]
+
+
+def _from_env() -> list[str]:
+    raw = os.getenv("WORKER_HANDLER_MODULES", "")
+    return [m.strip() for m in raw.split(",") if m.strip()]
+
+
+def load_handlers() -> Dict[str, Capability]:
+    """Import worker_handlers.* and WORKER_HANDLER_MODULES; return the registry."""
+    for mod in [*_handler_modules(), *_from_env()]:
+        try:
+            importlib.import_module(mod)
+            logger.info("Loaded handler module: %s", mod)
+        except Exception as exc:  # noqa: BLE001 - a broken plugin should not stop the others
+            logger.warning("Failed to import handler module %s: %s", mod, exc)
+    return registered()
+
+
+def _parse_limits(raw: str) -> Dict[str, int]:
+    limits: Dict[str, int] = {}
+    for item in raw.split(";"):
+        name, sep, value = item.partition("=")
+        if sep and name.strip() and value.strip().isdigit():
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class TaskContext:
+    """Per-task handle passed to async handlers."""
+
+    def __init__(self, tracking_id: str | None, capability: str, send: Callable[[Dict[str, Any]], Awaitable[None]]):
+        self.tracking_id = tracking_id
+        self.capability = capability
+        self._send = send
+        self._seq = 0
+
+    async def emit(self, chunk: Dict[str, Any]) -> None:
+        """Send a partial result as a task_chunk frame (dropped while disconnected)."""
+        await self._send({"type": "task_chunk", "tracking_id": self.tracking_id, "seq": self._seq, "chunk": chunk})
+        self._seq += 1
+
+
+class WorkerRuntime:
+    """Serves registered capabilities over /ws/workers/{worker_id}."""
+
+    def __init__(self, worker_id: str, capabilities: Iterable[Capability] | None = None) -> None:
+        self.worker_id = worker_id
+        caps = list(capabilities) if capabilities is not None else list(registered().values())
+        wanted = {c.strip() for c in os.getenv("WORKER_CAPABILITIES", "").split(",") if c.strip()}
+        if wanted:
+            caps = [cap for cap in caps if cap.name in wanted]
+        if not caps:
+            raise RuntimeError("No worker capabilities registered (check worker_handlers / WORKER_HANDLER_MODULES)")
+        self.capabilities = {cap.name: cap for cap in caps}
+        overrides = _parse_limits(os.getenv("WORKER_CONCURRENCY", ""))
+        self.limits = {name: overrides.get(name, cap.concurrency) for name, cap in self.capabilities.items()}
+        self._slots = {name: asyncio.Semaphore(limit) for name, limit in self.limits.items()}
+        self.running: Counter[str] = Counter()
+        self.queued: Counter[str] = Counter()
+        self.outbox_size = int(os.getenv("WORKER_OUTBOX_SIZE", "256"))
+        self.heartbeat_seconds = float(os.getenv("WORKER_HEARTBEAT_SECONDS", "15"))
+        self._threads = ThreadPoolExecutor(
+            max_workers=int(os.getenv("WORKER_THREAD_POOL_SIZE", "8")), thread_name_prefix="worker-handler"
+        )
+        self._processes: ProcessPoolExecutor | None = None
+        self.ledger = ResultLedger()
+        self.metrics = WorkerMetrics()
+        self.codec = FrameCodec()
+        self._registered = RegistrationCache()
+        self.models: Dict[str, List[str]] = {}
+        self.jobs: set[asyncio.Task] = set()
+        # Writer queue of the live connection; None while disconnected.
+        self._outbox: Outbox | None = None
+
+    def registration(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "capabilities": sorted(self.capabilities),
+            "metadata": {
+                "kind": "task-worker",
+                "actions": sorted(self.capabilities),
+                "limits": self.limits,
+                "schemas": {
+                    name: {"request_example": cap.request_example}
+                    for name, cap in sorted(self.capabilities.items())
+                    if cap.request_example
+                },
+            },
+        }
+
+    def load(self) -> Dict[str, Any]:
+        return self.metrics.snapshot(
+            in_flight=sum(self.running.values()),
+            queued=sum(self.queued.values()),
+            capacity=sum(self.limits.values()),
+            models=self.models,
+        )
+
+    def heartbeat(self) -> Dict[str, Any]:
+        """Heartbeat frame with per-capability load, so the gateway can route around busy workers."""
+        return {
+            "type": "heartbeat",
+            **self.load(),
+            "running": sum(self.running.values()),
+            "capabilities": {
+                name: {"running": self.running[name], "queued": self.queued[name], "limit": limit}
+                for name, limit in self.limits.items()
+            },
+        }
+
+    async def _refresh_models(self) -> None:
+        while True:
+            installed: set[str] = set()
+            loaded: set[str] = set()
+            for source in _models_sources:
+                try:
+                    found = await asyncio.wait_for(source(), 5)
+                except Exception as exc:  # noqa: BLE001 - keep the last known list
+                    logger.debug("Models source %s failed: %s", getattr(source, "__name__", source), exc)
+                    continue
+                installed.update(found.get("installed") or [])
+                loaded.update(found.get("loaded") or [])
+            self.models = {"installed": sorted(installed), "loaded": sorted(loaded)}
+            await asyncio.sleep(self.heartbeat_seconds)
+
+    def _executor(self, cap: Capability) -> Executor:
+        if cap.executor == "process":
+            if self._processes is None:
+                size = int(os.getenv("WORKER_PROCESS_POOL_SIZE", "0")) or None
+                self._processes = ProcessPoolExecutor(max_workers=size)
+            return self._processes
+        return self._threads
+
+    async def _send(self, frame: Dict[str, Any], tracking_id: str | None = None) -> None:
+        # Best effort for chunks; results also stay in the ledger until a writer sends them.
+        outbox = self._outbox
+        if outbox is not None:
+            await outbox.put(frame, tracking_id)
+
+    async def execute(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one task under its capability's limit and build the task_result frame."""
+        tracking_id = message.get("tracking_id")
+        name = message.get("capability") or ""
+        payload = message.get("payload") or {}
+        cap = self.capabilities.get(name)
+        if cap is None:
+            return {"type": "task_result", "tracking_id": tracking_id, "status": "error", "error": f"Unsupported capability: {name}"}
+
+        slots = self._slots[name]
+        started = time.monotonic()  # latency includes the wait for a slot
+        status, result = "error", None
+        self.queued[name] += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.queued[name] -= 1
+        self.running[name] += 1
+        try:
+            if cap.is_async:
+                result = await cap.handler(payload, TaskContext(tracking_id, name, self._send))
+            else:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self._executor(cap), cap.handler, payload)
+            status = "ok"
+            return {"type": "task_result", "tracking_id": tracking_id, "status": "ok", "result": result}
+        except Exception as exc:  # noqa: BLE001 - reported to the gateway
+            logger.warning("Task %s (%s) failed: %s", tracking_id, name, exc)
+            return {"type": "task_result", "tracking_id": tracking_id, "status": "error", "error": str(exc)}
+        finally:
+            self.running[name] -= 1
+            slots.release()
+            self.metrics.observe(name, time.monotonic() - started, status, result)
+
+    async def _run_task(self, message: Dict[str, Any]) -> None:
+        tracking_id = message.get("tracking_id")
+        response = await self.execute(message)
+        self.ledger.complete(tracking_id, response)
+        await self._send(response, tracking_id)
+
+    async def run(self, gateway_ws: str) -> None:
+        """Connect, register and serve tasks forever, reconnecting with backoff."""
+        backoff = Backoff()
+        target_ws = gateway_ws.rstrip("/")
+        expected_suffix = f"/ws/workers/{self.worker_id}"
+        if not target_ws.endswith(expected_suffix):
+            target_ws = target_ws + expected_suffix
+        metrics_port = int(os.getenv("METRICS_PORT", "0"))
+        server = await serve_metrics(metrics_port, lambda: self.metrics.prometheus(self.load())) if metrics_port else None
+        refresher = asyncio.create_task(self._refresh_models())
+        try:
+            while True:
+                try:
+                    logger.info("Connecting to gateway %s as worker %s (%s)", target_ws, self.worker_id, ", ".join(self.capabilities))
+                    async with websockets.connect(target_ws, **connect_options()) as ws:
+                        ack = await register(ws, self.registration(), self.codec, self._registered)
+                        logger.info("Registered worker (%s frames): %s", "msgpack" if self.codec.binary else "json", ack)
+                        backoff.reset()
+                        await self._serve(ws)
+                    reason = "closed by gateway"
+                except Exception as exc:  # noqa: BLE001 - any failure means reconnect
+                    reason = str(exc) or type(exc).__name__
+                delay = backoff.next_delay()
+                logger.warning(
+                    "WS worker disconnected (%s), %s tasks running, reconnecting in %.1fs", reason, len(self.jobs), delay
+                )
+                await asyncio.sleep(delay)
+        finally:
+            refresher.cancel()
+            if server is not None:
+                server.close()
+            await self.close()
+
+    async def _serve(self, ws) -> None:
+        outbox = Outbox(self.outbox_size)
+        unsent = self.ledger.pending()
+        self._outbox = outbox
+
+        async def writer():
+            # The only coroutine that sends on the socket.
+            for tracking_id, frame in unsent:
+                await ws.send(self.codec.encode(frame))
+                self.ledger.mark_delivered(tracking_id)
+            if unsent:
+                logger.info("Re-sent %s results finished while disconnected", len(unsent))
+            while True:
+                frame, tracking_id = await outbox.get()
+                await ws.send(self.codec.encode(frame))
+                self.ledger.mark_delivered(tracking_id)
+
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(self.heartbeat_seconds)
+                await outbox.put(self.heartbeat())
+
+        background = [asyncio.create_task(writer()), asyncio.create_task(heartbeat())]
+        try:
+            async for raw in ws:
+                try:
+                    message = self.codec.decode(raw)
+                except ValueError:
+                    continue
+                if message.get("type") != "task":
+                    continue
+                tracking_id = message.get("tracking_id")
+                state = self.ledger.begin(tracking_id)
+                if state == "running":
+                    logger.info("Task %s already running, ignoring duplicate", tracking_id)
+                    continue
+                if state == "done":
+                    await outbox.put(self.ledger.result(tracking_id), tracking_id)
+                    continue
+                job = asyncio.create_task(self._run_task(message))
+                self.jobs.add(job)
+                job.add_done_callback(self.jobs.discard)
+        finally:
+            # Tasks keep running; their results wait in the ledger for the next connection.
+            self._outbox = None
+            outbox.close()  # handlers blocked on a full outbox give up their frame
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+
+    async def close(self) -> None:
+        for job in self.jobs:
+            job.cancel()
+        await asyncio.gather(*self.jobs, return_exceptions=True)
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
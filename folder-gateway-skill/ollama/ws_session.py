@@ -0,0 +1,242 @@
+"""
+Connection helpers shared by tool_client.py and worker_client.py.
+
+``Backoff`` spaces reconnect attempts with capped exponential backoff and
+full jitter, so many clients do not hammer a restarting gateway in lockstep.
+
+``ResultLedger`` remembers job ids and their final frames for the life of
+the process. A result that could not be sent (socket died mid-job) stays
+pending and is re-sent after the next registration; a job id the gateway
+sends again is answered from the ledger (done) or ignored (still running)
+instead of calling Ollama twice.
+
+``Outbox`` is the bounded writer queue of one connection. Once the connection
+is gone it is closed, and every coroutine blocked on a full outbox returns
+(the frame is dropped; results still wait in the ledger).
+
+``FrameCodec`` and ``register`` handle the wire format. Registration is
+always a JSON text frame and offers {"encodings": ["msgpack", "json"]} when
+msgpack is installed; only if the gateway's ack answers {"encoding":
+"msgpack"} do later frames switch to binary msgpack (incoming frames are
+decoded by type either way, so older gateways keep working). Registration
+also carries "registration_hash" (a hash of everything except the token):
+once the gateway echoes it in an ack, reconnects send a compact frame
+without "metadata"/"schemas", and the full one only if the hash changed or
+the gateway replies {"need_metadata": true}. ``connect_options`` turns on
+permessage-deflate and raises the incoming size limit for long chat
+histories.
+
+Env vars (read when the object is created, after .env is loaded):
+- WS_RECONNECT_BASE_SECONDS: first reconnect delay ceiling (default: 1)
+- WS_RECONNECT_MAX_SECONDS: cap for the delay ceiling (default: 60)
+- WS_RESULT_LEDGER_SIZE: job ids remembered; delivered ones are evicted first (default: 1000)
+- WS_ENCODING: "msgpack" to offer binary frames (needs `pip install msgpack`) or "json" (default: "msgpack")
+- WS_COMPRESSION: "deflate" (permessage-deflate) or "none" (default: "deflate")
+- WS_MAX_SIZE_MB: largest incoming frame accepted (default: 16)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import asyncio
+import logging
+import os
+import random
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+try:
+    import msgpack  # type: ignore
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+logger = logging.getLogger("ws-session")
+
+# Registration keys left out of the compact frame once the gateway knows the hash.
+BULKY_REGISTRATION_KEYS = ("metadata", "schemas")
+
+
+class Backoff:
+    """Capped exponential backoff with full jitter: sleep uniform(0, min(cap, base * 2**n))."""
+
+    def __init__(self, base: float | None = None, cap: float | None = None) -> None:
+        self.base = base or float(os.getenv("WS_RECONNECT_BASE_SECONDS", "1"))
+        self.cap = cap or float(os.getenv("WS_RECONNECT_MAX_SECONDS", "60"))
+        self.attempt = 0
+
+    def next_delay(self) -> float:
+        ceiling = min(self.cap, self.base * 2 ** min(self.attempt, 30))
+        self.attempt += 1
+        return random.uniform(0, ceiling)
+
+    def reset(self) -> None:
+        """Call once a connection is registered."""
+        self.attempt = 0
+
+
+class ResultLedger:
+    """Job id -> state ("running"/"done"), final frame and whether it reached the gateway."""
+
+    def __init__(self, size: int | None = None) -> None:
+        self.size = size or int(os.getenv("WS_RESULT_LEDGER_SIZE", "1000"))
+        # job_id -> [state, frame, delivered]
+        self._entries: "OrderedDict[str, List[Any]]" = OrderedDict()
+
+    def begin(self, job_id: str | None) -> str:
+        """
+        Register a job before running it. Returns "new" (run it), "running"
+        (a duplicate of a job in progress) or "done" (re-send ``result``).
+        Jobs without an id are always "new" and are not tracked.
+        """
+        if not job_id:
+            return "new"
+        entry = self._entries.get(job_id)
+        if entry is not None:
+            return entry[0]
+        self._entries[job_id] = ["running", None, False]
+        self._evict()
+        return "new"
+
+    def complete(self, job_id: str | None, frame: Dict[str, Any]) -> None:
+        if job_id:
+            self._entries[job_id] = ["done", frame, False]
+            self._entries.move_to_end(job_id)
+
+    def result(self, job_id: str) -> Dict[str, Any] | None:
+        entry = self._entries.get(job_id)
+        return entry[1] if entry else None
+
+    def mark_delivered(self, job_id: str | None) -> None:
+        entry = self._entries.get(job_id) if job_id else None
+        if entry is not None:
+            entry[2] = True
+
+    def pending(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Finished results not yet sent successfully, oldest first."""
+        return [(job_id, frame) for job_id, (state, frame, delivered) in self._entries.items() if state == "done" and not delivered]
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.size:
+            victim = next((job_id for job_id, entry in self._entries.items() if entry[2]), None)
+            if victim is None:
+                victim = next(iter(self._entries))
+                logger.warning("Result ledger full, forgetting undelivered job %s", victim)
+            del self._entries[victim]
+
+
+class Outbox:
+    """Bounded frame queue of one connection; ``put`` gives up once it is closed."""
+
+    def __init__(self, size: int) -> None:
+        self.queue: asyncio.Queue[Tuple[Dict[str, Any], str | None]] = asyncio.Queue(maxsize=max(1, size))
+        self._closed = asyncio.Event()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    async def put(self, frame: Dict[str, Any], job_id: str | None = None) -> bool:
+        """Queue a frame, waiting for room; False if the connection closed first."""
+        if self.closed:
+            return False
+        if not self.queue.full():
+            self.queue.put_nowait((frame, job_id))
+            return True
+        put = asyncio.ensure_future(self.queue.put((frame, job_id)))
+        closed = asyncio.ensure_future(self._closed.wait())
+        try:
+            await asyncio.wait({put, closed}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            put.cancel()
+            closed.cancel()
+        return put.done() and not put.cancelled()
+
+    async def get(self) -> Tuple[Dict[str, Any], str | None]:
+        return await self.queue.get()
+
+    def close(self) -> None:
+        """Release every blocked ``put``; nothing queued is sent any more."""
+        self._closed.set()
+
+
+def connect_options() -> Dict[str, Any]:
+    """Keyword arguments for websockets.connect."""
+    compression = os.getenv("WS_COMPRESSION", "deflate").lower()
+    return {
+        "compression": None if compression in {"", "none", "off", "0"} else "deflate",
+        "max_size": int(float(os.getenv("WS_MAX_SIZE_MB", "16")) * 1024 * 1024),
+    }
+
+
+class FrameCodec:
+    """JSON text frames until the gateway accepts msgpack in its registration ack."""
+
+    def __init__(self, preferred: str | None = None) -> None:
+        wanted = (preferred or os.getenv("WS_ENCODING", "msgpack")).lower()
+        self.offer = ["msgpack", "json"] if wanted == "msgpack" and msgpack is not None else ["json"]
+        self.binary = False
+
+    def accept(self, ack: Dict[str, Any]) -> None:
+        """Pick the encoding from the registration ack (per connection)."""
+        self.binary = ack.get("encoding") == "msgpack" and "msgpack" in self.offer
+
+    def encode(self, frame: Dict[str, Any]) -> str | bytes:
+        if self.binary:
+            return msgpack.packb(frame, use_bin_type=True)
+        return json.dumps(frame)
+
+    def decode(self, raw: str | bytes) -> Dict[str, Any]:
+        """Decode by frame type (binary = msgpack); raises ValueError on garbage."""
+        try:
+            if isinstance(raw, bytes) and msgpack is not None:
+                message = msgpack.unpackb(raw, raw=False)
+            else:
+                message = json.loads(raw)
+        except Exception as exc:  # noqa: BLE001 - msgpack raises several unrelated types
+            raise ValueError(f"Undecodable frame: {exc}") from exc
+        if not isinstance(message, dict):
+            raise ValueError("Frame is not an object")
+        return message
+
+
+def registration_hash(registration: Dict[str, Any]) -> str:
+    stable = {key: value for key, value in registration.items() if key not in {"token", "registration_hash", "encodings"}}
+    raw = json.dumps(stable, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class RegistrationCache:
+    """Hash of the last registration the gateway acknowledged storing (kept across reconnects)."""
+
+    def __init__(self) -> None:
+        self.known: str | None = None
+
+
+async def register(ws, registration: Dict[str, Any], codec: FrameCodec, cache: RegistrationCache) -> Dict[str, Any]:
+    """
+    Send the registration (compact if the gateway already has this hash),
+    resend it in full if asked, and return the ack. Sets ``codec`` for the
+    rest of the connection.
+    """
+    digest = registration_hash(registration)
+    full = {**registration, "registration_hash": digest, "encodings": codec.offer}
+    frame = full
+    if cache.known == digest:
+        frame = {key: value for key, value in full.items() if key not in BULKY_REGISTRATION_KEYS}
+    codec.binary = False
+
+    async def exchange(payload: Dict[str, Any]) -> Dict[str, Any]:
+        await ws.send(json.dumps(payload))
+        raw = await ws.recv()
+        try:
+            return codec.decode(raw)
+        except ValueError:
+            return {"ack": raw}  # plain-text ack from an older gateway
+
+    ack = await exchange(frame)
+    if frame is not full and ack.get("need_metadata"):
+        logger.info("Gateway asked for full registration metadata")
+        ack = await exchange(full)
+    cache.known = digest if ack.get("registration_hash") == digest else None
+    codec.accept(ack)
+    return ack
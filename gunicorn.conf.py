@@ -0,0 +1,81 @@
+"""
+Production serving config: N uvicorn workers behind gunicorn with app preload.
+
+Usage:
+    pip install gunicorn
+    gunicorn ui:app -c gunicorn.conf.py
+
+The master imports ui.py once and builds read-only state (suggestion index,
+compiled templates); workers fork from it and share that state copy-on-write.
+Gateway registration and lease renewal run in whichever worker holds
+REGISTER_LOCK_FILE; if that worker exits, another takes over.
+
+Workers do not rebuild the suggestion index on a timer here
+(SUGGEST_REBUILD_SECONDS defaults to 0): each rebuild rescans the query log
+and queries Vespa, and a per-worker copy would undo the sharing. The master
+rebuilds it on `kill -HUP`, so the fresh workers share the new table.
+
+Env vars:
+- BIND: listen address (default: "0.0.0.0:8000")
+- WEB_CONCURRENCY: worker processes (default: CPU count)
+- GUNICORN_TIMEOUT / GUNICORN_GRACEFUL_TIMEOUT / GUNICORN_KEEPALIVE: seconds (default: 60 / 30 / 5)
+- GUNICORN_MAX_REQUESTS: recycle workers after N requests, 0 disables (default: 0)
+- GUNICORN_WORKER_CLASS: worker class (default: "uvicorn.workers.UvicornWorker")
+- REGISTER_LOCK_FILE: lock electing the registering worker (default: <tmp>/<SERVICE_NAME>-gateway-register.lock)
+- SUGGEST_REBUILD_SECONDS: per-worker periodic suggestion rebuilds, trading memory and Vespa load for freshness (default: 0)
+
+Reload without dropping requests:
+- `kill -HUP <master>` rebuilds the suggestion index in the master, then starts fresh workers
+  and drains the old ones within graceful_timeout.
+  With preload the code is not re-imported; for a code deploy use
+  `kill -USR2 <master>` (new master) then `kill -QUIT <old master>`.
+"""
+
+import gc
+import multiprocessing
+import os
+import tempfile
+
+# Only one worker per host registers with the gateway (and renews the lease).
+os.environ.setdefault(
+    "REGISTER_LOCK_FILE",
+    os.path.join(tempfile.gettempdir(), f"{os.getenv('SERVICE_NAME', 'simple-search')}-gateway-register.lock"),
+)
+# Keep the preloaded suggestion table shared; the master refreshes it in on_reload.
+os.environ.setdefault("SUGGEST_REBUILD_SECONDS", "0")
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "uvicorn.workers.UvicornWorker")
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    """Runs in the master after preload, before the first worker forks."""
+    import ui
+
+    ui.preload_shared_state()
+    # Move everything allocated so far out of GC tracking so collections in
+    # workers do not touch (and un-share) the preloaded pages.
+    gc.freeze()
+    server.log.info("Preloaded shared state for %s workers", workers)
+
+
+def on_reload(server):
+    """`kill -HUP`: rebuild shared state in the master before the new workers fork."""
+    import ui
+
+    ui.preload_shared_state()
+    gc.freeze()
+    server.log.info("Rebuilt shared state before reloading workers")
+
+
+def post_fork(server, worker):
+    import ui
+
+    ui.get_vespa_client.cache_clear()
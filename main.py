@@ -1,3 +1,6 @@
+from datetime import datetime
+from urllib.parse import urlparse
+
 from vespa.package import (
     ApplicationPackage,
     Field,
@@ -22,6 +25,12 @@ package = ApplicationPackage(
                     Field(name="id", type="string", indexing=["summary"]),
                     Field(name="text", type="string", indexing=["index", "summary"], index="enable-bm25"),
                     Field(name="url", type="string", indexing=["index","summary"]),
+                    # Attribute fields backing the facet counts (Vespa grouping) in ui.py
+                    Field(name="host", type="string", indexing=["attribute", "summary"]),
+                    Field(name="tld", type="string", indexing=["attribute", "summary"]),
+                    Field(name="language", type="string", indexing=["attribute", "summary"]),
+                    Field(name="crawl_date", type="long", indexing=["attribute", "summary"]),
+                    Field(name="dataset", type="string", indexing=["attribute", "summary"]),
                 ]
             ),
             fieldsets=[
@@ -34,7 +43,9 @@ package = ApplicationPackage(
                         Function(name="bm25texturl", expression="bm25(text) + 0.1 * bm25(url)"),
                     ],
                     first_phase="bm25texturl",
-                )
+                ),
+                # Text-only baseline to compare bm25texturl against (see evaluate.py)
+                RankProfile(name="bm25-text", first_phase="bm25(text)"),
             ],
         ),
     ]
@@ -43,13 +54,32 @@ package = ApplicationPackage(
 vespa_docker = VespaDocker()
 app = vespa_docker.deploy(application_package=package)
 
-dataset = load_dataset("HuggingFaceFW/fineweb", "CC-MAIN-2025-26", split="train", streaming=True).take(1000)
+DATASET_NAME = "CC-MAIN-2025-26"
+
+
+def facet_fields(url: str, date: str | None) -> dict:
+    """Derive the host/tld/crawl_date attributes used for faceting (crawl_date omitted when unknown)."""
+    host = (urlparse(url).hostname or "").lower()
+    tld = host.rsplit(".", 1)[-1] if "." in host else ""
+    fields = {"host": host, "tld": tld}
+    if date:
+        try:
+            fields["crawl_date"] = int(datetime.fromisoformat(date.replace("Z", "+00:00")).timestamp())
+        except ValueError:
+            pass
+    return fields
+
+
+dataset = load_dataset("HuggingFaceFW/fineweb", DATASET_NAME, split="train", streaming=True).take(1000)
 vespa_feed = dataset.map(lambda x: {
     "id": x["id"],
     "fields": {
         "text": x["text"],
         "url": x["url"],
         "id": x["id"],
+        "language": x.get("language") or "",
+        "dataset": x.get("dump") or DATASET_NAME,
+        **facet_fields(x["url"], x.get("date")),
     }
 })
 
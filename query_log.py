@@ -0,0 +1,228 @@
+"""
+Non-blocking query log for the search UI.
+
+Requests only enqueue a record; a background thread batches records and
+appends them to rotating JSONL segments. Each batch is written as an
+independent zstd frame, so a segment stays readable even if the process
+dies mid-write. ``zstandard`` is a project dependency; if it is missing
+(e.g. a trimmed install) segments fall back to gzip members and a warning
+is logged once at start.
+
+Env vars:
+- QUERY_LOG_ENABLED: "0" disables capture (default: "1")
+- QUERY_LOG_DIR: segment directory (default: "logs/queries")
+- QUERY_LOG_BATCH_SIZE / QUERY_LOG_FLUSH_SECONDS: batching policy (default: 256 / 1.0)
+- QUERY_LOG_SEGMENT_MB / QUERY_LOG_SEGMENT_SECONDS: rotation policy (default: 64 / 3600)
+- QUERY_LOG_MAX_SEGMENTS: segments kept on disk, oldest removed first (default: 48)
+- QUERY_LOG_QUEUE_SIZE: max pending records; extra records are dropped (default: 10000)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import io
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+try:  # Declared dependency; gzip fallback keeps logging alive without it
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("QUERY_LOG_ENABLED", "1").lower() not in {"0", "false", "no"}
+LOG_DIR = os.getenv("QUERY_LOG_DIR", "logs/queries")
+BATCH_SIZE = int(os.getenv("QUERY_LOG_BATCH_SIZE", "256"))
+FLUSH_SECONDS = float(os.getenv("QUERY_LOG_FLUSH_SECONDS", "1.0"))
+SEGMENT_MAX_BYTES = int(float(os.getenv("QUERY_LOG_SEGMENT_MB", "64")) * 1024 * 1024)
+SEGMENT_MAX_SECONDS = float(os.getenv("QUERY_LOG_SEGMENT_SECONDS", "3600"))
+MAX_SEGMENTS = int(os.getenv("QUERY_LOG_MAX_SEGMENTS", "48"))
+QUEUE_SIZE = int(os.getenv("QUERY_LOG_QUEUE_SIZE", "10000"))
+
+SEGMENT_PREFIX = "queries-"
+ZSTD_SUFFIX = ".jsonl.zst"
+GZIP_SUFFIX = ".jsonl.gz"
+
+_STOP = object()
+
+
+def _compress(data: bytes) -> bytes:
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=5)
+
+
+class QueryLogger:
+    """Background, batching writer for query records."""
+
+    def __init__(
+        self,
+        directory: str | Path = LOG_DIR,
+        *,
+        enabled: bool = ENABLED,
+        batch_size: int = BATCH_SIZE,
+        flush_seconds: float = FLUSH_SECONDS,
+        segment_max_bytes: int = SEGMENT_MAX_BYTES,
+        segment_max_seconds: float = SEGMENT_MAX_SECONDS,
+        max_segments: int = MAX_SEGMENTS,
+        queue_size: int = QUEUE_SIZE,
+    ) -> None:
+        self.directory = Path(directory)
+        self.enabled = enabled
+        self._batch_size = max(1, batch_size)
+        self._flush_seconds = flush_seconds
+        self._segment_max_bytes = segment_max_bytes
+        self._segment_max_seconds = segment_max_seconds
+        self._max_segments = max_segments
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: threading.Thread | None = None
+        self._segment: Path | None = None
+        self._segment_opened = 0.0
+        self.dropped = 0
+
+    def log(self, record: Dict[str, Any]) -> None:
+        """Enqueue a record; never blocks the caller."""
+        if not self.enabled or self._thread is None:
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self) -> None:
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if zstandard is None:
+            logger.warning("zstandard is not installed; writing gzip query log segments")
+        self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Flush pending records and stop the writer thread, waiting at most ``timeout`` seconds."""
+        thread, self._thread = self._thread, None  # log() stops enqueuing
+        if thread is None:
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("Query log queue still full after %.1fs; pending records are lost", timeout)
+            return
+        thread.join(max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            logger.warning("Query log writer did not finish within %.1fs", timeout)
+        if self.dropped:
+            logger.warning("Query log dropped %s records (queue full)", self.dropped)
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """``stop`` on a worker thread, so shutdown does not block the event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.stop, timeout)
+
+    def _run(self) -> None:
+        while True:
+            batch: List[Dict[str, Any]] = []
+            deadline = time.monotonic() + self._flush_seconds
+            stop = False
+            while len(batch) < self._batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as exc:  # noqa: BLE001 - logging must never take the service down
+                    logger.warning("Failed to write %s query log records: %s", len(batch), exc)
+            if stop:
+                return
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in batch)
+        segment = self._current_segment()
+        with segment.open("ab") as handle:
+            handle.write(_compress(lines.encode("utf-8")))
+
+    def _current_segment(self) -> Path:
+        now = time.time()
+        segment = self._segment
+        if (
+            segment is None
+            or now - self._segment_opened >= self._segment_max_seconds
+            or (segment.exists() and segment.stat().st_size >= self._segment_max_bytes)
+        ):
+            suffix = ZSTD_SUFFIX if zstandard is not None else GZIP_SUFFIX
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(now))
+            segment = self.directory / f"{SEGMENT_PREFIX}{stamp}-{os.getpid()}{suffix}"
+            self._segment = segment
+            self._segment_opened = now
+            self._prune()
+        return segment
+
+    def _prune(self) -> None:
+        segments = list_segments(self.directory)
+        for old in segments[: max(0, len(segments) - self._max_segments + 1)]:
+            try:
+                old.unlink()
+            except OSError:  # pragma: no cover - concurrent prune from another worker
+                pass
+
+
+def list_segments(directory: str | Path = LOG_DIR) -> List[Path]:
+    """Segments in write order (oldest first)."""
+    path = Path(directory)
+    if not path.is_dir():
+        return []
+    segments = [
+        p for p in path.iterdir() if p.name.startswith(SEGMENT_PREFIX) and p.name.endswith((ZSTD_SUFFIX, GZIP_SUFFIX))
+    ]
+    return sorted(segments, key=lambda p: (p.stat().st_mtime, p.name))
+
+
+def _open_segment(path: Path) -> io.TextIOBase:
+    if path.name.endswith(GZIP_SUFFIX):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if zstandard is None:
+        raise RuntimeError(f"zstandard is required to read {path}")
+    raw = zstandard.ZstdDecompressor().stream_reader(path.open("rb"), read_across_frames=True, closefd=True)
+    return io.TextIOWrapper(raw, encoding="utf-8")
+
+
+def iter_records(directory: str | Path = LOG_DIR) -> Iterator[Dict[str, Any]]:
+    """Yield logged records from all segments, oldest first; unreadable lines are skipped."""
+    for segment in list_segments(directory):
+        try:
+            with _open_segment(segment) as handle:
+                for line in handle:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except (OSError, EOFError, RuntimeError) as exc:
+            logger.warning("Skipping unreadable query log segment %s: %s", segment, exc)
+
+
+def count_queries(directory: str | Path = LOG_DIR) -> Counter:
+    """Query popularity from the log (feeds the suggestion index)."""
+    counts: Counter = Counter()
+    for record in iter_records(directory):
+        query = " ".join(str(record.get("query") or "").lower().split())
+        if query:
+            counts[query] += 1
+    return counts
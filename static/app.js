@@ -4,7 +4,9 @@ document.addEventListener("DOMContentLoaded", () => {
   const limitInput = document.getElementById("limit");
   const status = document.getElementById("status");
   const resultsEl = document.getElementById("results");
+  const facetsEl = document.getElementById("facets");
   const button = document.getElementById("search-button");
+  const suggestionsEl = document.getElementById("suggestions");
 
   if (!form || !queryInput || !status || !resultsEl || !button) {
     return;
@@ -15,6 +17,46 @@ document.addEventListener("DOMContentLoaded", () => {
     status.style.color = isError ? "#f87171" : "var(--muted)";
   };
 
+  const facetLabels = {
+    host: "Host",
+    tld: "TLD",
+    language: "Language",
+    crawl_date: "Crawl date",
+    dataset: "Dataset",
+  };
+
+  const renderFacets = (payload) => {
+    if (!facetsEl) {
+      return;
+    }
+    const { facets = {} } = payload || {};
+    facetsEl.innerHTML = "";
+    const entries = Object.entries(facets).filter(([, buckets]) => buckets && buckets.length);
+    facetsEl.hidden = !entries.length;
+
+    entries.forEach(([name, buckets]) => {
+      const group = document.createElement("div");
+      group.className = "facet-group";
+      const title = document.createElement("h2");
+      title.textContent = facetLabels[name] || name;
+      group.appendChild(title);
+
+      const list = document.createElement("ul");
+      buckets.forEach(({ value, count }) => {
+        const item = document.createElement("li");
+        const label = document.createElement("span");
+        label.textContent = value;
+        const badge = document.createElement("span");
+        badge.className = "badge";
+        badge.textContent = count;
+        item.append(label, badge);
+        list.appendChild(item);
+      });
+      group.appendChild(list);
+      facetsEl.appendChild(group);
+    });
+  };
+
   const renderHits = (payload) => {
     const { hits = [], latency_ms = 0, total_available = 0 } = payload || {};
     resultsEl.innerHTML = "";
@@ -51,6 +93,59 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   };
 
+  const SUGGEST_DELAY_MS = 150;
+  const suggestCache = new Map();
+  let suggestTimer;
+  let suggestController;
+
+  const renderSuggestions = (items) => {
+    if (!suggestionsEl) {
+      return;
+    }
+    suggestionsEl.innerHTML = "";
+    items.forEach(({ text }) => {
+      const option = document.createElement("option");
+      option.value = text;
+      suggestionsEl.appendChild(option);
+    });
+  };
+
+  const fetchSuggestions = async (prefix) => {
+    if (suggestCache.has(prefix)) {
+      renderSuggestions(suggestCache.get(prefix));
+      return;
+    }
+    if (suggestController) {
+      suggestController.abort();
+    }
+    suggestController = new AbortController();
+    try {
+      const response = await fetch(`/suggest?q=${encodeURIComponent(prefix)}`, {
+        signal: suggestController.signal,
+      });
+      if (!response.ok) {
+        return;
+      }
+      const { suggestions = [] } = await response.json();
+      suggestCache.set(prefix, suggestions);
+      renderSuggestions(suggestions);
+    } catch (error) {
+      if (error.name !== "AbortError") {
+        console.error(error);
+      }
+    }
+  };
+
+  queryInput.addEventListener("input", () => {
+    clearTimeout(suggestTimer);
+    const prefix = queryInput.value.trim().toLowerCase();
+    if (!prefix) {
+      renderSuggestions([]);
+      return;
+    }
+    suggestTimer = setTimeout(() => fetchSuggestions(prefix), SUGGEST_DELAY_MS);
+  });
+
   form.addEventListener("submit", async (event) => {
     event.preventDefault();
     const query = queryInput.value.trim();
@@ -62,11 +157,13 @@ document.addEventListener("DOMContentLoaded", () => {
     button.disabled = true;
     renderStatus("Searching…");
     resultsEl.innerHTML = "";
+    renderFacets(null);
 
     const limitValue = limitInput ? parseInt(limitInput.value, 10) : undefined;
     const payloadBody = {
       query,
       limit: Number.isFinite(limitValue) ? limitValue : undefined,
+      facets: Object.keys(facetLabels),
     };
 
     try {
@@ -84,6 +181,7 @@ document.addEventListener("DOMContentLoaded", () => {
         limitInput.value = payload.limit;
       }
       renderHits(payload);
+      renderFacets(payload);
     } catch (error) {
       console.error(error);
       renderStatus(error.message || "Something went wrong.", true);
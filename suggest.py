@@ -0,0 +1,223 @@
+"""
+In-memory type-ahead index for the search UI.
+
+Suggestions are served from a sorted term table (binary search on the prefix
+range) so partial queries never reach Vespa. The table is rebuilt
+periodically in the background and swapped atomically.
+
+Sources:
+- Popular queries: text files listed in SUGGEST_QUERY_FILES (one query per
+  line, repeated lines count as popularity)
+- Query log: queries captured by query_log.py (see ui.py wiring)
+- URL tokens: host/path tokens sampled from indexed documents
+
+Env vars:
+- SUGGEST_QUERY_FILES: comma separated query files (default: "data/popular_queries.txt")
+- SUGGEST_DOC_SAMPLE: number of documents sampled for URL tokens (default: 400, 0 disables)
+- SUGGEST_REBUILD_SECONDS: rebuild interval (default: 300, 0 disables periodic rebuilds)
+- SUGGEST_LIMIT: default number of suggestions (default: 8)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import os
+import re
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+QUERY_FILES = [
+    path.strip()
+    for path in os.getenv("SUGGEST_QUERY_FILES", "data/popular_queries.txt").split(",")
+    if path.strip()
+]
+DOC_SAMPLE = int(os.getenv("SUGGEST_DOC_SAMPLE", "400"))
+REBUILD_SECONDS = float(os.getenv("SUGGEST_REBUILD_SECONDS", "300"))
+DEFAULT_LIMIT = int(os.getenv("SUGGEST_LIMIT", "8"))
+MAX_LIMIT = 20
+
+# Queries typed by users outrank tokens mined from URLs.
+QUERY_WEIGHT = 1.0
+URL_TOKEN_WEIGHT = 0.1
+
+# Very short prefixes match a large slice of the table, so their top-k is precomputed.
+CACHED_PREFIX_LENGTH = 2
+
+_URL_STOPWORDS = {"http", "https", "www", "com", "org", "net", "html", "htm", "php", "index"}
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse whitespace so lookups match regardless of typing style."""
+    return " ".join(text.lower().split())
+
+
+class PrefixIndex:
+    """Immutable sorted term table with weight-ordered prefix lookups."""
+
+    def __init__(self, weights: Mapping[str, float], cache_size: int = MAX_LIMIT) -> None:
+        items = sorted((term, weight) for term, weight in weights.items() if term)
+        self._terms: List[str] = [term for term, _ in items]
+        self._weights: List[float] = [weight for _, weight in items]
+        self._head_cache: Dict[str, List[Tuple[str, float]]] = self._build_head_cache(cache_size)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def _build_head_cache(self, cache_size: int) -> Dict[str, List[Tuple[str, float]]]:
+        buckets: Dict[str, List[Tuple[float, str]]] = {}
+        for term, weight in zip(self._terms, self._weights):
+            for length in range(1, min(CACHED_PREFIX_LENGTH, len(term)) + 1):
+                heap = buckets.setdefault(term[:length], [])
+                if len(heap) < cache_size:
+                    heapq.heappush(heap, (weight, term))
+                elif weight > heap[0][0]:
+                    heapq.heapreplace(heap, (weight, term))
+        return {
+            prefix: [(term, weight) for weight, term in sorted(heap, key=lambda item: (-item[0], item[1]))]
+            for prefix, heap in buckets.items()
+        }
+
+    def lookup(self, prefix: str, limit: int = DEFAULT_LIMIT) -> List[Tuple[str, float]]:
+        """Return up to ``limit`` (term, weight) pairs starting with ``prefix``, best first."""
+        key = normalize(prefix)
+        if not key or limit <= 0:
+            return []
+        cached = self._head_cache.get(key)
+        if cached is not None:
+            return cached[:limit]
+
+        start = bisect_left(self._terms, key)
+        end = bisect_left(self._terms, key + "\uffff", lo=start)
+        candidates = range(start, end)
+        best = heapq.nsmallest(limit, candidates, key=lambda i: (-self._weights[i], self._terms[i]))
+        return [(self._terms[i], self._weights[i]) for i in best]
+
+
+def read_query_files(paths: Iterable[str]) -> Counter:
+    """Count queries from plain-text files (one query per line)."""
+    counts: Counter = Counter()
+    for raw_path in paths:
+        path = Path(raw_path)
+        if not path.exists():
+            continue
+        try:
+            with path.open("r", encoding="utf-8") as handle:
+                for line in handle:
+                    query = normalize(line)
+                    if query:
+                        counts[query] += 1
+        except OSError as exc:  # pragma: no cover - best-effort source
+            logger.warning("Failed to read suggestion source %s: %s", path, exc)
+    return counts
+
+
+def url_tokens(url: str) -> List[str]:
+    """Split a URL into host/path tokens worth suggesting."""
+    parsed = urlparse(url if "://" in url else f"http://{url}")
+    raw = f"{parsed.hostname or ''} {parsed.path}".lower()
+    return [
+        token
+        for token in _TOKEN_SPLIT.split(raw)
+        if len(token) >= 3 and not token.isdigit() and token not in _URL_STOPWORDS
+    ]
+
+
+def build_index(queries: Mapping[str, int], urls: Iterable[str]) -> PrefixIndex:
+    weights: Dict[str, float] = {}
+    for query, count in queries.items():
+        weights[query] = weights.get(query, 0.0) + QUERY_WEIGHT * count
+    for url in urls:
+        for token in url_tokens(url):
+            weights[token] = weights.get(token, 0.0) + URL_TOKEN_WEIGHT
+    return PrefixIndex(weights)
+
+
+class SuggestService:
+    """Holds the live index and rebuilds it on a timer without blocking lookups."""
+
+    def __init__(
+        self,
+        sample_urls: Callable[[int], List[str]] | None = None,
+        logged_queries: Callable[[], Mapping[str, int]] | None = None,
+        query_files: Iterable[str] = QUERY_FILES,
+        doc_sample: int = DOC_SAMPLE,
+        rebuild_seconds: float = REBUILD_SECONDS,
+    ) -> None:
+        self._sample_urls = sample_urls
+        self._logged_queries = logged_queries
+        self._query_files = list(query_files)
+        self._doc_sample = doc_sample
+        self._rebuild_seconds = rebuild_seconds
+        self._index = PrefixIndex({})
+        self._task: asyncio.Task | None = None
+
+    @property
+    def index(self) -> PrefixIndex:
+        return self._index
+
+    def rebuild(self) -> PrefixIndex:
+        """Build a fresh index from all sources and swap it in."""
+        queries = read_query_files(self._query_files)
+        if self._logged_queries:
+            try:
+                for query, count in self._logged_queries().items():
+                    key = normalize(query)
+                    if key:
+                        queries[key] += count
+            except Exception as exc:  # noqa: BLE001 - a bad log segment must not block rebuilds
+                logger.warning("Failed to read logged queries for suggestions: %s", exc)
+        urls: List[str] = []
+        if self._sample_urls and self._doc_sample > 0:
+            try:
+                urls = self._sample_urls(self._doc_sample)
+            except Exception as exc:  # noqa: BLE001 - Vespa may be down; keep query terms
+                logger.warning("Failed to sample document URLs for suggestions: %s", exc)
+        index = build_index(queries, urls)
+        self._index = index
+        logger.info("Suggestion index rebuilt: %s terms", len(index))
+        return index
+
+    def suggest(self, prefix: str, limit: int | None = None) -> List[Dict[str, Any]]:
+        effective_limit = max(1, min(MAX_LIMIT, limit or DEFAULT_LIMIT))
+        return [
+            {"text": term, "score": round(weight, 3)}
+            for term, weight in self._index.lookup(prefix, effective_limit)
+        ]
+
+    async def _rebuild_forever(self) -> None:
+        # An index built before startup (e.g. preloaded by the gunicorn master and
+        # shared copy-on-write with workers) is kept until the first interval elapses.
+        if len(self._index):
+            await asyncio.sleep(self._rebuild_seconds)
+        while True:
+            try:
+                await asyncio.to_thread(self.rebuild)
+            except Exception as exc:  # pragma: no cover - defensive logging only
+                logger.warning("Suggestion index rebuild failed: %s", exc)
+            await asyncio.sleep(self._rebuild_seconds)
+
+    def start(self) -> None:
+        if self._rebuild_seconds <= 0:
+            if not len(self._index):
+                self._task = asyncio.create_task(asyncio.to_thread(self.rebuild))
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._rebuild_forever())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,17 @@
+import pytest
+
+from evaluate import load_qrels, ndcg_at_k, recall_at_k, reciprocal_rank
+
+
+def test_load_qrels_skips_header_and_malformed_lines(tmp_path):
+    path = tmp_path / "qrels.txt"
+    path.write_text("qid\tdocid\trel\nq1 0 d1 2\nq1\td2\t1.0\nnot a qrels line at all\nq2 0 d3 0\n", encoding="utf-8")
+    assert load_qrels(path) == {"q1": {"d1": 2, "d2": 1}, "q2": {"d3": 0}}
+
+
+def test_metrics_on_a_small_ranking():
+    judged = {"a": 2, "b": 1}
+    assert ndcg_at_k(["a", "b", "c"], judged, 3) == pytest.approx(1.0)
+    assert ndcg_at_k(["c", "b", "a"], judged, 3) < 1.0
+    assert reciprocal_rank(["c", "b", "a"], judged, 3) == pytest.approx(0.5)
+    assert recall_at_k(["a", "c"], judged, 2) == pytest.approx(0.5)
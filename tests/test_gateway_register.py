@@ -0,0 +1,163 @@
+import asyncio
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+
+import gateway_register
+from gateway_register import GatewayRegistrar
+
+ROUTES = [{"name": "search", "method": "POST", "gateway_path": "/search", "upstream_path": "/search"}]
+
+
+class FakeGateway:
+    """httpx transport recording every POST; ``renew_status`` sets the /gateway/renew answer."""
+
+    def __init__(self, renew_status=200, renew_hash=None):
+        self.renew_status = renew_status
+        self.renew_hash = renew_hash
+        self.calls = []
+
+    def __call__(self, request):
+        body = json.loads(request.content)
+        self.calls.append((request.url.path, body))
+        if request.url.path == "/gateway/renew":
+            payload = {"routes_hash": self.renew_hash or body["routes_hash"]}
+            return httpx.Response(self.renew_status, json=payload)
+        return httpx.Response(200, json={"ok": True})
+
+    @property
+    def paths(self):
+        return [path for path, _ in self.calls]
+
+
+def make_registrar(gateway, **kwargs):
+    options = {"renew_seconds": 60, "base_delay": 1.0, "max_delay": 8.0, "jitter": 0.0, **kwargs}
+    registrar = GatewayRegistrar(
+        service_name="simple-search",
+        base_url="http://search:8000",
+        gateway_url="http://gateway",
+        routes=ROUTES,
+        prefix="/ai-search",
+        **options,
+    )
+    registrar._client = httpx.AsyncClient(transport=httpx.MockTransport(gateway))
+    return registrar
+
+
+def run_cycles(registrar, cycles):
+    async def scenario():
+        try:
+            for _ in range(cycles):
+                await registrar.register_once()
+        finally:
+            await registrar.close()
+
+    asyncio.run(scenario())
+
+
+def test_registers_once_then_renews_with_hash_only():
+    gateway = FakeGateway()
+    registrar = make_registrar(gateway)
+    run_cycles(registrar, 3)
+
+    assert gateway.paths == ["/gateway/register", "/gateway/renew", "/gateway/renew"]
+    register, renew = gateway.calls[0][1], gateway.calls[1][1]
+    assert register["routes"][0]["gateway_path"] == "/ai-search/search"
+    assert register["lease_seconds"] == 180
+    assert renew == {
+        "name": "simple-search",
+        "base_url": "http://search:8000",
+        "routes_hash": registrar.routes_hash,
+        "lease_seconds": 180,
+    }
+
+
+def test_renew_404_falls_back_to_full_registration():
+    gateway = FakeGateway(renew_status=404)
+    registrar = make_registrar(gateway)
+    run_cycles(registrar, 3)
+
+    assert gateway.paths == ["/gateway/register", "/gateway/renew", "/gateway/register", "/gateway/register"]
+    assert registrar.renew_supported is False
+    assert registrar.registered
+
+
+@pytest.mark.parametrize("status, renew_hash", [(410, None), (200, "stale")])
+def test_unknown_service_or_other_hash_registers_again(status, renew_hash):
+    gateway = FakeGateway(renew_status=status, renew_hash=renew_hash)
+    registrar = make_registrar(gateway)
+    run_cycles(registrar, 2)
+    assert gateway.paths == ["/gateway/register", "/gateway/renew", "/gateway/register"]
+
+
+def test_unchanged_routes_keep_renewing_and_changed_routes_register():
+    gateway = FakeGateway()
+    registrar = make_registrar(gateway)
+    first_hash = registrar.routes_hash
+
+    async def scenario():
+        try:
+            await registrar.register_once()
+            registrar.set_routes(ROUTES)
+            assert registrar.routes_hash == first_hash and registrar.registered
+            await registrar.register_once()
+            registrar.set_routes(ROUTES + [{**ROUTES[0], "name": "suggest", "gateway_path": "/suggest"}])
+            assert not registrar.registered
+            await registrar.register_once()
+        finally:
+            await registrar.close()
+
+    asyncio.run(scenario())
+    assert gateway.paths == ["/gateway/register", "/gateway/renew", "/gateway/register"]
+
+
+def test_backoff_uses_full_jitter_under_a_capped_ceiling(monkeypatch):
+    registrar = make_registrar(FakeGateway())
+    monkeypatch.setattr(gateway_register.random, "uniform", lambda low, high: (low, high))
+    assert [registrar.backoff(n) for n in range(6)] == [(0, 1.0), (0, 2.0), (0, 4.0), (0, 8.0), (0, 8.0), (0, 8.0)]
+    assert registrar.backoff(10_000) == (0, 8.0)
+    monkeypatch.undo()
+    assert all(0 <= registrar.backoff(n) <= 8.0 for n in range(50))
+
+
+def test_first_attempt_waits_at_most_the_jitter(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    monkeypatch.setattr(gateway_register.asyncio, "sleep", fake_sleep)
+    registrar = make_registrar(FakeGateway(), renew_seconds=0, jitter=5.0)
+
+    async def scenario():
+        try:
+            await registrar.run()
+        finally:
+            await registrar.close()
+
+    asyncio.run(scenario())
+    assert len(sleeps) == 1 and 0 <= sleeps[0] <= 5.0
+    assert registrar.registered
+
+
+def test_lock_file_elects_a_single_registrar(tmp_path):
+    lock_file = str(tmp_path / "register.lock")
+    first = make_registrar(FakeGateway(), lock_file=lock_file)
+    second = make_registrar(FakeGateway(), lock_file=lock_file)
+
+    async def scenario():
+        assert first._hold_lock()
+        assert not second._hold_lock()
+        await first.close()  # the holder exits: the standby takes over
+        assert second._hold_lock()
+        await second.close()
+
+    asyncio.run(scenario())
+
+
+def test_ai_math_service_copy_is_identical():
+    root = Path(gateway_register.__file__).resolve().parent
+    copy = root / "folder-gateway-skill" / "ai-math-service" / "gateway_register.py"
+    assert copy.read_bytes() == (root / "gateway_register.py").read_bytes()
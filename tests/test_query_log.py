@@ -0,0 +1,39 @@
+import asyncio
+
+import query_log
+from query_log import QueryLogger, count_queries, iter_records, list_segments
+
+
+def test_records_round_trip_through_compressed_segments(tmp_path):
+    logger = QueryLogger(tmp_path, enabled=True, batch_size=2, flush_seconds=0.05)
+    logger.start()
+    for query in ["Python", "python ", "vespa"]:
+        logger.log({"query": query})
+    logger.stop()
+
+    segments = list_segments(tmp_path)
+    assert len(segments) == 1
+    expected = query_log.ZSTD_SUFFIX if query_log.zstandard is not None else query_log.GZIP_SUFFIX
+    assert segments[0].name.endswith(expected)
+    assert [record["query"] for record in iter_records(tmp_path)] == ["Python", "python ", "vespa"]
+    assert count_queries(tmp_path) == {"python": 2, "vespa": 1}
+
+
+def test_log_is_ignored_once_stopped(tmp_path):
+    logger = QueryLogger(tmp_path, enabled=True)
+    logger.start()
+    logger.stop()
+    logger.log({"query": "late"})
+    assert list(iter_records(tmp_path)) == []
+
+
+def test_close_flushes_without_blocking_the_loop(tmp_path):
+    logger = QueryLogger(tmp_path, enabled=True, flush_seconds=60)
+
+    async def scenario():
+        logger.start()
+        logger.log({"query": "async"})
+        await logger.close(timeout=2)
+
+    asyncio.run(scenario())
+    assert [record["query"] for record in iter_records(tmp_path)] == ["async"]
@@ -0,0 +1,35 @@
+from suggest import PrefixIndex, build_index, url_tokens
+
+WEIGHTS = {"python": 5.0, "pytest": 3.0, "pyvespa": 3.0, "pandas": 4.0, "vespa": 2.0, "": 9.0}
+
+
+def test_short_prefix_served_from_head_cache_best_first():
+    index = PrefixIndex(WEIGHTS)
+    assert len(index) == 5
+    assert index.lookup("p", limit=3) == [("python", 5.0), ("pandas", 4.0), ("pytest", 3.0)]
+    assert index.lookup("py") == [("python", 5.0), ("pytest", 3.0), ("pyvespa", 3.0)]
+
+
+def test_long_prefix_scans_the_sorted_range():
+    index = PrefixIndex(WEIGHTS)
+    assert index.lookup("pyt") == [("python", 5.0), ("pytest", 3.0)]
+    assert index.lookup("pyte", limit=1) == [("pytest", 3.0)]
+    assert index.lookup("rust") == []
+
+
+def test_lookup_normalizes_prefix_and_ignores_empty_input():
+    index = PrefixIndex(WEIGHTS)
+    assert index.lookup("  PYTH ") == [("python", 5.0)]
+    assert index.lookup("   ") == []
+    assert index.lookup("py", limit=0) == []
+
+
+def test_head_cache_keeps_only_the_top_terms():
+    index = PrefixIndex({f"a{n}": float(n) for n in range(10)}, cache_size=3)
+    assert index.lookup("a", limit=10) == [("a9", 9.0), ("a8", 8.0), ("a7", 7.0)]
+
+
+def test_build_index_ranks_queries_above_url_tokens():
+    assert url_tokens("https://www.docs.python.org/3/tutorial/index.html") == ["docs", "python", "tutorial"]
+    index = build_index({"python tutorial": 2}, ["https://python.org/tutorial"])
+    assert [term for term, _ in index.lookup("py")] == ["python tutorial", "python"]
@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+
+import pytest
+from requests import HTTPError
+from vespa.exceptions import VespaError
+
+import ui
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.json = payload
+
+
+class FakeSession:
+    """Records YQL sent to Vespa; ``fail_grouping`` mimics a schema without the facet attributes."""
+
+    def __init__(self, fail_grouping=None):
+        self.fail_grouping = fail_grouping
+        self.yql = []
+
+    def query(self, yql, query, ranking):
+        self.yql.append(yql)
+        if "all(group(" in yql and self.fail_grouping == "raise":
+            error = VespaError([{"code": 4, "message": "Could not locate attribute for grouping expression 'host'"}])
+            error.__cause__ = HTTPError(response=SimpleNamespace(status_code=400))
+            raise error
+        if self.fail_grouping == "unavailable":
+            error = VespaError([{"code": 12, "message": "Timed out waiting for grouping results"}])
+            error.__cause__ = HTTPError(response=SimpleNamespace(status_code=504))
+            raise error
+        if self.fail_grouping == "down":
+            raise ConnectionError("Connection refused")
+        if "all(group(" in yql and self.fail_grouping == "errors":
+            return FakeResponse({"root": {"errors": [{"code": 4, "message": "no attribute 'host'"}]}})
+        return FakeResponse({"root": {"children": []}})
+
+
+def test_build_yql_without_facets_has_no_grouping():
+    assert ui._build_yql(10, []) == "select * from sources * where userQuery() limit 10"
+
+
+def test_build_yql_with_facets_appends_one_group_per_facet():
+    yql = ui._build_yql(5, ["host", "crawl_date"])
+    assert yql.startswith("select * from sources * where userQuery() limit 5 | all(")
+    assert "all(group(host) max(%d) order(-count()) each(output(count())) as(host))" % ui.FACET_MAX_BUCKETS in yql
+    assert "group(time.date(crawl_date))" in yql
+    assert "as(crawl_date)" in yql
+
+
+def test_resolve_facets_defaults_to_none_and_drops_unknown(monkeypatch):
+    monkeypatch.setattr(ui, "DEFAULT_FACETS", [])
+    assert ui._resolve_facets(None) == []
+    assert ui._resolve_facets(["tld", "bogus", "tld", "host"]) == ["tld", "host"]
+
+
+@pytest.fixture(autouse=True)
+def facets_available(monkeypatch):
+    monkeypatch.setattr(ui, "_facets_unavailable_until", 0.0)
+
+
+@pytest.mark.parametrize("failure", ["raise", "errors"])
+def test_query_vespa_retries_without_grouping_when_facets_fail(failure):
+    session = FakeSession(fail_grouping=failure)
+    response = ui._query_vespa(session, "python", 10, ["host"])
+    assert response.json == {"root": {"children": []}}
+    assert len(session.yql) == 2
+    assert "all(group(" not in session.yql[-1]
+
+    ui._query_vespa(session, "python", 10, ["host"])
+    assert len(session.yql) == 3  # cooldown: facets skipped, one plain query
+    assert "all(group(" not in session.yql[-1]
+
+
+@pytest.mark.parametrize("failure, error", [("unavailable", VespaError), ("down", ConnectionError)])
+def test_query_vespa_does_not_retry_outages(failure, error):
+    session = FakeSession(fail_grouping=failure)
+    with pytest.raises(error):
+        ui._query_vespa(session, "python", 10, ["host"])
+    assert len(session.yql) == 1
+    assert ui._facets_unavailable_until == 0.0
+
+
+def test_query_vespa_without_facets_sends_one_plain_query():
+    session = FakeSession()
+    ui._query_vespa(session, "python", 10, [])
+    assert session.yql == [ui._build_yql(10, [])]
+
+
+def test_extract_facets_flattens_grouping_output():
+    response_json = {
+        "root": {
+            "children": [
+                {"id": "toplevel", "relevance": 1.0},
+                {
+                    "id": "group:root:0",
+                    "children": [
+                        {
+                            "label": "host",
+                            "children": [
+                                {"value": "example.com", "fields": {"count()": 3}},
+                                {"value": "", "fields": {"count()": 1}},
+                            ],
+                        }
+                    ],
+                },
+            ]
+        }
+    }
+    assert ui._extract_facets(response_json) == {"host": [{"value": "example.com", "count": 3}]}
@@ -2,20 +2,26 @@
 
 from __future__ import annotations
 
+import json
 import logging
 import os
+import re
 import textwrap
+import time
 from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Sequence
+from typing import Any, Dict, List, Sequence
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from gateway_register import register_with_gateway
+from gateway_register import GatewayRegistrar
 from pydantic import BaseModel
+from query_log import QueryLogger, count_queries
+from suggest import SuggestService
 from vespa.application import Vespa
+from vespa.exceptions import VespaError
 
 try:  # Optional: load .env if python-dotenv is installed
     from dotenv import load_dotenv
@@ -26,6 +32,7 @@ except ImportError:  # pragma: no cover - optional dependency
 class SearchRequest(BaseModel):
     query: str
     limit: int | None = None
+    facets: List[str] | None = None
 
 
 class BM25SearchRequest(BaseModel):
@@ -33,6 +40,7 @@ class BM25SearchRequest(BaseModel):
     dataset_id: str | None = None
     filters: Dict[str, Any] | None = None
     top_k: int | None = None
+    facets: List[str] | None = None
 
 
 BASE_DIR = Path(__file__).parent
@@ -47,12 +55,27 @@ RESULT_LIMIT = int(os.getenv("VESPA_RESULT_LIMIT", "10"))
 MAX_RESULT_LIMIT = int(os.getenv("VESPA_MAX_RESULT_LIMIT", "100"))
 MIN_RESULT_LIMIT = 1
 
+# Facet name -> Vespa grouping expression (fields are attributes, see main.py schema)
+FACET_EXPRESSIONS: Dict[str, str] = {
+    "host": "host",
+    "tld": "tld",
+    "language": "language",
+    "crawl_date": "time.date(crawl_date)",
+    "dataset": "dataset",
+}
+# Facets are opt-in: grouping costs extra per query and needs the facet attributes deployed.
+DEFAULT_FACETS = [name.strip() for name in os.getenv("VESPA_FACETS", "").split(",") if name.strip()]
+FACET_MAX_BUCKETS = int(os.getenv("VESPA_FACET_MAX_BUCKETS", "10"))
+# After a grouping error, searches skip facets for this long instead of failing again.
+FACET_COOLDOWN_SECONDS = float(os.getenv("VESPA_FACET_COOLDOWN_SECONDS", "300"))
+_GROUPING_ERROR = re.compile(r"group|attribute", re.IGNORECASE)
+_facets_unavailable_until = 0.0
+
 SERVICE_NAME = os.getenv("SERVICE_NAME", "simple-search")
 SERVICE_BASE_URL = os.getenv("SERVICE_BASE_URL", "http://127.0.0.1:8000")
 GATEWAY_URL = os.getenv("GATEWAY_URL")
 GATEWAY_PREFIX = os.getenv("GATEWAY_PREFIX", "")
-REGISTER_RETRIES = int(os.getenv("REGISTER_RETRIES", "5"))
-REGISTER_DELAY = float(os.getenv("REGISTER_DELAY", "1.0"))
+REGISTER_ON_STARTUP = os.getenv("GATEWAY_REGISTER_ON_STARTUP", "1").lower() not in {"0", "false", "no"}
 
 
 @lru_cache
@@ -76,21 +99,109 @@ def _resolve_limit(candidate: int | None) -> int:
     return max(MIN_RESULT_LIMIT, min(MAX_RESULT_LIMIT, limit_value))
 
 
-def run_vespa_query(query: str, limit: int | None = None) -> Dict[str, Any]:
+def _resolve_facets(candidate: Sequence[str] | None) -> List[str]:
+    """Keep known facet names (in request order); None falls back to the configured defaults."""
+    requested = DEFAULT_FACETS if candidate is None else candidate
+    return [name for name in dict.fromkeys(requested) if name in FACET_EXPRESSIONS]
+
+
+def _build_yql(limit: int, facets: Sequence[str]) -> str:
+    """
+    Build the search YQL, appending one grouping clause per facet.
+
+    Hits and facet counts come back in the same response, so the UI and
+    dashboards do not need an extra Vespa round trip per facet.
+    """
+    yql = f"select * from sources * where userQuery() limit {limit}"
+    if not facets:
+        return yql
+    groups = " ".join(
+        f"all(group({FACET_EXPRESSIONS[name]}) max({FACET_MAX_BUCKETS}) order(-count()) "
+        f"each(output(count())) as({name}))"
+        for name in facets
+    )
+    return f"{yql} | all({groups})"
+
+
+def _is_grouping_error(errors: Any) -> bool:
+    """True for Vespa errors about the grouping request (e.g. a facet attribute missing from the schema)."""
+    return bool(errors) and bool(_GROUPING_ERROR.search(json.dumps(errors, default=str)))
+
+
+def _query_vespa(session: Any, query: str, limit: int, facets: Sequence[str]) -> Any:
+    """
+    Run the BM25 search with facet grouping. If Vespa rejects the grouping
+    (e.g. a facet attribute is missing from the deployed schema), re-run it
+    without facets and skip facets for FACET_COOLDOWN_SECONDS. Connection
+    errors and 5xx responses propagate without a second query.
+    """
+    global _facets_unavailable_until
+    if facets and time.monotonic() >= _facets_unavailable_until:
+        try:
+            response = session.query(yql=_build_yql(limit, facets), query=query, ranking="bm25")
+        except VespaError as exc:
+            status = getattr(getattr(exc.__cause__, "response", None), "status_code", None)
+            if (status is not None and status >= 500) or not _is_grouping_error(exc.args):
+                raise
+            failure: Any = exc.args
+        else:
+            failure = (_safe_json(response).get("root", {}) or {}).get("errors")
+            if not _is_grouping_error(failure):
+                return response
+        _facets_unavailable_until = time.monotonic() + FACET_COOLDOWN_SECONDS
+        logger.warning(
+            "Facet grouping %s failed, searching without facets for %.0fs: %s",
+            list(facets),
+            FACET_COOLDOWN_SECONDS,
+            failure,
+        )
+    return session.query(yql=_build_yql(limit, []), query=query, ranking="bm25")
+
+
+def _is_group_hit(hit: Dict[str, Any]) -> bool:
+    return str(hit.get("id", "")).startswith("group:")
+
+
+def _document_hits(response: Any) -> List[Dict[str, Any]]:
+    """Return the ranked document hits, skipping the grouping root Vespa mixes into children."""
+    hits = getattr(response, "hits", []) or []
+    return [hit for hit in hits if not _is_group_hit(hit)]
+
+
+def _extract_facets(response_json: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """Flatten Vespa grouping output into {facet: [{"value", "count"}, ...]}."""
+    facets: Dict[str, List[Dict[str, Any]]] = {}
+    root = response_json.get("root", {}) or {}
+    for child in root.get("children", []) or []:
+        if not _is_group_hit(child):
+            continue
+        for group_list in child.get("children", []) or []:
+            label = group_list.get("label")
+            if label not in FACET_EXPRESSIONS:
+                continue
+            buckets = []
+            for group in group_list.get("children", []) or []:
+                value = group.get("value")
+                if value in (None, ""):
+                    continue
+                count = (group.get("fields", {}) or {}).get("count()", 0)
+                buckets.append({"value": str(value), "count": int(count)})
+            facets[label] = buckets
+    return facets
+
+
+def run_vespa_query(
+    query: str, limit: int | None = None, facets: Sequence[str] | None = None
+) -> Dict[str, Any]:
     """Execute the Vespa search using the provided query string."""
     effective_limit = _resolve_limit(limit)
     client = get_vespa_client()
     with client.syncio(connections=1) as session:
-        response = session.query(
-            yql=f"select * from sources * where userQuery() limit {effective_limit}",
-            query=query,
-            ranking="bm25",
-        )
+        response = _query_vespa(session, query, effective_limit, _resolve_facets(facets))
 
     response_json = _safe_json(response)
-    print(response_json)  # Debug output
     root = response_json.get("root", {}) or {}
-    hits = getattr(response, "hits", []) or []
+    hits = _document_hits(response)
     formatted_hits = [_format_hit(hit) for hit in hits]
 
     total_available = _extract_total_hits(response_json)
@@ -104,6 +215,7 @@ def run_vespa_query(query: str, limit: int | None = None) -> Dict[str, Any]:
         "total_available": total_available,
         "latency_ms": latency_ms,
         "coverage": root.get("coverage") or {},
+        "facets": _extract_facets(response_json),
     }
 
 
@@ -150,7 +262,8 @@ def _format_bm25_hit(hit: Dict[str, Any]) -> Dict[str, Any]:
 def _extract_total_hits(response_json: Dict[str, Any]) -> int:
     root = response_json.get("root", {})
     fields = root.get("fields", {})
-    return fields.get("totalCount", len(root.get("children", []) or []))
+    children = [child for child in root.get("children", []) or [] if not _is_group_hit(child)]
+    return fields.get("totalCount", len(children))
 
 
 def _extract_latency(response_json: Dict[str, Any]) -> float:
@@ -210,21 +323,22 @@ def _matches_filters(fields: Dict[str, Any], filters: Dict[str, Any] | None) ->
 
 
 def run_bm25_api_query(
-    query: str, *, dataset_id: str | None, filters: Dict[str, Any] | None, top_k: int | None
+    query: str,
+    *,
+    dataset_id: str | None,
+    filters: Dict[str, Any] | None,
+    top_k: int | None,
+    facets: Sequence[str] | None = None,
 ) -> Dict[str, Any]:
     """BM25 search tailored for RAG clients."""
     effective_limit = _resolve_limit(top_k)
     client = get_vespa_client()
 
     with client.syncio(connections=1) as session:
-        response = session.query(
-            yql=f"select * from sources * where userQuery() limit {effective_limit}",
-            query=query,
-            ranking="bm25",
-        )
+        response = _query_vespa(session, query, effective_limit, _resolve_facets(facets))
 
     response_json = _safe_json(response)
-    hits = getattr(response, "hits", []) or []
+    hits = _document_hits(response)
     filtered_hits = [
         _format_bm25_hit(hit) for hit in hits if _matches_filters(hit.get("fields", {}) or {}, filters)
     ]
@@ -242,46 +356,132 @@ def run_bm25_api_query(
         "total_available": _extract_total_hits(response_json),
         "latency_ms": _extract_latency(response_json),
         "coverage": response_json.get("root", {}).get("coverage") or {},
+        "facets": _extract_facets(response_json),
+    }
+
+
+def sample_document_urls(count: int) -> List[str]:
+    """Fetch URLs of up to ``count`` indexed documents (feeds the suggestion index)."""
+    client = get_vespa_client()
+    with client.syncio(connections=1) as session:
+        response = session.query(yql=f"select url from sources * where true limit {int(count)}")
+    urls = [(hit.get("fields", {}) or {}).get("url") for hit in _document_hits(response)]
+    return [url for url in urls if url]
+
+
+query_logger = QueryLogger()
+suggest_service = SuggestService(
+    sample_urls=sample_document_urls,
+    logged_queries=(lambda: count_queries(query_logger.directory)) if query_logger.enabled else None,
+)
+
+
+def preload_shared_state() -> None:
+    """
+    Build read-only state before workers fork (gunicorn preload).
+
+    Workers then share the suggestion table and compiled templates copy-on-write
+    instead of each building its own copy.
+    """
+    templates.get_template("index.html")
+    suggest_service.rebuild()
+    # The master must not hand its Vespa connection state to forked workers.
+    get_vespa_client.cache_clear()
+
+
+def _log_query(
+    endpoint: str,
+    query: str,
+    params: Dict[str, Any],
+    started: float,
+    payload: Dict[str, Any] | None = None,
+    error: str | None = None,
+) -> None:
+    """Hand a query record to the background logger (non-blocking)."""
+    record: Dict[str, Any] = {
+        "ts": time.time(),
+        "endpoint": endpoint,
+        "query": query,
+        "params": params,
+        "took_ms": round((time.perf_counter() - started) * 1000, 3),
     }
+    if payload is not None:
+        record.update(
+            latency_ms=payload.get("latency_ms"),
+            total_available=payload.get("total_available"),
+            hit_ids=[hit.get("id") for hit in payload.get("hits", [])],
+            coverage=payload.get("coverage"),
+        )
+    if error is not None:
+        record["error"] = error
+    query_logger.log(record)
 
 
 app = FastAPI(title="Simple Search UI", version="0.1.0")
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
 
 
+GATEWAY_ROUTES: List[Dict[str, str]] = [
+    {
+        "name": "search-ui",
+        "method": "POST",
+        "gateway_path": "/search",
+        "upstream_path": "/search",
+        "summary": "UI search endpoint",
+        "description": "BM25 search formatted for UI consumers",
+    },
+    {
+        "name": "search-bm25",
+        "method": "POST",
+        "gateway_path": "/search/bm25",
+        "upstream_path": "/search/bm25",
+        "summary": "RAG BM25 endpoint",
+        "description": "BM25 search tailored for RAG clients",
+    },
+    {
+        "name": "search-suggest",
+        "method": "GET",
+        "gateway_path": "/suggest",
+        "upstream_path": "/suggest",
+        "summary": "Query suggestions",
+        "description": "Type-ahead suggestions served from the in-memory prefix index",
+    },
+]
+
+
+gateway_registrar = GatewayRegistrar(
+    service_name=SERVICE_NAME,
+    base_url=SERVICE_BASE_URL,
+    gateway_url=GATEWAY_URL,
+    routes=GATEWAY_ROUTES,
+    prefix=GATEWAY_PREFIX,
+)
+
+
 @app.on_event("startup")
 async def _register_gateway_on_startup() -> None:
-    """Register this service's routes into the gateway when configured via env."""
-    routes = [
-        {
-            "name": "search-ui",
-            "method": "POST",
-            "gateway_path": "/search",
-            "upstream_path": "/search",
-            "summary": "UI search endpoint",
-            "description": "BM25 search formatted for UI consumers",
-        },
-        {
-            "name": "search-bm25",
-            "method": "POST",
-            "gateway_path": "/search/bm25",
-            "upstream_path": "/search/bm25",
-            "summary": "RAG BM25 endpoint",
-            "description": "BM25 search tailored for RAG clients",
-        },
-    ]
-    try:
-        await register_with_gateway(
-            service_name=SERVICE_NAME,
-            base_url=SERVICE_BASE_URL,
-            gateway_url=GATEWAY_URL,
-            routes=routes,
-            prefix=GATEWAY_PREFIX,
-            retries=REGISTER_RETRIES,
-            delay=REGISTER_DELAY,
-        )
-    except Exception as exc:  # pragma: no cover - defensive logging only
-        logger.warning("Gateway registration failed: %s", exc)
+    # Background task: startup does not wait on the gateway. Under gunicorn
+    # REGISTER_LOCK_FILE elects one worker per host (see gunicorn.conf.py).
+    if REGISTER_ON_STARTUP:
+        gateway_registrar.start()
+
+
+@app.on_event("shutdown")
+async def _stop_gateway_registration() -> None:
+    await gateway_registrar.stop()
+
+
+@app.on_event("startup")
+async def _start_background_services() -> None:
+    """Start the query log writer and keep the suggestion index fresh in the background."""
+    query_logger.start()
+    suggest_service.start()
+
+
+@app.on_event("shutdown")
+async def _stop_background_services() -> None:
+    await suggest_service.stop()
+    await query_logger.close()
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -302,11 +502,15 @@ async def search(request: SearchRequest) -> Dict[str, Any]:
     if not query:
         raise HTTPException(status_code=400, detail="Query must not be empty.")
 
+    started = time.perf_counter()
+    params = {"limit": request.limit, "facets": request.facets}
     try:
-        payload = run_vespa_query(query, limit=request.limit)
+        payload = run_vespa_query(query, limit=request.limit, facets=request.facets)
     except Exception as exc:  # noqa: BLE001 - surface Vespa issues cleanly
+        _log_query("/search", query, params, started, error=str(exc))
         raise HTTPException(status_code=502, detail=str(exc)) from exc
 
+    _log_query("/search", query, params, started, payload)
     return payload
 
 
@@ -317,14 +521,30 @@ async def search_bm25(request: BM25SearchRequest) -> Dict[str, Any]:
     if not query:
         raise HTTPException(status_code=400, detail="Query must not be empty.")
 
+    started = time.perf_counter()
+    params = {
+        "dataset_id": request.dataset_id,
+        "filters": request.filters,
+        "top_k": request.top_k,
+        "facets": request.facets,
+    }
     try:
         payload = run_bm25_api_query(
             query,
             dataset_id=request.dataset_id,
             filters=request.filters,
             top_k=request.top_k,
+            facets=request.facets,
         )
     except Exception as exc:  # noqa: BLE001 - surface Vespa issues cleanly
+        _log_query("/search/bm25", query, params, started, error=str(exc))
         raise HTTPException(status_code=502, detail=str(exc)) from exc
 
+    _log_query("/search/bm25", query, params, started, payload)
     return payload
+
+
+@app.get("/suggest")
+async def suggest(q: str = "", limit: int | None = None) -> Dict[str, Any]:
+    """Prefix suggestions for partial queries; never touches Vespa."""
+    return {"query": q, "suggestions": suggest_service.suggest(q, limit)}